@@ -3,13 +3,19 @@ import os
 import asyncio
 from dotenv import load_dotenv
 from discord.ext import commands
+from cog.stats.metrics.mongo_listener import install_mongo_listener
 
 # Load environment variables from clyne.env
 load_dotenv('clyne.env')
 
+# Count and time MongoDB commands; must happen before the cogs create their clients
+install_mongo_listener()
+
 # Set up intents - disable privileged intents
 intents = discord.Intents.default()
 intents.message_content = False  # Disable message content intent (privileged)
+# The members intent is privileged too; it is needed to stream member lists for airdrops
+intents.members = os.getenv('MEMBERS_INTENT', 'false').strip().lower() == 'true'
 
 # Create bot instance
 bot = commands.Bot(command_prefix='!', intents=intents)
@@ -49,6 +55,10 @@ async def load_extensions():
         await bot.load_extension("cog.stats.stats_server.server_stats")
         print("Server stats cog loaded successfully")
         
+        # Load metrics cog
+        await bot.load_extension("cog.stats.metrics.metrics_cog")
+        print("Metrics cog loaded successfully")
+        
         # Load mining commands cog
         await bot.load_extension("cog.cryptonel.mining.mining_commands")
         print("Mining commands cog loaded successfully")
@@ -57,6 +67,10 @@ async def load_extensions():
         await bot.load_extension("cog.cryptonel.wallet.wallet_commands")
         print("Wallet commands cog loaded successfully")
         
+        # Load leaderboard cog
+        await bot.load_extension("cog.cryptonel.leaderboard.leaderboard_commands")
+        print("Leaderboard cog loaded successfully")
+        
         # Transfer commands disabled as requested
         # await bot.load_extension("cog.cryptonel.transfer.transfer_commands")
         # print("Transfer commands cog loaded successfully")
@@ -64,6 +78,14 @@ async def load_extensions():
         # Load server management commands cog
         await bot.load_extension("cog.management.server_commands")
         print("Server management cog loaded successfully")
+        
+        # Load public server directory cog
+        await bot.load_extension("cog.management.directory_commands")
+        print("Server directory cog loaded successfully")
+        
+        # Load airdrop commands cog
+        await bot.load_extension("cog.management.airdrop_commands")
+        print("Airdrop commands cog loaded successfully")
     except Exception as e:
         print(f"Failed to load extension: {e}")
         import traceback
@@ -78,6 +100,15 @@ async def main():
         print("ERROR: No token found in environment variables")
         return
     
+    # Transfers, escrows and airdrops commit through the ledger writer, which needs a replica set
+    try:
+        from cog.cryptonel.transfer.utils import ledger_writer
+        from cog.cryptonel.transfer.ledger_writer import TRANSACTIONS_REQUIRED
+        if not await asyncio.to_thread(ledger_writer.supports_transactions):
+            print(f"WARNING: {TRANSACTIONS_REQUIRED}")
+    except Exception as e:
+        print(f"Error checking MongoDB transaction support: {e}")
+
     try:
         # Load extensions first
         await load_extensions()
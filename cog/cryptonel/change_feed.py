@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+# Error codes MongoDB returns when change streams are not supported (standalone servers)
+UNSUPPORTED_CODES = {40573, 40324}
+
+class ChangeFeed:
+    """
+    Watches a collection for writes to a set of fields
+
+    The change stream is read in a daemon thread (pymongo is blocking) and
+    each changed document, projected to the watched fields, is handed to
+    the subscribers on the event loop. This also picks up writes made
+    outside the bot, like the website or the mining backend. The stream
+    resumes from its last token after transient errors. available turns
+    False when the server does not support change streams, so subscribers
+    can fall back to periodic reloads.
+    """
+
+    def __init__(self, name: str, collection, fields: List[str]):
+        self.name = name
+        self.collection = collection
+        self.fields = fields
+        self.subscribers: List[Callable[[Dict], None]] = []
+        self.available: Optional[bool] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        """Register a callback run on the event loop with each changed document"""
+        if callback not in self.subscribers:
+            self.subscribers.append(callback)
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.loop = asyncio.get_running_loop()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._watch, name=f"change-feed-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _pipeline(self) -> List[Dict]:
+        touched = [{f"updateDescription.updatedFields.{field}": {"$exists": True}} for field in self.fields]
+        projection = {"operationType": 1, "fullDocument._id": 1, "fullDocument.user_id": 1}
+        for field in self.fields:
+            projection[f"fullDocument.{field}"] = 1
+        return [
+            {"$match": {"$or": [{"operationType": {"$in": ["insert", "replace"]}}, *touched]}},
+            {"$project": projection}
+        ]
+
+    def _watch(self):
+        resume_token = None
+        delay = 1
+        while not self.stopped.is_set():
+            try:
+                with self.collection.watch(
+                    self._pipeline(),
+                    full_document="updateLookup",
+                    resume_after=resume_token,
+                    max_await_time_ms=1000
+                ) as stream:
+                    if not self.available:
+                        print(f"Change feed '{self.name}' is watching {self.collection.name}")
+                    self.available = True
+                    delay = 1
+                    while not self.stopped.is_set():
+                        change = stream.try_next()
+                        if change is None:
+                            continue
+                        resume_token = stream.resume_token
+                        document = change.get("fullDocument")
+                        if document:
+                            self.loop.call_soon_threadsafe(self._dispatch, document)
+            except OperationFailure as e:
+                if e.code in UNSUPPORTED_CODES:
+                    print(f"Change feed '{self.name}' unavailable (change streams need a replica set): {e}")
+                    self.available = False
+                    return
+                print(f"Change feed '{self.name}' error, retrying in {delay}s: {e}")
+                resume_token = None
+            except PyMongoError as e:
+                print(f"Change feed '{self.name}' error, retrying in {delay}s: {e}")
+            except Exception as e:
+                print(f"Unexpected error in change feed '{self.name}': {e}")
+                print(traceback.format_exc())
+            # Not watching until the stream is reopened
+            if self.available:
+                self.available = None
+            time.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    def _dispatch(self, document: Dict):
+        for callback in self.subscribers:
+            try:
+                callback(document)
+            except Exception as e:
+                print(f"Error in change feed '{self.name}' subscriber: {e}")
+                print(traceback.format_exc())
@@ -0,0 +1,166 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+import pymongo
+import os
+from dotenv import load_dotenv
+import asyncio
+import traceback
+from typing import Dict
+
+from .ranked_board import RankedBoard, parse_amount
+from ..change_feed import ChangeFeed
+from ..mining.mining_events import mining_data, mining_feed
+from ..transfer.utils import ledger_writer
+
+# Load environment variables
+load_dotenv('clyne.env')
+
+# MongoDB connection
+MONGODB_URI = os.getenv('MONGODB_URI')
+client = pymongo.MongoClient(MONGODB_URI)
+
+# Define databases and collections
+db_wallet = client['cryptonel_wallet']
+users = db_wallet['users']
+
+# Number of entries shown on the leaderboard
+TOP_SIZE = 10
+# How often the boards are rebuilt when change streams are not available
+FALLBACK_REBUILD_SECONDS = 600
+
+# Rankings kept in memory and updated as balances and mining totals change
+balance_board = RankedBoard("balance")
+mining_board = RankedBoard("total_mined")
+
+# Balance writes made outside the bot (dashboard, admin tools) come through this feed
+balance_feed = ChangeFeed("balances", users, ["balance", "ban"])
+
+# Function to apply a changed wallet document to the rich list
+def on_wallet_change(document: Dict):
+    user_id = document.get("user_id")
+    if not user_id:
+        return
+    balance_board.update(user_id, None if document.get("ban", False) else parse_amount(document.get("balance")))
+
+# Function to apply a changed mining document to the mining leaderboard
+def on_mining_change(document: Dict):
+    user_id = document.get("user_id")
+    if user_id:
+        mining_board.update(user_id, parse_amount(document.get("total_mined")))
+
+# Function to load both rankings with projection-only scans (blocking)
+def load_rankings():
+    balances = [
+        (document.get("user_id"), parse_amount(document.get("balance")))
+        for document in users.find({"ban": {"$ne": True}}, {"_id": 0, "user_id": 1, "balance": 1})
+    ]
+    mined = [
+        (document.get("user_id"), parse_amount(document.get("total_mined")))
+        for document in mining_data.find({}, {"_id": 0, "user_id": 1, "total_mined": 1})
+    ]
+    return balances, mined
+
+class LeaderboardCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.refresh_task = None
+
+    async def cog_load(self):
+        balance_feed.subscribe(on_wallet_change)
+        mining_feed.subscribe(on_mining_change)
+        # Transfers made by the bot update the rich list as soon as they are committed
+        ledger_writer.add_commit_listener(balance_board.update_many)
+        self.refresh_task = asyncio.create_task(self.refresh_loop())
+
+    async def cog_unload(self):
+        if self.refresh_task:
+            self.refresh_task.cancel()
+
+    async def rebuild(self):
+        balances, mined = await asyncio.to_thread(load_rankings)
+        balance_board.rebuild(balances)
+        mining_board.rebuild(mined)
+        print(f"Leaderboards rebuilt: {len(balance_board)} wallets, {len(mining_board)} miners")
+
+    async def refresh_loop(self):
+        # Start watching before the initial scan so no write falls in between
+        balance_feed.start()
+        mining_feed.start()
+        while True:
+            try:
+                await self.rebuild()
+            except Exception as e:
+                print(f"Error rebuilding leaderboards: {e}")
+                print(traceback.format_exc())
+            # With working change streams the boards stay current on their own
+            while True:
+                await asyncio.sleep(FALLBACK_REBUILD_SECONDS)
+                if balance_feed.available is False or mining_feed.available is False or not balance_board.ready:
+                    break
+
+    @app_commands.command(name="leaderboard", description="Show the richest wallets or the top miners")
+    @app_commands.describe(board="Which leaderboard to show")
+    @app_commands.choices(board=[
+        app_commands.Choice(name="Richest Wallets", value="balance"),
+        app_commands.Choice(name="Top Miners", value="mined")
+    ])
+    async def leaderboard(self, interaction: discord.Interaction, board: str = "balance"):
+        try:
+            ranked = balance_board if board == "balance" else mining_board
+            if not ranked.ready:
+                embed = discord.Embed(
+                    title="⏳ Leaderboard Loading",
+                    description="The leaderboard is still being prepared. Please try again in a moment.",
+                    color=0x8f92b1
+                )
+                await interaction.response.send_message(embed=embed, ephemeral=True)
+                return
+
+            user_id = str(interaction.user.id)
+            top = ranked.top(TOP_SIZE)
+
+            # One query for the names of everyone shown
+            names = {
+                document["user_id"]: document.get("username", "Unknown")
+                for document in users.find({"user_id": {"$in": [entry_id for entry_id, _ in top]}}, {"user_id": 1, "username": 1})
+            }
+
+            medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+            lines = []
+            for position, (entry_id, value) in enumerate(top, start=1):
+                marker = medals.get(position, f"**#{position}**")
+                you = " (you)" if entry_id == user_id else ""
+                lines.append(f"{marker} {names.get(entry_id, 'Unknown')}{you} - {value:,.2f} CRN")
+
+            embed = discord.Embed(
+                title="💰 Richest Wallets" if board == "balance" else "⛏️ Top Miners",
+                description="\n".join(lines) if lines else "Nobody is ranked yet.",
+                color=0x8f92b1
+            )
+
+            rank = ranked.rank(user_id)
+            if rank is not None:
+                embed.add_field(name="Your Rank", value=f"#{rank:,} of {len(ranked):,} ({ranked.values[user_id]:,.2f} CRN)", inline=False)
+            else:
+                embed.add_field(name="Your Rank", value="You are not ranked yet.", inline=False)
+
+            await interaction.response.send_message(embed=embed)
+        except Exception as e:
+            print(f"Error in leaderboard command: {e}")
+            print(traceback.format_exc())
+            try:
+                embed = discord.Embed(
+                    title="❌ Error",
+                    description="An error occurred while loading the leaderboard. Please try again later.",
+                    color=0x8f92b1
+                )
+                if interaction.response.is_done():
+                    await interaction.followup.send(embed=embed, ephemeral=True)
+                else:
+                    await interaction.response.send_message(embed=embed, ephemeral=True)
+            except:
+                pass
+
+async def setup(bot):
+    await bot.add_cog(LeaderboardCog(bot))
@@ -0,0 +1,66 @@
+import bisect
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Function to read the numeric strings stored in MongoDB
+def parse_amount(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class RankedBoard:
+    """
+    In-memory ranking of users by a numeric value
+
+    Entries are kept in a list sorted by (-value, user_id), so the top K is
+    a slice and a user's rank is a single bisect (O(log n)). An update
+    removes the old entry and inserts the new one with bisect, which keeps
+    the list sorted without ever re-sorting it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.values: Dict[str, float] = {}
+        self.ranking: List[Tuple[float, str]] = []
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self.ranking)
+
+    def rebuild(self, entries: Iterable[Tuple[str, float]]):
+        """Replace the whole ranking, e.g. with a fresh scan at startup"""
+        values = {}
+        for user_id, value in entries:
+            if value is not None and value > 0:
+                values[user_id] = value
+        self.values = values
+        self.ranking = sorted((-value, user_id) for user_id, value in values.items())
+        self.ready = True
+
+    def update(self, user_id: str, value: Optional[float]):
+        """Move a user to their new value; a missing or zero value removes them"""
+        old = self.values.get(user_id)
+        if old == value:
+            return
+        if old is not None:
+            index = bisect.bisect_left(self.ranking, (-old, user_id))
+            if index < len(self.ranking) and self.ranking[index] == (-old, user_id):
+                del self.ranking[index]
+            del self.values[user_id]
+        if value is not None and value > 0:
+            self.values[user_id] = value
+            bisect.insort(self.ranking, (-value, user_id))
+
+    def update_many(self, values: Dict[str, float]):
+        for user_id, value in values.items():
+            self.update(user_id, value)
+
+    def top(self, limit: int = 10) -> List[Tuple[str, float]]:
+        return [(user_id, -negative) for negative, user_id in self.ranking[:limit]]
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """1-based rank of a user, or None if they are not ranked"""
+        value = self.values.get(user_id)
+        if value is None:
+            return None
+        return bisect.bisect_left(self.ranking, (-value, user_id)) + 1
@@ -10,6 +10,12 @@ import asyncio
 import traceback
 from typing import Dict, List, Optional
 from .utils import check_ban_status
+from .mining_events import mining_feed, mining_settings_cache
+from .mining_status import mining_status_cache
+from .mining_reminders import mining_reminders
+from .mining_series import mining_series
+from cog.stats.metrics.registry import registry, track_interaction, RATE_LIMIT_REJECTIONS
+from cog.stats.metrics.tracing import start_trace
 
 # Load environment variables
 load_dotenv('clyne.env')
@@ -67,16 +73,21 @@ class MiningDropdown(Select):
             discord.SelectOption(label="Check Mining", value="check_mining", 
                                 description="Check when you can mine next"),
             discord.SelectOption(label="Mining Stats", value="mining_stats", 
-                                description="View your mining statistics")
+                                description="View your mining statistics"),
+            discord.SelectOption(label="Mining Reminders", value="mining_reminders", 
+                                description="Get a DM when you can mine again")
         ]
         super().__init__(placeholder="Select a mining option...", options=options)
     
     async def callback(self, interaction: discord.Interaction):
         try:
-            if self.values[0] == "check_mining":
-                await self.check_mining_callback(interaction)
-            elif self.values[0] == "mining_stats":
-                await self.mining_stats_callback(interaction)
+            with track_interaction("dropdown", f"mining:{self.values[0]}"), start_trace(f"mining:{self.values[0]}", interaction):
+                if self.values[0] == "check_mining":
+                    await self.check_mining_callback(interaction)
+                elif self.values[0] == "mining_stats":
+                    await self.mining_stats_callback(interaction)
+                elif self.values[0] == "mining_reminders":
+                    await self.mining_reminders_callback(interaction)
         except Exception as e:
             print(f"Error in dropdown callback: {e}")
             print(traceback.format_exc())
@@ -99,9 +110,9 @@ class MiningDropdown(Select):
         try:
             user_id = str(interaction.user.id)
             
-            # Get mining data
+            # Get mining status (cached, refreshed by dashboard writes)
             try:
-                mining_info = mining_data.find_one({"user_id": user_id})
+                mining_status = mining_status_cache.get(user_id)
             except Exception as e:
                 print(f"Error retrieving mining data: {e}")
                 embed = discord.Embed(
@@ -112,7 +123,8 @@ class MiningDropdown(Select):
                 await interaction.response.send_message(embed=embed, ephemeral=True)
                 return
             
-            if not mining_info or "last_mined" not in mining_info:
+            next_mining_time = mining_status.next_mining_time()
+            if next_mining_time is None:
                 embed = discord.Embed(
                     title="✅ Ready to Mine!",
                     description="You can start mining now! Visit our dashboard to begin:\nhttps://cryptonel.online/mining",
@@ -127,20 +139,10 @@ class MiningDropdown(Select):
                 await interaction.response.send_message(embed=embed, view=mining_view)
                 return
             
-            # Calculate time until next mining
+            # Compare against the cached cooldown end
             try:
-                last_mined = mining_info["last_mined"]
                 now = datetime.datetime.now(datetime.timezone.utc)
                 
-                # Make sure both datetimes are in the same format (timezone-aware)
-                # If last_mined is naive (no timezone), make it aware
-                if last_mined.tzinfo is None:
-                    last_mined = last_mined.replace(tzinfo=datetime.timezone.utc)
-                
-                # Default mining cooldown is 24 hours
-                mining_cooldown = datetime.timedelta(hours=24)
-                next_mining_time = last_mined + mining_cooldown
-                
                 if now >= next_mining_time:
                     embed = discord.Embed(
                         title="✅ Ready to Mine!",
@@ -165,6 +167,8 @@ class MiningDropdown(Select):
                         color=0x8f92b1
                     )
                     embed.add_field(name="Dashboard", value="[Open Mining Dashboard](https://cryptonel.online/mining)")
+                    if not mining_reminders.is_subscribed(user_id):
+                        embed.set_footer(text="Tip: turn on Mining Reminders to get a DM when your cooldown ends.")
                     
                     await interaction.response.send_message(embed=embed)
             except Exception as e:
@@ -196,9 +200,9 @@ class MiningDropdown(Select):
         try:
             user_id = str(interaction.user.id)
             
-            # Get mining data
+            # Get mining status (cached, refreshed by dashboard writes)
             try:
-                mining_info = mining_data.find_one({"user_id": user_id})
+                mining_status = mining_status_cache.get(user_id)
             except Exception as e:
                 print(f"Error retrieving mining data: {e}")
                 embed = discord.Embed(
@@ -209,7 +213,7 @@ class MiningDropdown(Select):
                 await interaction.response.send_message(embed=embed, ephemeral=True)
                 return
             
-            if not mining_info:
+            if not mining_status.exists:
                 embed = discord.Embed(
                     title="📊 Mining Statistics",
                     description="You haven't mined any CRN yet. Start mining today!",
@@ -218,7 +222,7 @@ class MiningDropdown(Select):
                 await interaction.response.send_message(embed=embed)
                 return
             
-            total_mined = mining_info.get("total_mined", "0")
+            total_mined = mining_status.total_mined
             
             embed = discord.Embed(
                 title="📊 Mining Statistics",
@@ -226,6 +230,16 @@ class MiningDropdown(Select):
                 color=0x8f92b1
             )
             embed.add_field(name="Total CRN Mined", value=f"**{total_mined}** CRN", inline=False)
+            
+            # Recent activity from the pre-aggregated history buckets
+            try:
+                history = await asyncio.to_thread(mining_series.summary, user_id)
+                embed.add_field(name="Last 7 Days", value=f"{history['7d']:.2f} CRN", inline=True)
+                embed.add_field(name="Last 30 Days", value=f"{history['30d']:.2f} CRN", inline=True)
+                embed.add_field(name="Last 365 Days", value=f"{history['365d']:.2f} CRN", inline=True)
+                embed.add_field(name="Activity (30 days)", value=f"`{history['sparkline']}`", inline=False)
+            except Exception as e:
+                print(f"Error loading mining history: {e}")
             embed.add_field(name="Dashboard", value="[Open Mining Dashboard](https://cryptonel.online/mining)", inline=False)
             embed.set_footer(text="Cryptonel Mining")
             
@@ -246,10 +260,59 @@ class MiningDropdown(Select):
             except:
                 pass
 
+    async def mining_reminders_callback(self, interaction: discord.Interaction):
+        user_id = str(interaction.user.id)
+        
+        # Toggle the reminder subscription
+        if mining_reminders.is_subscribed(user_id):
+            mining_reminders.unsubscribe(user_id)
+            embed = discord.Embed(
+                title="🔕 Mining Reminders Off",
+                description="You will no longer get a DM when your mining cooldown ends.",
+                color=0x8f92b1
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        
+        remind_at = mining_reminders.subscribe(user_id, mining_status_cache.get(user_id).last_mined)
+        
+        if remind_at is not None:
+            description = f"You will get a DM <t:{int(remind_at.timestamp())}:R> when your cooldown ends, and after every mining session from now on."
+        else:
+            description = "You can mine right now! From your next mining session on, you will get a DM when your cooldown ends."
+        embed = discord.Embed(
+            title="🔔 Mining Reminders On",
+            description=description,
+            color=0x8f92b1
+        )
+        embed.set_footer(text="Make sure your DMs are open for this server. Select this option again to turn reminders off.")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
 class MiningCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.rate_limiter = RateLimiter(max_calls=10, cooldown=60)
+        self.downsample_task = None
+        self.poll_task = None
+    
+    async def cog_load(self):
+        # Dashboard writes refresh cached statuses, move pending reminders and feed the history
+        mining_feed.subscribe(mining_status_cache.on_mining_change)
+        mining_feed.subscribe(mining_reminders.on_mining_change)
+        mining_feed.subscribe(mining_series.on_mining_change)
+        mining_feed.start()
+        await mining_reminders.start(self.bot)
+        self.downsample_task = asyncio.create_task(mining_series.downsample_loop())
+        self.poll_task = asyncio.create_task(mining_series.poll_loop())
+        registry.register_cache("mining_status", mining_status_cache)
+        registry.register_cache("mining_settings", mining_settings_cache)
+    
+    async def cog_unload(self):
+        mining_reminders.stop()
+        if self.downsample_task:
+            self.downsample_task.cancel()
+        if self.poll_task:
+            self.poll_task.cancel()
     
     @app_commands.command(name="mining", description="Access Cryptonel mining features")
     async def mining(self, interaction: discord.Interaction):
@@ -261,6 +324,7 @@ class MiningCog(commands.Cog):
             
             # Check rate limiting
             if self.rate_limiter.is_rate_limited(str(interaction.user.id)):
+                RATE_LIMIT_REJECTIONS.inc(limiter="mining")
                 embed = discord.Embed(
                     title="⚠️ Rate Limited",
                     description="You're using this command too frequently. Please wait a minute before trying again.",
@@ -0,0 +1,77 @@
+import pymongo
+import os
+import asyncio
+import datetime
+import traceback
+from typing import Callable, Dict, Iterable, List, Optional
+from dotenv import load_dotenv
+
+from ..change_feed import ChangeFeed
+from ..scheduler import utc_now
+from ..settings_cache import SettingsCache
+
+# Load environment variables
+load_dotenv('clyne.env')
+
+# MongoDB connection
+MONGODB_URI = os.getenv('MONGODB_URI')
+client = pymongo.MongoClient(MONGODB_URI)
+
+# Define databases and collections
+db_mining = client['cryptonel_mining']
+mining_data = db_mining['mining_data']
+
+# Mining parameters, editable in cryptonel_mining.settings without a restart
+mining_settings_cache = SettingsCache(db_mining['settings'], "mining_settings")
+
+# Hours a user has to wait between two mining sessions unless configured otherwise
+DEFAULT_COOLDOWN_HOURS = 24
+# Seconds between two mining_data polls when change streams are not available
+FALLBACK_POLL_SECONDS = 60
+
+# Function to get the current mining cooldown
+def get_mining_cooldown() -> datetime.timedelta:
+    try:
+        mining_settings = mining_settings_cache.get() or {}
+        hours = float(mining_settings.get("cooldown_hours", DEFAULT_COOLDOWN_HOURS))
+    except Exception as e:
+        print(f"Error reading mining cooldown, using the default: {e}")
+        hours = DEFAULT_COOLDOWN_HOURS
+    return datetime.timedelta(hours=hours)
+
+# Mining happens on the dashboard, so the bot learns about it from the collection itself
+mining_feed = ChangeFeed("mining", mining_data, ["last_mined", "total_mined"])
+
+# Function to read the mining documents written since a point in time (blocking)
+def mining_changes_since(since: datetime.datetime, user_ids: Optional[Iterable[str]] = None) -> List[Dict]:
+    """Polling stand-in for mining_feed; returns documents shaped like its events"""
+    query = {"last_mined": {"$gt": since}}
+    if user_ids is not None:
+        query["user_id"] = {"$in": list(user_ids)}
+    return list(mining_data.find(query, {"_id": 0, "user_id": 1, "last_mined": 1, "total_mined": 1}))
+
+async def poll_mining_changes(name: str, callback: Callable[[Dict], None], user_ids: Optional[Callable[[], Iterable[str]]] = None):
+    """
+    Hand mining_data changes to a feed subscriber while mining_feed is unavailable
+
+    Runs for the lifetime of the cog and only queries when the feed has
+    reported that change streams are unsupported. Each poll reads back one
+    extra interval to cover writes stamped by a clock slightly behind
+    ours, so subscribers see some documents twice and must ignore repeats.
+    """
+    since = utc_now()
+    while True:
+        await asyncio.sleep(FALLBACK_POLL_SECONDS)
+        started = utc_now()
+        if mining_feed.available is not False:
+            since = started
+            continue
+        try:
+            ids = None if user_ids is None else list(user_ids())
+            documents = await asyncio.to_thread(mining_changes_since, since, ids) if ids != [] else []
+            for document in documents:
+                callback(document)
+            since = started - datetime.timedelta(seconds=FALLBACK_POLL_SECONDS)
+        except Exception as e:
+            print(f"Error polling mining changes for {name}: {e}")
+            print(traceback.format_exc())
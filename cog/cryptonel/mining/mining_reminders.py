@@ -0,0 +1,163 @@
+import discord
+from discord.ui import View, Button
+import asyncio
+import datetime
+import traceback
+from typing import Dict, List, Optional, Set
+
+from pymongo import ASCENDING, UpdateOne, DeleteOne
+
+from .mining_events import db_mining, mining_data, get_mining_cooldown, poll_mining_changes
+from ..scheduler import DeadlineScheduler, as_utc, utc_now
+
+# Pause between two reminder DMs, to stay well inside Discord's rate limits
+DM_INTERVAL_SECONDS = 0.5
+# Reminders sent per scheduler batch
+REMINDER_BATCH_SIZE = 25
+
+class MiningReminderService:
+    """
+    Opt-in "ready to mine" DM reminders
+
+    Opted-in users live in cryptonel_mining.mining_reminders with the time
+    their cooldown ends (remind_at, indexed). The deadline scheduler loads
+    upcoming reminders one window at a time and fires them in batches; the
+    batch re-reads last_mined with one $in query, so a user who mined again
+    in the meantime is rescheduled instead of messaged. New mining sessions
+    arrive through the mining change feed and move remind_at forward; when
+    change streams are not supported, the subscribers' mining_data
+    documents are polled instead.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.scheduler = DeadlineScheduler(
+            "mining reminders", self.load_window, self.send_batch, batch_size=REMINDER_BATCH_SIZE
+        )
+        self.subscribed: Set[str] = set()
+        self.bot = None
+        self.poll_task: Optional[asyncio.Task] = None
+        self.indexes_ready = False
+
+    def ensure_indexes(self):
+        if self.indexes_ready:
+            return
+        self.collection.create_index([("remind_at", ASCENDING)])
+        self.indexes_ready = True
+
+    async def start(self, bot):
+        self.bot = bot
+        try:
+            # Only the ids are kept, so mining updates can be matched without a query
+            self.subscribed = await asyncio.to_thread(lambda: {
+                document["_id"] for document in self.collection.find({}, {"_id": 1})
+            })
+        except Exception as e:
+            print(f"Error loading mining reminder subscriptions: {e}")
+            print(traceback.format_exc())
+        self.scheduler.start()
+        if self.poll_task is None or self.poll_task.done():
+            self.poll_task = asyncio.create_task(
+                poll_mining_changes("mining reminders", self.on_mining_change, lambda: self.subscribed)
+            )
+
+    def stop(self):
+        self.scheduler.stop()
+        if self.poll_task:
+            self.poll_task.cancel()
+            self.poll_task = None
+
+    def load_window(self, horizon: datetime.datetime):
+        self.ensure_indexes()
+        cursor = self.collection.find({"remind_at": {"$lte": horizon}}, {"remind_at": 1})
+        return [(document["_id"], document["remind_at"]) for document in cursor]
+
+    def is_subscribed(self, user_id: str) -> bool:
+        return user_id in self.subscribed
+
+    def subscribe(self, user_id: str, last_mined: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+        """Opt a user in; returns when the first reminder will be sent, if one is pending"""
+        self.ensure_indexes()
+        remind_at = None
+        if last_mined is not None and as_utc(last_mined) + get_mining_cooldown() > utc_now():
+            remind_at = as_utc(last_mined) + get_mining_cooldown()
+        self.collection.update_one(
+            {"_id": user_id},
+            {"$set": {"remind_at": remind_at}, "$setOnInsert": {"created_at": utc_now()}},
+            upsert=True
+        )
+        self.subscribed.add(user_id)
+        if remind_at is not None:
+            self.scheduler.schedule(user_id, remind_at)
+        return remind_at
+
+    def unsubscribe(self, user_id: str):
+        self.collection.delete_one({"_id": user_id})
+        self.subscribed.discard(user_id)
+        self.scheduler.cancel(user_id)
+
+    def on_mining_change(self, document: Dict):
+        """Move a subscriber's reminder to the end of their new cooldown
+
+        Runs synchronously on the event loop, so one user's events are
+        applied in the order the feed or the poll delivers them.
+        """
+        user_id = document.get("user_id")
+        last_mined = document.get("last_mined")
+        if user_id not in self.subscribed or last_mined is None:
+            return
+        remind_at = as_utc(last_mined) + get_mining_cooldown()
+        self.collection.update_one({"_id": user_id}, {"$set": {"remind_at": remind_at}})
+        self.scheduler.schedule(user_id, remind_at)
+
+    async def send_batch(self, user_ids: List[str]):
+        # Re-read last_mined so reminders never go out to users who mined again
+        mining_info = await asyncio.to_thread(lambda: {
+            document["user_id"]: document.get("last_mined")
+            for document in mining_data.find({"user_id": {"$in": user_ids}}, {"user_id": 1, "last_mined": 1})
+        })
+
+        now = utc_now()
+        cooldown = get_mining_cooldown()
+        operations = []
+        for user_id in user_ids:
+            last_mined = mining_info.get(user_id)
+            if last_mined is not None and as_utc(last_mined) + cooldown > now:
+                remind_at = as_utc(last_mined) + cooldown
+                operations.append(UpdateOne({"_id": user_id}, {"$set": {"remind_at": remind_at}}))
+                self.scheduler.schedule(user_id, remind_at)
+                continue
+
+            try:
+                user = self.bot.get_user(int(user_id)) or await self.bot.fetch_user(int(user_id))
+                await user.send(embed=reminder_embed(), view=reminder_view())
+                operations.append(UpdateOne({"_id": user_id}, {"$set": {"remind_at": None, "last_sent_at": now}}))
+            except discord.Forbidden:
+                # DMs are closed; stop trying until the user opts in again
+                operations.append(DeleteOne({"_id": user_id}))
+                self.subscribed.discard(user_id)
+            except Exception as e:
+                print(f"Error sending mining reminder to {user_id}: {e}")
+                operations.append(UpdateOne({"_id": user_id}, {"$set": {"remind_at": None}}))
+            await asyncio.sleep(DM_INTERVAL_SECONDS)
+
+        if operations:
+            await asyncio.to_thread(self.collection.bulk_write, operations, ordered=False)
+
+# Shared service started by the mining cog
+mining_reminders = MiningReminderService(db_mining['mining_reminders'])
+
+# Function to build the reminder message
+def reminder_embed() -> discord.Embed:
+    embed = discord.Embed(
+        title="⛏️ Ready to Mine!",
+        description="Your mining cooldown is over. You can mine again now!",
+        color=0x8f92b1
+    )
+    embed.set_footer(text="Turn reminders off from /mining at any time.")
+    return embed
+
+def reminder_view() -> View:
+    view = View()
+    view.add_item(Button(label="Start Mining Now", url="https://cryptonel.online/mining", style=discord.ButtonStyle.url))
+    return view
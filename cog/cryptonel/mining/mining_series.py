@@ -0,0 +1,201 @@
+import asyncio
+import datetime
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+from .mining_events import db_mining, mining_data, poll_mining_changes
+from ..scheduler import as_utc, utc_now
+
+# Daily values are kept this long; older months are downsampled to a monthly total
+DAILY_RETENTION_DAYS = 400
+# Seconds between two downsampling passes
+DOWNSAMPLE_INTERVAL_SECONDS = 86400
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+# Function to get the bucket a timestamp belongs to
+def month_start(value: datetime.datetime) -> datetime.datetime:
+    return datetime.datetime(value.year, value.month, 1, tzinfo=datetime.timezone.utc)
+
+# Function to parse the numeric strings stored in mining_data
+def parse_total(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class MiningSeries:
+    """
+    Per-user mining history stored as monthly buckets of daily totals
+
+    One document per user and month in cryptonel_mining.mining_series holds
+    the month's total and a days map ({"01": amount, ...}), so a 365-day
+    window reads at most 13 small documents from the (user_id, month)
+    index. Buckets older than DAILY_RETENTION_DAYS are downsampled to their
+    monthly total.
+
+    The amount mined in a session is the increase of total_mined seen on
+    the mining change feed, or on a mining_data poll when change streams
+    are not supported. The last seen total of each user is kept in
+    mining_series_state and swapped atomically, so duplicate events add
+    nothing. Each user's events are recorded one at a time in arrival
+    order, since a later total swapped in first would make the earlier
+    one look like a decrease and the next session count twice. The first
+    total seen for a user without state only becomes their baseline, so
+    a lifetime total that predates the history is never counted as one
+    session.
+    """
+
+    def __init__(self, buckets, state):
+        self.buckets = buckets
+        self.state = state
+        # User id -> events waiting behind the one being recorded
+        self.pending: Dict[str, List[Tuple[float, datetime.datetime]]] = {}
+        self.indexes_ready = False
+
+    def ensure_indexes(self):
+        if self.indexes_ready:
+            return
+        self.buckets.create_index([("user_id", ASCENDING), ("month", ASCENDING)], unique=True)
+        self.indexes_ready = True
+
+    def record(self, user_id: str, total_mined: float, timestamp: datetime.datetime):
+        """Add the increase of a user's total_mined to today's bucket (blocking)"""
+        self.ensure_indexes()
+        previous = self.state.find_one_and_update(
+            {"_id": user_id},
+            {"$set": {"last_total": total_mined}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        # First sight of this user: the current total is the baseline, not a session
+        if previous is None:
+            return
+        amount = round(total_mined - previous.get("last_total", 0.0), 8)
+        if amount <= 0:
+            return
+
+        timestamp = as_utc(timestamp)
+        self.buckets.update_one(
+            {"user_id": user_id, "month": month_start(timestamp)},
+            {"$inc": {"total": amount, "sessions": 1, f"days.{timestamp.day:02d}": amount}},
+            upsert=True
+        )
+
+    def on_mining_change(self, document: Dict):
+        """Change feed subscriber; the writes run in a worker thread, in order per user"""
+        user_id = document.get("user_id")
+        total_mined = parse_total(document.get("total_mined"))
+        if not user_id or total_mined is None:
+            return
+        timestamp = document.get("last_mined")
+        if not isinstance(timestamp, datetime.datetime):
+            timestamp = utc_now()
+        events = self.pending.get(user_id)
+        if events is not None:
+            # The user's drain task is already running and will pick it up
+            events.append((total_mined, timestamp))
+            return
+        self.pending[user_id] = [(total_mined, timestamp)]
+        asyncio.get_running_loop().create_task(self._drain(user_id))
+
+    async def _drain(self, user_id: str):
+        events = self.pending[user_id]
+        while events:
+            total_mined, timestamp = events.pop(0)
+            try:
+                await asyncio.to_thread(self.record, user_id, total_mined, timestamp)
+            except Exception as e:
+                print(f"Error recording mining history for {user_id}: {e}")
+                print(traceback.format_exc())
+        del self.pending[user_id]
+
+    async def poll_loop(self):
+        """Polling fallback for on_mining_change while the mining change feed is unavailable"""
+        await poll_mining_changes("mining history", self.on_mining_change)
+
+    def daily_totals(self, user_id: str, days: int = 365) -> Dict[datetime.date, float]:
+        """Daily amounts mined over the last `days` days (blocking)"""
+        today = utc_now().date()
+        first_day = today - datetime.timedelta(days=days - 1)
+        first_month = datetime.datetime(first_day.year, first_day.month, 1, tzinfo=datetime.timezone.utc)
+
+        totals = {}
+        for bucket in self.buckets.find({"user_id": user_id, "month": {"$gte": first_month}}, {"month": 1, "days": 1}):
+            month = as_utc(bucket["month"])
+            for day, amount in (bucket.get("days") or {}).items():
+                date = datetime.date(month.year, month.month, int(day))
+                if first_day <= date <= today:
+                    totals[date] = amount
+        return totals
+
+    def summary(self, user_id: str) -> Dict:
+        """7, 30 and 365-day totals plus a 30-day sparkline (blocking)"""
+        totals = self.daily_totals(user_id, 365)
+        today = utc_now().date()
+
+        def window(days: int) -> float:
+            first_day = today - datetime.timedelta(days=days - 1)
+            return sum(amount for date, amount in totals.items() if date >= first_day)
+
+        last_30 = [totals.get(today - datetime.timedelta(days=offset), 0.0) for offset in range(29, -1, -1)]
+        return {
+            "7d": window(7),
+            "30d": window(30),
+            "365d": window(365),
+            "sparkline": sparkline(last_30)
+        }
+
+    def downsample(self) -> int:
+        """Collapse buckets past the retention window into monthly totals (blocking)"""
+        cutoff = month_start(utc_now() - datetime.timedelta(days=DAILY_RETENTION_DAYS))
+        result = self.buckets.update_many(
+            {"month": {"$lt": cutoff}, "days": {"$exists": True}},
+            {"$unset": {"days": ""}}
+        )
+        return result.modified_count
+
+    async def downsample_loop(self):
+        while True:
+            try:
+                collapsed = await asyncio.to_thread(self.downsample)
+                if collapsed:
+                    print(f"Downsampled {collapsed} mining history bucket(s)")
+            except Exception as e:
+                print(f"Error downsampling mining history: {e}")
+                print(traceback.format_exc())
+            await asyncio.sleep(DOWNSAMPLE_INTERVAL_SECONDS)
+
+# Function to draw a list of values as a one-line text chart
+def sparkline(values: List[float]) -> str:
+    peak = max(values) if values else 0
+    if peak <= 0:
+        return SPARK_CHARS[0] * len(values)
+    return "".join(SPARK_CHARS[min(len(SPARK_CHARS) - 1, int(value / peak * (len(SPARK_CHARS) - 1) + 0.5))] for value in values)
+
+# Shared history store fed by the mining change feed
+mining_series = MiningSeries(db_mining['mining_series'], db_mining['mining_series_state'])
+
+# Function to record every user's current total up front, so their next session is counted in full
+def seed_series_state(chunk_size: int = 500) -> int:
+    processed = 0
+    operations = []
+    for document in mining_data.find({}, {"user_id": 1, "total_mined": 1}, batch_size=chunk_size):
+        total_mined = parse_total(document.get("total_mined"))
+        if not document.get("user_id") or total_mined is None:
+            continue
+        operations.append(UpdateOne({"_id": document["user_id"]}, {"$set": {"last_total": total_mined}}, upsert=True))
+        processed += 1
+        if len(operations) >= chunk_size:
+            mining_series.state.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        mining_series.state.bulk_write(operations, ordered=False)
+    print(f"Mining history state seeded for {processed} users")
+    return processed
+
+if __name__ == "__main__":
+    # python -m cog.cryptonel.mining.mining_series
+    seed_series_state()
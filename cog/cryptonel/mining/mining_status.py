@@ -0,0 +1,76 @@
+import datetime
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from .mining_events import mining_data, mining_feed, get_mining_cooldown
+from ..scheduler import as_utc
+
+# Seconds a snapshot is trusted when the change feed is not running
+FALLBACK_TTL_SECONDS = 60
+
+class MiningStatus:
+    """Snapshot of one user's mining document"""
+
+    __slots__ = ("exists", "last_mined", "total_mined", "loaded_at")
+
+    def __init__(self, document: Optional[Dict]):
+        self.exists = document is not None
+        last_mined = document.get("last_mined") if document else None
+        self.last_mined = as_utc(last_mined) if isinstance(last_mined, datetime.datetime) else None
+        self.total_mined = document.get("total_mined", "0") if document else "0"
+        self.loaded_at = time.monotonic()
+
+    def next_mining_time(self) -> Optional[datetime.datetime]:
+        """When the user can mine next, or None if they have never mined"""
+        if self.last_mined is None:
+            return None
+        return self.last_mined + get_mining_cooldown()
+
+class MiningStatusCache:
+    """
+    LRU cache of mining status snapshots, kept current by the mining change feed
+
+    Check Mining and Mining Stats read from here, so repeated clicks never
+    touch mining_data. Dashboard writes arrive through the change feed and
+    refresh cached snapshots in place. Without a change feed, snapshots
+    expire after FALLBACK_TTL_SECONDS instead.
+    """
+
+    def __init__(self, max_users: int = 10000):
+        self.max_users = max_users
+        self.entries: "OrderedDict[str, MiningStatus]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> MiningStatus:
+        """Return the user's snapshot, loading it on a miss (blocking)"""
+        status = self.entries.get(user_id)
+        if status is not None and (mining_feed.available or time.monotonic() - status.loaded_at < FALLBACK_TTL_SECONDS):
+            self.entries.move_to_end(user_id)
+            self.hits += 1
+            return status
+
+        self.misses += 1
+        document = mining_data.find_one({"user_id": user_id}, {"last_mined": 1, "total_mined": 1})
+        status = MiningStatus(document)
+        self.store(user_id, status)
+        return status
+
+    def store(self, user_id: str, status: MiningStatus):
+        self.entries[user_id] = status
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.max_users:
+            self.entries.popitem(last=False)
+
+    def on_mining_change(self, document: Dict):
+        """Refresh a cached snapshot from a changed mining document"""
+        user_id = document.get("user_id")
+        if user_id in self.entries:
+            self.store(user_id, MiningStatus(document))
+
+    def invalidate(self, user_id: str):
+        self.entries.pop(user_id, None)
+
+# Shared cache for the mining commands
+mining_status_cache = MiningStatusCache()
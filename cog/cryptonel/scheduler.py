@@ -0,0 +1,143 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import traceback
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Function to compare stored datetimes with aware UTC times (MongoDB returns naive UTC)
+def as_utc(value: datetime.datetime) -> datetime.datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+def utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+class DeadlineScheduler:
+    """
+    In-process scheduler for deadlines stored in MongoDB
+
+    Deadlines live in a min-heap and the loop sleeps until the earliest one
+    is due, or until schedule() pushes an earlier one; nothing is polled.
+    Only deadlines up to now + lookahead are held in memory: load_window is
+    called (in a worker thread) with that horizon at startup and every time
+    the horizon is reached, and must return (key, due_at) pairs for
+    everything due up to it, overdue entries included. Due keys are handed
+    to fire_batch in batches of at most batch_size.
+
+    Cancelling or rescheduling is lazy: the key's current deadline is kept
+    in a dict and stale heap entries are skipped when popped.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        load_window: Callable[[datetime.datetime], Iterable[Tuple[Hashable, datetime.datetime]]],
+        fire_batch: Callable[[List[Hashable]], Awaitable[None]],
+        lookahead_seconds: float = 3600,
+        batch_size: int = 50,
+        retry_seconds: float = 60
+    ):
+        self.name = name
+        self.load_window = load_window
+        self.fire_batch = fire_batch
+        self.lookahead = datetime.timedelta(seconds=lookahead_seconds)
+        self.batch_size = batch_size
+        self.retry = datetime.timedelta(seconds=retry_seconds)
+        self.heap: List[Tuple[datetime.datetime, int, Hashable]] = []
+        self.deadlines: Dict[Hashable, datetime.datetime] = {}
+        self.horizon: Optional[datetime.datetime] = None
+        self.counter = itertools.count()
+        self.wake: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
+
+    def schedule(self, key: Hashable, due_at: datetime.datetime):
+        """Add or move a deadline; ones beyond the horizon are left to the next window load"""
+        due_at = as_utc(due_at)
+        if self.horizon is not None and due_at > self.horizon:
+            self.deadlines.pop(key, None)
+            return
+        self.deadlines[key] = due_at
+        heapq.heappush(self.heap, (due_at, next(self.counter), key))
+        if self.wake is not None and self.heap[0][2] == key:
+            self.wake.set()
+        self._compact()
+
+    def cancel(self, key: Hashable):
+        self.deadlines.pop(key, None)
+        self._compact()
+
+    def _compact(self):
+        # Drop stale entries once they outnumber the live ones
+        if len(self.heap) > 2 * len(self.deadlines) + 64:
+            self.heap = [
+                item for item in self.heap
+                if self.deadlines.get(item[2]) == item[0]
+            ]
+            heapq.heapify(self.heap)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.wake = asyncio.Event()
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _reload(self):
+        horizon = utc_now() + self.lookahead
+        try:
+            entries = await asyncio.to_thread(lambda: list(self.load_window(horizon)))
+        except Exception as e:
+            print(f"Error loading {self.name} window: {e}")
+            print(traceback.format_exc())
+            # Try again shortly, keeping whatever is already scheduled
+            self.horizon = utc_now() + self.retry
+            return
+        self.horizon = horizon
+        for key, due_at in entries:
+            due_at = as_utc(due_at)
+            if self.deadlines.get(key) != due_at:
+                self.deadlines[key] = due_at
+                heapq.heappush(self.heap, (due_at, next(self.counter), key))
+        self._compact()
+
+    def _pop_due(self, now: datetime.datetime) -> List[Hashable]:
+        due = []
+        while self.heap and self.heap[0][0] <= now and len(due) < self.batch_size:
+            due_at, _, key = heapq.heappop(self.heap)
+            if self.deadlines.get(key) != due_at:
+                continue
+            del self.deadlines[key]
+            due.append(key)
+        return due
+
+    async def _run(self):
+        await self._reload()
+        while True:
+            now = utc_now()
+            due = self._pop_due(now)
+            if due:
+                try:
+                    await self.fire_batch(due)
+                except Exception as e:
+                    print(f"Error running {self.name} batch of {len(due)}: {e}")
+                    print(traceback.format_exc())
+                continue
+
+            if now >= self.horizon:
+                await self._reload()
+                continue
+
+            next_at = min(self.heap[0][0], self.horizon) if self.heap else self.horizon
+            self.wake.clear()
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=(next_at - now).total_seconds())
+            except asyncio.TimeoutError:
+                pass
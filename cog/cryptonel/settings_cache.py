@@ -0,0 +1,36 @@
+import time
+import traceback
+from typing import Dict, Optional
+
+class SettingsCache:
+    """Short-lived in-memory snapshot of a single settings document"""
+
+    def __init__(self, collection, document_id: str, ttl_seconds: float = 30.0):
+        self.collection = collection
+        self.document_id = document_id
+        self.ttl_seconds = ttl_seconds
+        self.document: Optional[Dict] = None
+        self.loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self) -> Optional[Dict]:
+        """Return the cached document, reloading it once the TTL has passed"""
+        now = time.monotonic()
+        if self.document is None or now - self.loaded_at >= self.ttl_seconds:
+            self.misses += 1
+            try:
+                self.document = self.collection.find_one({"_id": self.document_id})
+                self.loaded_at = now
+            except Exception as e:
+                # Keep serving the last known snapshot if the database hiccups
+                print(f"Error loading settings '{self.document_id}': {e}")
+                print(traceback.format_exc())
+                if self.document is None:
+                    raise
+        else:
+            self.hits += 1
+        return self.document
+
+    def invalidate(self):
+        self.document = None
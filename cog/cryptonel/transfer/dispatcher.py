@@ -0,0 +1,166 @@
+import asyncio
+import contextlib
+from typing import Dict, List, Optional
+
+from .utils import users, calculate_fee, record_transaction, record_split_transaction, find_completed_transfer
+from .fee_engine import compile_fee_schedule
+from cog.stats.metrics.tracing import traced
+
+class TransferDispatcher:
+    """
+    Serializes transfers per sender wallet
+
+    Each sender gets a lightweight asyncio.Lock, so two transfers from the
+    same wallet never check the balance at the same time, while transfers
+    from different senders still run in parallel. A lock is dropped as
+    soon as nobody holds or waits for it.
+    """
+
+    def __init__(self):
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.waiters: Dict[str, int] = {}
+
+    @contextlib.asynccontextmanager
+    async def serialize(self, sender_id: str):
+        lock = self.locks.get(sender_id)
+        if lock is None:
+            lock = self.locks[sender_id] = asyncio.Lock()
+        self.waiters[sender_id] = self.waiters.get(sender_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self.waiters[sender_id] -= 1
+            if self.waiters[sender_id] == 0:
+                # Garbage-collect idle locks
+                del self.waiters[sender_id]
+                del self.locks[sender_id]
+
+    def active_senders(self) -> int:
+        return len(self.locks)
+
+# Shared dispatcher for every transfer entry point
+transfer_dispatcher = TransferDispatcher()
+
+# Function to run a transfer through the per-sender queue
+@traced("execute_transfer")
+async def execute_transfer(
+    sender_id: str,
+    recipient_data: Dict,
+    amount: float,
+    reason: str,
+    transfer_settings: Dict,
+    idempotency_key: Optional[str] = None
+) -> Dict:
+    """
+    Re-read the sender's wallet, check the balance and record the transfer
+    while holding the sender's lock
+
+    Returns a dict with "status" set to "completed", "no_wallet" or
+    "insufficient_funds", plus the amounts involved. A repeated
+    idempotency_key returns the original transfer instead of a new one.
+    """
+    async with transfer_dispatcher.serialize(sender_id):
+        # A duplicate of a transfer that already went through is reported as-is
+        existing = await find_completed_transfer(idempotency_key)
+        if existing:
+            amount = float(existing.get("amount", amount))
+            fee = float(existing.get("fee", "0"))
+            return {
+                "status": "completed",
+                "amount": amount,
+                "fee": fee,
+                "amount_after_fee": float(existing.get("recipient_amount", amount - fee)),
+                "required": amount + fee,
+                "balance": None,
+                "tx_id": existing.get("tx_id"),
+                "duplicate": True
+            }
+        
+        # Never trust a balance captured when the modal was opened
+        sender_data = users.find_one({"user_id": sender_id})
+        if not sender_data:
+            return {"status": "no_wallet"}
+
+        is_premium = sender_data.get("premium", False)
+        fee, amount_after_fee = await calculate_fee(amount, is_premium, transfer_settings)
+        required = float(f"{amount + fee:.8f}")
+        balance = float(sender_data.get("balance", "0"))
+
+        result = {
+            "amount": amount,
+            "fee": fee,
+            "amount_after_fee": amount_after_fee,
+            "required": required,
+            "balance": balance,
+            "tx_id": None
+        }
+        if required > balance:
+            result["status"] = "insufficient_funds"
+            return result
+
+        result["tx_id"] = await record_transaction(
+            sender_data,
+            recipient_data,
+            float(f"{amount:.8f}"),
+            float(f"{amount_after_fee:.8f}"),
+            float(f"{fee:.8f}"),
+            reason,
+            idempotency_key=idempotency_key
+        )
+        result["status"] = "completed"
+        return result
+
+# Function to run a split payment through the per-sender queue
+async def execute_split_transfer(
+    sender_id: str,
+    recipients: List[Dict],
+    amounts: List[float],
+    reason: str,
+    transfer_settings: Dict,
+    idempotency_key: Optional[str] = None,
+    send_emails: bool = True
+) -> Dict:
+    """
+    Quote every amount in one batch, check the sender can cover the total
+    and record all legs as a single ledger entry, under the sender's lock
+    """
+    async with transfer_dispatcher.serialize(sender_id):
+        existing = await find_completed_transfer(idempotency_key)
+        if existing:
+            return {"status": "completed", "batch_id": existing.get("tx_id"), "tx_ids": [], "duplicate": True}
+
+        sender_data = users.find_one({"user_id": sender_id})
+        if not sender_data:
+            return {"status": "no_wallet"}
+
+        # One fee quote for the whole batch
+        quotes = compile_fee_schedule(transfer_settings).quote_many(amounts, sender_data.get("premium", False))
+        required = float(f"{sum(quote.total for quote in quotes):.8f}")
+        balance = float(sender_data.get("balance", "0"))
+
+        result = {
+            "quotes": quotes,
+            "required": required,
+            "balance": balance,
+            "batch_id": None,
+            "tx_ids": []
+        }
+        if required > balance:
+            result["status"] = "insufficient_funds"
+            return result
+
+        legs = [
+            {
+                "recipient_data": recipient_data,
+                "amount": quote.amount,
+                "recipient_amount": quote.amount_after_fee,
+                "fee": quote.fee
+            }
+            for recipient_data, quote in zip(recipients, quotes)
+        ]
+        result["batch_id"], result["tx_ids"] = await record_split_transaction(
+            sender_data, legs, reason, idempotency_key=idempotency_key, send_emails=send_emails
+        )
+        result["status"] = "completed"
+        return result
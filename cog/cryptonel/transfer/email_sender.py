@@ -5,6 +5,7 @@ from datetime import datetime
 import sys
 import os.path
 from dotenv import load_dotenv
+from cog.stats.metrics.registry import EMAIL_QUEUE_DEPTH
 
 # Try to load environment variables from multiple possible locations
 # First try the current directory
@@ -77,86 +78,117 @@ def format_decimal(value):
     except:
         return str(value)
 
+def build_transaction_messages(sender, recipient, transaction):
+    """
+    Build the sender and recipient notification emails for one transaction
+    as (to_email, to_name, subject, html_body) tuples
+    """
+    # Get email addresses from users
+    sender_email = sender.get("email")
+    recipient_email = recipient.get("email")
+        
+    # Check if valid emails exist
+    if not sender_email or not recipient_email:
+        print(f"Missing email addresses for notification. Sender: {sender.get('username')}, Recipient: {recipient.get('username')}")
+        # Don't proceed if we don't have valid emails
+        return []
+    
+    print(f"Sending transaction notification to sender email: {sender_email}")
+    print(f"Sending transaction notification to recipient email: {recipient_email}")
+    
+    # Format timestamp
+    timestamp = transaction.get("timestamp")
+    if isinstance(timestamp, str):
+        try:
+            dt = datetime.fromisoformat(timestamp)
+            formatted_time = dt.strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            formatted_time = timestamp
+    else:
+        formatted_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    # Get transfer reason
+    transfer_reason = transaction.get("reason", "Not specified")
+    
+    # Generate HTML for sender and recipient
+    sender_html = generate_sender_email(
+        total_amount=transaction.get("amount"),
+        tax=transaction.get("tax", transaction.get("fee", "0")),
+        recipient_data={'public_address': recipient.get("public_address", "Unknown")},
+        transaction_id=transaction.get("tx_id", transaction.get("id", "Unknown")),
+        formatted_time=formatted_time,
+        reason=transfer_reason
+    )
+    
+    # Use the same amount value for the recipient as the sender to keep information consistent
+    recipient_html = generate_recipient_email(
+        total_amount=transaction.get("amount"),  # Use the same amount as sender email
+        tax=transaction.get("tax", transaction.get("fee", "0")),
+        sender_data={'public_address': sender.get("public_address", "Unknown")},
+        transaction_id=transaction.get("tx_id", transaction.get("id", "Unknown")),
+        formatted_time=formatted_time,
+        reason=transfer_reason
+    )
+    
+    return [
+        (sender_email, sender.get("username", "Cryptonel User"), "CRN Transfer Successful", sender_html),
+        (recipient_email, recipient.get("username", "Cryptonel User"), "CRN Received Successfully", recipient_html)
+    ]
+
 def send_transaction_emails(sender, recipient, transaction, users_collection):
     """
     Send transaction notification emails to both sender and recipient
     """
     try:
-        # Get email addresses from users
-        sender_email = sender.get("email")
-        recipient_email = recipient.get("email")
-            
-        # Check if valid emails exist
-        if not sender_email or not recipient_email:
-            print(f"Missing email addresses for notification. Sender: {sender.get('username')}, Recipient: {recipient.get('username')}")
-            # Don't proceed if we don't have valid emails
+        messages = build_transaction_messages(sender, recipient, transaction)
+        if not messages:
             return False
         
-        print(f"Sending transaction notification to sender email: {sender_email}")
-        print(f"Sending transaction notification to recipient email: {recipient_email}")
-        
-        # Format timestamp
-        timestamp = transaction.get("timestamp")
-        if isinstance(timestamp, str):
-            try:
-                dt = datetime.fromisoformat(timestamp)
-                formatted_time = dt.strftime('%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                formatted_time = timestamp
-        else:
-            formatted_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Get transfer reason
-        transfer_reason = transaction.get("reason", "Not specified")
-        
-        # Generate HTML for sender and recipient
-        sender_html = generate_sender_email(
-            total_amount=transaction.get("amount"),
-            tax=transaction.get("tax", transaction.get("fee", "0")),
-            recipient_data={'public_address': recipient.get("public_address", "Unknown")},
-            transaction_id=transaction.get("tx_id", transaction.get("id", "Unknown")),
-            formatted_time=formatted_time,
-            reason=transfer_reason
-        )
-        
-        # Use the same amount value for the recipient as the sender to keep information consistent
-        recipient_html = generate_recipient_email(
-            total_amount=transaction.get("amount"),  # Use the same amount as sender email
-            tax=transaction.get("tax", transaction.get("fee", "0")),
-            sender_data={'public_address': sender.get("public_address", "Unknown")},
-            transaction_id=transaction.get("tx_id", transaction.get("id", "Unknown")),
-            formatted_time=formatted_time,
-            reason=transfer_reason
-        )
-        
         # Send emails in separate threads to avoid blocking
-        threading.Thread(
-            target=send_email,
-            args=(
-                sender_email, 
-                sender.get("username", "Cryptonel User"),
-                "CRN Transfer Successful", 
-                sender_html
-            ),
-            daemon=True
-        ).start()
-        
-        threading.Thread(
-            target=send_email,
-            args=(
-                recipient_email, 
-                recipient.get("username", "Cryptonel User"),
-                "CRN Received Successfully", 
-                recipient_html
-            ),
-            daemon=True
-        ).start()
+        EMAIL_QUEUE_DEPTH.inc(len(messages))
+        for message in messages:
+            threading.Thread(
+                target=send_queued_email,
+                args=message,
+                daemon=True
+            ).start()
         
         return True
     except Exception as e:
         print(f"Error sending transaction emails: {str(e)}")
         return False
 
+def send_batch_transaction_emails(sender, transfers, users_collection):
+    """
+    Send the notification emails for many transactions from one background thread
+
+    transfers is a list of (recipient, transaction) pairs
+    """
+    try:
+        messages = []
+        for recipient, transaction in transfers:
+            messages.extend(build_transaction_messages(sender, recipient, transaction))
+        if not messages:
+            return False
+        
+        def send_all():
+            for message in messages:
+                send_queued_email(*message)
+        
+        EMAIL_QUEUE_DEPTH.inc(len(messages))
+        threading.Thread(target=send_all, daemon=True).start()
+        return True
+    except Exception as e:
+        print(f"Error sending batch transaction emails: {str(e)}")
+        return False
+
+def send_queued_email(to_email, to_name, subject, html_body):
+    """Send an email counted in the email queue depth"""
+    try:
+        return send_email(to_email, to_name, subject, html_body)
+    finally:
+        EMAIL_QUEUE_DEPTH.dec()
+
 def send_email(to_email, to_name, subject, html_body):
     """Send an email using Zepto API"""
     try:
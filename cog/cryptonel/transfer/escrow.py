@@ -0,0 +1,475 @@
+import discord
+from discord.ui import Modal, TextInput, View, DynamicItem, Button
+import asyncio
+import datetime
+import traceback
+import uuid
+import re
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+# Import utility functions
+from .utils import (
+    db_wallet,
+    users,
+    verify_auth,
+    calculate_fee,
+    network_volume,
+    transfer_journal,
+    find_completed_transfer,
+    commit_ledger_entry
+)
+from .ledger_writer import LedgerEntry
+from .dispatcher import transfer_dispatcher
+from ..scheduler import DeadlineScheduler, as_utc, utc_now
+
+# Default and maximum time a recipient has to accept an escrow
+DEFAULT_EXPIRY_HOURS = 24
+MAX_EXPIRY_HOURS = 168
+
+class EscrowService:
+    """
+    Two-party escrow transfers stored in cryptonel_wallet.escrow_transfers
+
+    Creating an escrow debits the sender (amount + fee) right away. The
+    recipient can accept, which credits them the amount after fee, or reject,
+    which refunds the sender in full. Escrows that are still pending at
+    expires_at are refunded by the deadline scheduler, which loads expiries
+    from the (status, expires_at) index one window at a time.
+
+    Status flow: holding -> pending -> settling -> accepted / rejected /
+    expired. Only one caller can move an escrow out of pending
+    (find_one_and_update), and the settlement ledger entry commits the
+    idempotency key escrow:<id>:settle in the same transaction, so escrows
+    left in holding or settling by a crash are finished on the next start
+    without being settled twice.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.scheduler = DeadlineScheduler("escrow expiry", self.load_window, self.expire_batch)
+        self.indexes_ready = False
+
+    def ensure_indexes(self):
+        if self.indexes_ready:
+            return
+        self.collection.create_index([("status", ASCENDING), ("expires_at", ASCENDING)])
+        self.collection.create_index([("recipient_id", ASCENDING), ("status", ASCENDING)])
+        self.indexes_ready = True
+
+    async def start(self):
+        await self.recover()
+        self.scheduler.start()
+
+    def stop(self):
+        self.scheduler.stop()
+
+    def load_window(self, horizon: datetime.datetime):
+        self.ensure_indexes()
+        cursor = self.collection.find({"status": "pending", "expires_at": {"$lte": horizon}}, {"expires_at": 1})
+        return [(escrow["_id"], escrow["expires_at"]) for escrow in cursor]
+
+    async def recover(self):
+        """Finish escrows interrupted by a restart"""
+        try:
+            interrupted = await asyncio.to_thread(lambda: list(self.collection.find({"status": {"$in": ["holding", "settling"]}})))
+        except Exception as e:
+            print(f"Error loading interrupted escrows: {e}")
+            print(traceback.format_exc())
+            return
+
+        recovered = 0
+        # One broken escrow must not stop the others from being recovered
+        for escrow in interrupted:
+            try:
+                if escrow["status"] == "holding":
+                    # The escrow is only live if its debit was committed
+                    hold = await find_completed_transfer(f"escrow:{escrow['_id']}:hold")
+                    status = "pending" if hold else "void"
+                    await asyncio.to_thread(self.collection.update_one, {"_id": escrow["_id"], "status": "holding"}, {"$set": {"status": status}})
+                else:
+                    await self.apply_settlement(escrow)
+                recovered += 1
+            except Exception as e:
+                print(f"Error recovering escrow {escrow['_id']}: {e}")
+                print(traceback.format_exc())
+        if interrupted:
+            print(f"Recovered {recovered}/{len(interrupted)} interrupted escrow(s)")
+
+    async def create(
+        self,
+        sender_id: str,
+        recipient_data: Dict,
+        amount: float,
+        reason: str,
+        transfer_settings: Dict,
+        expiry_hours: int,
+        idempotency_key: Optional[str] = None
+    ) -> Dict:
+        """Hold amount + fee from the sender under the sender's transfer lock"""
+        self.ensure_indexes()
+        async with transfer_dispatcher.serialize(sender_id):
+            sender_data = users.find_one({"user_id": sender_id})
+            if not sender_data:
+                return {"status": "no_wallet"}
+
+            fee, amount_after_fee = await calculate_fee(amount, sender_data.get("premium", False), transfer_settings)
+            required = float(f"{amount + fee:.8f}")
+            balance = float(sender_data.get("balance", "0"))
+            if required > balance:
+                return {"status": "insufficient_funds", "required": required, "balance": balance}
+
+            now = utc_now()
+            escrow = {
+                "_id": str(uuid.uuid4()),
+                "sender_id": sender_id,
+                "sender_username": sender_data.get("username", "Unknown"),
+                "sender_address": sender_data.get("private_address", "Unknown"),
+                "recipient_id": recipient_data.get("user_id"),
+                "recipient_username": recipient_data.get("username", "Unknown"),
+                "recipient_address": recipient_data.get("private_address", "Unknown"),
+                "amount": f"{amount:.8f}",
+                "fee": f"{fee:.8f}",
+                "amount_after_fee": f"{amount_after_fee:.8f}",
+                "reason": reason,
+                "status": "holding",
+                "created_at": now,
+                "expires_at": now + datetime.timedelta(hours=expiry_hours)
+            }
+
+            # A double-submitted modal gets the original escrow back
+            original = await find_completed_transfer(idempotency_key)
+            if original:
+                existing = self.collection.find_one({"_id": original.get("tx_id")})
+                return {"status": "completed", "escrow": existing or escrow, "duplicate": True}
+
+            self.collection.insert_one(escrow)
+
+            ledger_entry = LedgerEntry()
+            ledger_entry.add_balance(sender_id, -required)
+            ledger_entry.add_history(sender_id, {
+                "tx_id": escrow["_id"],
+                "type": "sent",
+                "amount": escrow["amount"],
+                "timestamp": now,
+                "counterparty_address": escrow["recipient_address"],
+                "counterparty_id": escrow["recipient_id"],
+                "counterparty_username": escrow["recipient_username"],
+                "sender_username": escrow["sender_username"],
+                "sender_id": sender_id,
+                "status": "escrow",
+                "fee": escrow["fee"],
+                "reason": reason,
+                "escrow_id": escrow["_id"]
+            })
+            # The hold key tells recovery whether the debit was committed
+            details = {"sender_id": sender_id, "recipient_id": escrow["recipient_id"], "amount": escrow["amount"], "fee": escrow["fee"]}
+            ledger_entry.add_journal(transfer_journal.entry(f"escrow:{escrow['_id']}:hold", escrow["_id"], details))
+            try:
+                original_id = await commit_ledger_entry(ledger_entry, idempotency_key, escrow["_id"], details)
+            except Exception:
+                self.collection.update_one({"_id": escrow["_id"]}, {"$set": {"status": "void"}})
+                raise
+            if original_id:
+                self.collection.update_one({"_id": escrow["_id"]}, {"$set": {"status": "void"}})
+                existing = self.collection.find_one({"_id": original_id})
+                return {"status": "completed", "escrow": existing or escrow, "duplicate": True}
+
+            escrow["status"] = "pending"
+            self.collection.update_one({"_id": escrow["_id"]}, {"$set": {"status": "pending"}})
+            self.scheduler.schedule(escrow["_id"], escrow["expires_at"])
+            return {"status": "completed", "escrow": escrow}
+
+    async def settle(self, escrow_id: str, outcome: str, recipient_id: Optional[str] = None) -> Optional[Dict]:
+        """Move a pending escrow to accepted, rejected or expired; returns None if it was already settled"""
+        query = {"_id": escrow_id, "status": "pending"}
+        if recipient_id is not None:
+            query["recipient_id"] = recipient_id
+        escrow = await asyncio.to_thread(
+            self.collection.find_one_and_update,
+            query,
+            {"$set": {"status": "settling", "outcome": outcome, "settled_at": utc_now()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if escrow is None:
+            return None
+        self.scheduler.cancel(escrow_id)
+        await self.apply_settlement(escrow)
+        return escrow
+
+    async def apply_settlement(self, escrow: Dict):
+        outcome = escrow["outcome"]
+        timestamp = utc_now()
+        ledger_entry = LedgerEntry()
+
+        if outcome == "accepted":
+            recipient_amount = float(escrow["amount_after_fee"])
+            ledger_entry.add_balance(escrow["recipient_id"], recipient_amount)
+            ledger_entry.add_history(escrow["recipient_id"], {
+                "tx_id": escrow["_id"],
+                "type": "received",
+                "amount": escrow["amount_after_fee"],
+                "timestamp": timestamp,
+                "counterparty_address": escrow["sender_address"],
+                "counterparty_id": escrow["sender_id"],
+                "counterparty_username": escrow["sender_username"],
+                "recipient_username": escrow["recipient_username"],
+                "recipient_id": escrow["recipient_id"],
+                "status": "completed",
+                "fee": escrow["fee"],
+                "reason": escrow["reason"],
+                "escrow_id": escrow["_id"]
+            })
+            ledger_entry.add_stats(escrow["sender_id"], sent=float(escrow["amount"]), fee=float(escrow["fee"]), counterparty_id=escrow["recipient_id"], timestamp=timestamp)
+            ledger_entry.add_stats(escrow["recipient_id"], received=recipient_amount, counterparty_id=escrow["sender_id"], timestamp=timestamp)
+        else:
+            # Rejected and expired escrows return everything that was held
+            refund = float(f"{float(escrow['amount']) + float(escrow['fee']):.8f}")
+            ledger_entry.add_balance(escrow["sender_id"], refund)
+            ledger_entry.add_history(escrow["sender_id"], {
+                "tx_id": escrow["_id"],
+                "type": "received",
+                "amount": f"{refund:.8f}",
+                "timestamp": timestamp,
+                "counterparty_address": "Escrow Refund",
+                "counterparty_id": escrow["recipient_id"],
+                "counterparty_username": escrow["recipient_username"],
+                "recipient_id": escrow["sender_id"],
+                "status": "refunded",
+                "fee": "0.00000000",
+                "reason": f"Escrow {outcome}: {escrow['reason']}",
+                "escrow_id": escrow["_id"]
+            })
+
+        # The settle key is written with the settlement, so its presence means it was applied
+        settle_key = f"escrow:{escrow['_id']}:settle"
+        if not await find_completed_transfer(settle_key):
+            await commit_ledger_entry(ledger_entry, settle_key, escrow["_id"], {"escrow_id": escrow["_id"], "outcome": outcome})
+        if outcome == "accepted":
+            network_volume.record(float(escrow["amount"]))
+            network_volume.maybe_checkpoint()
+        await asyncio.to_thread(self.collection.update_one, {"_id": escrow["_id"], "status": "settling"}, {"$set": {"status": outcome}})
+
+    async def expire_batch(self, escrow_ids: List[str]):
+        for escrow_id in escrow_ids:
+            try:
+                await self.settle(escrow_id, "expired")
+            except Exception as e:
+                print(f"Error expiring escrow {escrow_id}: {e}")
+                print(traceback.format_exc())
+
+# Shared service started by the transfer cog
+escrow_service = EscrowService(db_wallet['escrow_transfers'])
+
+# Function to build the embed describing an escrow
+def escrow_embed(escrow: Dict, title: str = "🤝 Escrow Transfer") -> discord.Embed:
+    status = escrow.get("outcome") or escrow.get("status")
+    embed = discord.Embed(title=title, color=0x8f92b1)
+    embed.add_field(name="From", value=escrow.get("sender_username", "Unknown"), inline=True)
+    embed.add_field(name="To", value=escrow.get("recipient_username", "Unknown"), inline=True)
+    embed.add_field(name="Amount", value=f"{escrow['amount_after_fee']} CRN", inline=True)
+    embed.add_field(name="Reason", value=escrow.get("reason", "-"), inline=False)
+    embed.add_field(name="Status", value=str(status).capitalize(), inline=True)
+    embed.add_field(name="Expires", value=f"<t:{int(as_utc(escrow['expires_at']).timestamp())}:R>", inline=True)
+    embed.set_footer(text=f"Escrow ID: {escrow['_id']}")
+    return embed
+
+# Persistent accept/reject button; works across restarts through its custom_id
+class EscrowButton(DynamicItem[Button], template=r'escrow:(?P<action>accept|reject):(?P<escrow_id>[0-9a-f\-]{36})'):
+    def __init__(self, action: str, escrow_id: str):
+        self.action = action
+        self.escrow_id = escrow_id
+        super().__init__(
+            Button(
+                label="Accept" if action == "accept" else "Reject",
+                style=discord.ButtonStyle.success if action == "accept" else discord.ButtonStyle.danger,
+                custom_id=f"escrow:{action}:{escrow_id}"
+            )
+        )
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Button, match: re.Match):
+        return cls(match["action"], match["escrow_id"])
+
+    async def callback(self, interaction: discord.Interaction):
+        try:
+            outcome = "accepted" if self.action == "accept" else "rejected"
+            escrow = await escrow_service.settle(self.escrow_id, outcome, recipient_id=str(interaction.user.id))
+            if escrow is None:
+                embed = discord.Embed(
+                    title="Escrow Unavailable",
+                    description="This escrow has already been settled or has expired.",
+                    color=0x8f92b1
+                )
+                await interaction.response.send_message(embed=embed, ephemeral=True)
+                return
+
+            title = "✅ Escrow Accepted" if outcome == "accepted" else "❌ Escrow Rejected"
+            await interaction.response.edit_message(embed=escrow_embed(escrow, title), view=None)
+        except Exception as e:
+            print(f"Error settling escrow {self.escrow_id}: {e}")
+            print(traceback.format_exc())
+            embed = discord.Embed(
+                title="❌ Escrow Error",
+                description="An error occurred while settling this escrow. Please try again later.",
+                color=0x8f92b1
+            )
+            if interaction.response.is_done():
+                await interaction.followup.send(embed=embed, ephemeral=True)
+            else:
+                await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# Function to build the persistent view sent to the recipient
+def escrow_view(escrow_id: str) -> View:
+    view = View(timeout=None)
+    view.add_item(EscrowButton("accept", escrow_id))
+    view.add_item(EscrowButton("reject", escrow_id))
+    return view
+
+# Modal for creating an escrow transfer
+class EscrowModal(Modal):
+    def __init__(self, user_data, transfer_settings, auth_type, auth_label, origin_interaction_id=None):
+        super().__init__(title="Escrow Transfer")
+        self.user_data = user_data
+        self.transfer_settings = transfer_settings
+        self.auth_type = auth_type
+        self.auth_label = auth_label
+        self.max_expiry_hours = int(transfer_settings.get("escrow_max_expiry_hours", MAX_EXPIRY_HOURS))
+        # Submissions of the same modal share one idempotency key
+        self.idempotency_key = f"escrow:{origin_interaction_id}" if origin_interaction_id else None
+
+        self.address = TextInput(
+            label="Recipient's Private Address",
+            placeholder="Enter the recipient's private address",
+            required=True
+        )
+        self.add_item(self.address)
+
+        self.amount = TextInput(
+            label="Amount",
+            placeholder="Enter the amount of CRN to hold",
+            required=True
+        )
+        self.add_item(self.amount)
+
+        self.reason = TextInput(
+            label="Reason for Transfer",
+            placeholder="What is this escrow for?",
+            required=True,
+            max_length=100
+        )
+        self.add_item(self.reason)
+
+        self.expiry = TextInput(
+            label=f"Expires After (hours, max {self.max_expiry_hours})",
+            default=str(DEFAULT_EXPIRY_HOURS),
+            required=True,
+            max_length=3
+        )
+        self.add_item(self.expiry)
+
+        self.auth_input = TextInput(
+            label=f"Enter your {auth_label}",
+            placeholder=f"Provide your {auth_label} for security verification",
+            required=True
+        )
+        self.add_item(self.auth_input)
+
+    async def send_error(self, interaction: discord.Interaction, title: str, description: str):
+        embed = discord.Embed(title=title, description=description, color=0x8f92b1)
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            if not await verify_auth(self.user_data, self.auth_input.value.strip(), self.auth_type):
+                embed = discord.Embed(
+                    title="❌ Authentication Failed",
+                    description=f"The {self.auth_label} you provided is incorrect. Escrow cancelled.",
+                    color=0xff0000
+                )
+                await interaction.followup.send(embed=embed, ephemeral=True)
+                return
+
+            amount_str = self.amount.value.strip().replace(',', '.')
+            try:
+                if re.match(r'^0\d+', amount_str):
+                    raise ValueError
+                amount = float(f"{float(amount_str):.8f}")
+            except ValueError:
+                await self.send_error(interaction, "❌ Invalid Amount", "Please enter a valid number.")
+                return
+            min_amount = float(self.transfer_settings.get("min_amount", "0.25"))
+            max_amount = float(self.transfer_settings.get("max_amount", "1000.0"))
+            if amount < min_amount or amount > max_amount:
+                await self.send_error(interaction, "❌ Invalid Amount", f"Amount must be between {min_amount} and {max_amount} CRN.")
+                return
+
+            try:
+                expiry_hours = int(self.expiry.value.strip())
+            except ValueError:
+                expiry_hours = 0
+            if expiry_hours < 1 or expiry_hours > self.max_expiry_hours:
+                await self.send_error(interaction, "❌ Invalid Expiry", f"Expiry must be between 1 and {self.max_expiry_hours} hours.")
+                return
+
+            recipient_data = users.find_one({"private_address": self.address.value.strip()})
+            if not recipient_data:
+                await self.send_error(interaction, "❌ Invalid Recipient", "The private address you provided does not exist.")
+                return
+            if recipient_data.get("user_id") == self.user_data.get("user_id"):
+                await self.send_error(interaction, "❌ Self Transfer", "You cannot transfer funds to yourself.")
+                return
+
+            result = await escrow_service.create(
+                self.user_data.get("user_id"),
+                recipient_data,
+                amount,
+                self.reason.value.strip(),
+                self.transfer_settings,
+                expiry_hours,
+                idempotency_key=self.idempotency_key
+            )
+            if result["status"] == "insufficient_funds":
+                await self.send_error(
+                    interaction,
+                    "❌ Insufficient Funds",
+                    f"This escrow needs {result['required']:.8f} CRN including fees.\n"
+                    f"Your balance: {result['balance']:.8f} CRN"
+                )
+                return
+            if result["status"] != "completed":
+                await self.send_error(interaction, "❌ Escrow Failed", "Your wallet could not be found.")
+                return
+
+            escrow = result["escrow"]
+            delivered = True
+            if not result.get("duplicate"):
+                # The recipient decides through the persistent buttons in their DMs
+                try:
+                    recipient = await interaction.client.fetch_user(int(escrow["recipient_id"]))
+                    await recipient.send(embed=escrow_embed(escrow), view=escrow_view(escrow["_id"]))
+                except Exception as e:
+                    print(f"Could not DM escrow {escrow['_id']} to recipient: {e}")
+                    delivered = False
+
+            embed = escrow_embed(escrow, "✅ Escrow Created")
+            embed.description = (
+                "The funds are held until the recipient accepts. They are returned to you if the recipient rejects or the escrow expires."
+                if delivered else
+                "The funds are held, but the recipient could not be messaged. They will be returned to you when the escrow expires."
+            )
+            await interaction.followup.send(embed=embed, ephemeral=True)
+
+        except Exception as e:
+            print(f"Error creating escrow: {e}")
+            print(traceback.format_exc())
+
+            embed = discord.Embed(
+                title="❌ Escrow Error",
+                description="An error occurred while creating your escrow. Please try again later.",
+                color=0x8f92b1
+            )
+            await interaction.followup.send(embed=embed, ephemeral=True)
@@ -9,7 +9,8 @@ import pymongo
 import os
 from dotenv import load_dotenv
 
-from .utils import get_transfer_settings, calculate_fee
+from .utils import get_transfer_settings
+from .fee_engine import compile_fee_schedule
 
 # Load environment variables
 load_dotenv('clyne.env')
@@ -22,19 +23,19 @@ client = pymongo.MongoClient(MONGODB_URI)
 db_wallet = client['cryptonel_wallet']
 users = db_wallet['users']
 
+# Maximum number of amounts priced in one calculation
+MAX_QUOTES = 10
+
 class FeeCalculatorModal(Modal):
     def __init__(self, transfer_settings):
         super().__init__(title="Fee Calculator")
         self.transfer_settings = transfer_settings
-        
-        # Get fee rate for display
-        fee_rate = float(transfer_settings.get("tax_rate", "0.01"))
-        fee_percentage = fee_rate * 100
+        self.fee_schedule = compile_fee_schedule(transfer_settings)
         
         # Add amount input
         self.amount = TextInput(
-            label=f"Amount To Send",
-            placeholder=f"Enter amount to calculate {fee_percentage:.1f}% fee",
+            label=f"Amounts To Send",
+            placeholder=f"Up to {MAX_QUOTES} amounts, e.g. 10 50 100 ({self.fee_schedule.describe()} fee)",
             required=True
         )
         self.add_item(self.amount)
@@ -44,35 +45,47 @@ class FeeCalculatorModal(Modal):
         
         try:
             # Get input values
-            amount_str = self.amount.value.strip()
+            amount_strs = [value for value in re.split(r'[\s,;]+', self.amount.value.strip()) if value]
             
-            # Validate amount
+            # Validate amounts
+            amounts = []
             try:
-                # Check for invalid formats
-                if re.match(r'^0\d+', amount_str):
-                    embed = discord.Embed(
-                        title="Invalid Amount Format",
-                        description="Please enter a valid number format without leading zeros. Examples: 1, 1.5, 0.75, etc.",
-                        color=0x8f92b1
-                    )
-                    await interaction.followup.send(embed=embed, ephemeral=True)
-                    return
-                
-                # Convert to float
-                amount = float(amount_str)
-                if amount <= 0:
-                    embed = discord.Embed(
-                        title="Invalid Amount",
-                        description="Please enter an amount greater than zero.",
-                        color=0x8f92b1
-                    )
-                    await interaction.followup.send(embed=embed, ephemeral=True)
-                    return
+                for amount_str in amount_strs[:MAX_QUOTES]:
+                    # Check for invalid formats
+                    if re.match(r'^0\d+', amount_str):
+                        embed = discord.Embed(
+                            title="Invalid Amount Format",
+                            description="Please enter a valid number format without leading zeros. Examples: 1, 1.5, 0.75, etc.",
+                            color=0x8f92b1
+                        )
+                        await interaction.followup.send(embed=embed, ephemeral=True)
+                        return
+                    
+                    # Convert to float
+                    amount = float(amount_str)
+                    if amount <= 0:
+                        embed = discord.Embed(
+                            title="Invalid Amount",
+                            description="Please enter amounts greater than zero.",
+                            color=0x8f92b1
+                        )
+                        await interaction.followup.send(embed=embed, ephemeral=True)
+                        return
+                    amounts.append(amount)
                 
             except ValueError:
                 embed = discord.Embed(
                     title="Invalid Amount",
-                    description="Please enter a valid number for the amount.",
+                    description="Please enter valid numbers for the amounts.",
+                    color=0x8f92b1
+                )
+                await interaction.followup.send(embed=embed, ephemeral=True)
+                return
+            
+            if not amounts:
+                embed = discord.Embed(
+                    title="Invalid Amount",
+                    description="Please enter at least one amount.",
                     color=0x8f92b1
                 )
                 await interaction.followup.send(embed=embed, ephemeral=True)
@@ -83,43 +96,33 @@ class FeeCalculatorModal(Modal):
             user_data = users.find_one({"user_id": user_id})
             is_premium = user_data.get("premium", False) if user_data else False
             
-            # Calculate fee
-            fee, amount_after_fee = await calculate_fee(amount, is_premium, self.transfer_settings)
+            # Price every amount in one batch
+            quotes = self.fee_schedule.quote_many(amounts, is_premium)
             
             # Format numbers for display with 8 decimal places maximum
             def format_amount(value):
                 # دائمًا أظهر 8 أرقام عشرية بدون حذف الأصفار
                 return f"{float(value):.8f}"
             
-            amount_display = format_amount(amount)
-            fee_display = format_amount(fee)
-            total_display = format_amount(amount + fee)
-            
-            # Create result embed
-            fee_rate = float(self.transfer_settings.get("tax_rate", "0.01"))
-            fee_percentage = fee_rate * 100
-            
-            premium_settings = self.transfer_settings.get("premium_settings", {})
-            premium_exempt = premium_settings.get("tax_exempt_enabled", True) and premium_settings.get("tax_exempt", True)
+            # Build the quote table
+            rows = [f"{'Amount':>18} {'Rate':>6} {'Fee':>18} {'Total':>18}"]
+            for quote in quotes:
+                rows.append(
+                    f"{format_amount(quote.amount):>18} {quote.rate * 100:>5.1f}% "
+                    f"{format_amount(quote.fee):>18} {format_amount(quote.total):>18}"
+                )
             
             embed = discord.Embed(
                 title="Fee Calculation Results",
                 color=0x8f92b1
             )
-            
-            if is_premium and premium_exempt:
-                embed.description = f"Current fee rate: 0% (Premium Benefit)"
-                embed.add_field(name="Amount to Send", value=f"{amount_display} CRN", inline=True)
-                embed.add_field(name="Fee", value=f"0 CRN", inline=True)
-                embed.add_field(name="Total Deduction", value=f"{amount_display} CRN", inline=False)
-            else:
-                embed.description = f"Current fee rate: {fee_percentage:.1f}%"
-                embed.add_field(name="Amount to Send", value=f"{amount_display} CRN", inline=True)
-                embed.add_field(name="Fee", value=f"{fee_display} CRN", inline=True)
-                embed.add_field(name="Total Deduction", value=f"{total_display} CRN", inline=False)
+            embed.description = f"Current fee rate: {self.fee_schedule.describe(is_premium)}\n```\n" + "\n".join(rows) + "\n```"
             
             # Add a note about how fee is calculated
-            embed.set_footer(text="Fee is calculated based on the transfer amount")
+            if len(amount_strs) > MAX_QUOTES:
+                embed.set_footer(text=f"Only the first {MAX_QUOTES} amounts were calculated")
+            else:
+                embed.set_footer(text="Fee is calculated based on the transfer amount")
             
             await interaction.followup.send(embed=embed, ephemeral=True)
             
@@ -141,8 +144,7 @@ async def calculate_fee_callback(interaction: discord.Interaction):
         transfer_settings = await get_transfer_settings()
         
         # Check if fee is enabled
-        fee_enabled = transfer_settings.get("tax_enabled", True)
-        if not fee_enabled:
+        if not compile_fee_schedule(transfer_settings).enabled:
             # Defer response since we're not showing a modal
             await interaction.response.defer(ephemeral=True)
             embed = discord.Embed(
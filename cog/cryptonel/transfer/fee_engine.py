@@ -0,0 +1,146 @@
+import bisect
+import functools
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# All CRN amounts are stored with 8 decimal places
+DECIMALS = 8
+
+@dataclass(frozen=True)
+class FeeQuote:
+    """Price of a single transfer amount"""
+    amount: float
+    fee: float
+    amount_after_fee: float
+    rate: float
+    exempt: bool
+
+    @property
+    def total(self) -> float:
+        """What the sender is charged for this transfer"""
+        return round(self.amount + self.fee, DECIMALS)
+
+@dataclass(frozen=True)
+class FeeSchedule:
+    """Immutable fee rules compiled from the transfer settings document"""
+    enabled: bool = True
+    rate: float = 0.01
+    flat_fee: float = 0.0
+    min_fee: float = 0.0
+    max_fee: Optional[float] = None
+    # Tier thresholds are sorted ascending; tier_rates[i] applies to the part of
+    # an amount above tier_thresholds[i] (marginal brackets, so fees never drop
+    # when the amount grows)
+    tier_thresholds: Tuple[float, ...] = ()
+    tier_rates: Tuple[float, ...] = ()
+    premium_exempt: bool = True
+
+    def is_exempt(self, is_premium: bool) -> bool:
+        """Whether a user pays no fee at all"""
+        return not self.enabled or (is_premium and self.premium_exempt)
+
+    def rate_for(self, amount: float) -> float:
+        """Percentage rate of the bracket an amount ends in"""
+        position = bisect.bisect_right(self.tier_thresholds, amount) - 1
+        if position < 0:
+            return self.rate
+        return self.tier_rates[position]
+
+    def percentage_fee(self, amount: float) -> float:
+        """Percentage part of the fee, each bracket charging its own rate"""
+        fee = 0.0
+        lower, rate = 0.0, self.rate
+        for threshold, tier_rate in zip(self.tier_thresholds, self.tier_rates):
+            if amount <= threshold:
+                break
+            threshold = max(threshold, lower)
+            fee += (threshold - lower) * rate
+            lower, rate = threshold, tier_rate
+        return fee + (amount - lower) * rate
+
+    def quote(self, amount: float, is_premium: bool = False) -> FeeQuote:
+        if self.is_exempt(is_premium):
+            return FeeQuote(amount, 0.0, amount, 0.0, True)
+
+        rate = self.rate_for(amount)
+        fee = self.percentage_fee(amount) + self.flat_fee
+        fee = max(fee, self.min_fee)
+        if self.max_fee is not None:
+            fee = min(fee, self.max_fee)
+        # The fee is deducted from the amount, so it can never exceed it
+        # (rounding to 8 decimals could otherwise push it just past an unrounded amount)
+        fee = min(round(max(fee, 0.0), DECIMALS), amount)
+        return FeeQuote(amount, fee, round(amount - fee, DECIMALS), rate, False)
+
+    def quote_many(self, amounts: Iterable[float], is_premium: bool = False) -> List[FeeQuote]:
+        """Price many amounts in one call"""
+        if self.is_exempt(is_premium):
+            return [FeeQuote(amount, 0.0, amount, 0.0, True) for amount in amounts]
+        quote = self.quote
+        return [quote(amount) for amount in amounts]
+
+    def describe(self, is_premium: bool = False) -> str:
+        """Short human readable fee rate, e.g. '1.0%' or '0.5%-1.0% + 0.1 CRN'"""
+        if not self.enabled:
+            return "0%"
+        if is_premium and self.premium_exempt:
+            return "0% (Premium Benefit)"
+
+        rates = (self.rate,) + self.tier_rates
+        low, high = min(rates) * 100, max(rates) * 100
+        text = f"{low:.1f}%" if low == high else f"{low:.1f}%-{high:.1f}%"
+        if self.flat_fee:
+            text += f" + {self.flat_fee:g} CRN"
+        return text
+
+# Function to read a number from the settings document (values are stored as strings)
+def _number(value, default: float) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+def _fingerprint(transfer_settings: Dict) -> Tuple:
+    premium_settings = transfer_settings.get("premium_settings", {}) or {}
+    tiers = tuple(
+        (str(tier.get("min_amount")), str(tier.get("tax_rate")))
+        for tier in transfer_settings.get("tax_tiers", []) or []
+    )
+    return (
+        bool(transfer_settings.get("tax_enabled", True)),
+        str(transfer_settings.get("tax_rate", "0.01")),
+        str(transfer_settings.get("flat_fee", "0")),
+        str(transfer_settings.get("min_fee", "0")),
+        str(transfer_settings.get("max_fee")),
+        tiers,
+        bool(premium_settings.get("tax_exempt_enabled", True) and premium_settings.get("tax_exempt", True)),
+    )
+
+@functools.lru_cache(maxsize=64)
+def _compile(fingerprint: Tuple) -> FeeSchedule:
+    enabled, rate, flat_fee, min_fee, max_fee, tiers, premium_exempt = fingerprint
+    parsed_tiers = sorted(
+        (_number(min_amount, 0.0), _number(tier_rate, 0.0))
+        for min_amount, tier_rate in tiers
+    )
+    return FeeSchedule(
+        enabled=enabled,
+        rate=_number(rate, 0.01),
+        flat_fee=_number(flat_fee, 0.0),
+        min_fee=_number(min_fee, 0.0),
+        max_fee=None if max_fee == "None" else _number(max_fee, None),
+        tier_thresholds=tuple(threshold for threshold, _ in parsed_tiers),
+        tier_rates=tuple(tier_rate for _, tier_rate in parsed_tiers),
+        premium_exempt=premium_exempt
+    )
+
+# Function to get the compiled fee schedule for a settings document
+def compile_fee_schedule(transfer_settings: Optional[Dict]) -> FeeSchedule:
+    """
+    Compile the transfer settings into a FeeSchedule
+
+    Supported settings: tax_enabled, tax_rate, flat_fee, min_fee, max_fee,
+    tax_tiers ([{"min_amount": ..., "tax_rate": ...}]) and the premium
+    tax exemption. Schedules are cached by their settings values.
+    """
+    return _compile(_fingerprint(transfer_settings or {}))
@@ -0,0 +1,171 @@
+import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne, DESCENDING
+
+# Field on the users document holding the aggregates
+STATS_FIELD = "ledger_stats"
+
+# Per-pair transfer counts live in their own collection, one small document
+# per (user, counterparty), so a busy wallet's document does not grow with
+# every new recipient
+class CounterpartyCounts:
+    """Number of transfers between a user and each of their counterparties"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.indexes_ready = False
+
+    def ensure_indexes(self):
+        if self.indexes_ready:
+            return
+        self.collection.create_index([("user_id", 1), ("counterparty_id", 1)], unique=True)
+        self.collection.create_index([("user_id", 1), ("count", DESCENDING)])
+        self.indexes_ready = True
+
+    def operations(self, user_id: str, counterparties: Dict[str, int]) -> List[UpdateOne]:
+        """Upserts adding a batch's counts for one user"""
+        return [
+            UpdateOne({"user_id": user_id, "counterparty_id": counterparty_id}, {"$inc": {"count": count}}, upsert=True)
+            for counterparty_id, count in counterparties.items()
+        ]
+
+    def top(self, user_id: str, limit: int = 3) -> List[Tuple[str, int]]:
+        """The most frequent counterparties of a user (blocking)"""
+        documents = self.collection.find(
+            {"user_id": user_id}, {"counterparty_id": 1, "count": 1}, sort=[("count", DESCENDING)], limit=limit
+        )
+        return [(document["counterparty_id"], document["count"]) for document in documents]
+
+# Function to create an empty set of aggregates
+def empty_stats() -> Dict:
+    return {
+        "total_sent": 0.0,
+        "total_received": 0.0,
+        "total_fees_paid": 0.0,
+        "transfer_count": 0,
+        "first_transfer_at": None,
+        "last_transfer_at": None,
+        "counterparties": {}
+    }
+
+# Function to fold one transfer into a set of aggregates
+def add_transfer(
+    stats: Dict,
+    sent: float = 0.0,
+    received: float = 0.0,
+    fee: float = 0.0,
+    counterparty_id: Optional[str] = None,
+    timestamp: Optional[datetime.datetime] = None
+):
+    stats["total_sent"] += sent
+    stats["total_received"] += received
+    stats["total_fees_paid"] += fee
+    stats["transfer_count"] += 1
+    if timestamp is not None:
+        if stats["first_transfer_at"] is None or timestamp < stats["first_transfer_at"]:
+            stats["first_transfer_at"] = timestamp
+        if stats["last_transfer_at"] is None or timestamp > stats["last_transfer_at"]:
+            stats["last_transfer_at"] = timestamp
+    if counterparty_id:
+        counterparties = stats["counterparties"]
+        counterparties[counterparty_id] = counterparties.get(counterparty_id, 0) + 1
+
+# Function to add one set of aggregates into another
+def merge_stats(stats: Dict, other: Dict):
+    for field in ("total_sent", "total_received", "total_fees_paid", "transfer_count"):
+        stats[field] += other[field]
+    for field, pick in (("first_transfer_at", min), ("last_transfer_at", max)):
+        if other[field] is not None:
+            stats[field] = other[field] if stats[field] is None else pick(stats[field], other[field])
+    for counterparty_id, count in other["counterparties"].items():
+        stats["counterparties"][counterparty_id] = stats["counterparties"].get(counterparty_id, 0) + count
+
+# Function to turn aggregated increments into MongoDB update operators (counterparties go to CounterpartyCounts)
+def stats_update(stats: Dict) -> Dict:
+    update = {
+        "$inc": {
+            f"{STATS_FIELD}.total_sent": stats["total_sent"],
+            f"{STATS_FIELD}.total_received": stats["total_received"],
+            f"{STATS_FIELD}.total_fees_paid": stats["total_fees_paid"],
+            f"{STATS_FIELD}.transfer_count": stats["transfer_count"]
+        }
+    }
+    if stats["first_transfer_at"] is not None:
+        update["$min"] = {f"{STATS_FIELD}.first_transfer_at": stats["first_transfer_at"]}
+    if stats["last_transfer_at"] is not None:
+        update["$max"] = {f"{STATS_FIELD}.last_transfer_at": stats["last_transfer_at"]}
+    return update
+
+# Function to compute one user's aggregates from their transaction history
+def stats_from_history(transactions: List[Dict]) -> Dict:
+    stats = empty_stats()
+    for tx in transactions:
+        try:
+            amount = float(tx.get("amount", "0"))
+            fee = float(tx.get("fee", "0"))
+        except (TypeError, ValueError):
+            continue
+        if tx.get("type") == "sent":
+            add_transfer(stats, sent=amount, fee=fee, counterparty_id=tx.get("counterparty_id"), timestamp=tx.get("timestamp"))
+        else:
+            add_transfer(stats, received=amount, counterparty_id=tx.get("counterparty_id"), timestamp=tx.get("timestamp"))
+    return stats
+
+# Function to overwrite the aggregates of a chunk of users inside a transaction
+def backfill_chunk(users_collection, transactions_collection, counterparty_counts: CounterpartyCounts, user_ids: List[str], session):
+    documents = transactions_collection.find(
+        {"user_id": {"$in": user_ids}}, {"user_id": 1, "transactions": 1}, session=session
+    )
+    operations = []
+    counterparty_operations = []
+    for document in documents:
+        stats = stats_from_history(document.get("transactions", []))
+        counterparties = stats.pop("counterparties")
+        operations.append(UpdateOne({"user_id": document["user_id"]}, {"$set": {STATS_FIELD: stats}}))
+        counterparty_operations.extend(counterparty_counts.operations(document["user_id"], counterparties))
+    if operations:
+        users_collection.bulk_write(operations, ordered=False, session=session)
+    counterparty_counts.collection.delete_many({"user_id": {"$in": user_ids}}, session=session)
+    if counterparty_operations:
+        counterparty_counts.collection.bulk_write(counterparty_operations, ordered=False, session=session)
+
+# Function to compute aggregates for existing users from their history
+def backfill_ledger_stats(users_collection, transactions_collection, counterparty_counts: CounterpartyCounts, chunk_size: int = 500) -> int:
+    """
+    Overwrite every user's ledger_stats and counterparty counts from user_transactions
+
+    Safe to run while transfers continue. Each chunk reads its users'
+    history and writes their aggregates in one transaction; a transfer
+    committed in between updates the same users documents, so one of the
+    two transactions hits a write conflict and is retried, and the
+    transfer is counted exactly once.
+    """
+    counterparty_counts.ensure_indexes()
+    processed = 0
+    user_ids = []
+    client = users_collection.database.client
+
+    def flush():
+        with client.start_session() as session:
+            session.with_transaction(
+                lambda session: backfill_chunk(users_collection, transactions_collection, counterparty_counts, user_ids, session)
+            )
+
+    for document in transactions_collection.find({}, {"user_id": 1}, batch_size=chunk_size):
+        user_ids.append(document.get("user_id"))
+        processed += 1
+        if len(user_ids) >= chunk_size:
+            flush()
+            user_ids = []
+            print(f"Ledger stats backfill: {processed} users processed")
+
+    if user_ids:
+        flush()
+    print(f"Ledger stats backfill finished: {processed} users processed")
+    return processed
+
+if __name__ == "__main__":
+    # python -m cog.cryptonel.transfer.ledger_stats
+    from .utils import users, db_wallet, counterparty_counts
+    backfill_ledger_stats(users, db_wallet['user_transactions'], counterparty_counts)
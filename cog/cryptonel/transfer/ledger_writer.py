@@ -0,0 +1,234 @@
+import asyncio
+import traceback
+from typing import Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from .ledger_stats import empty_stats, add_transfer, merge_stats, stats_update
+
+# Shown at startup and raised by every commit when the server cannot run transactions
+TRANSACTIONS_REQUIRED = (
+    "Ledger writes need MongoDB transactions, which only a replica set or a sharded cluster supports. "
+    "Run mongod with --replSet (a single-member replica set is enough) and initiate it; see README.md."
+)
+
+class LedgerEntry:
+    """Balance changes and history records that belong to one transfer"""
+
+    def __init__(self):
+        self.balance_deltas: Dict[str, float] = {}
+        self.history: Dict[str, List[Dict]] = {}
+        self.stats: Dict[str, Dict] = {}
+        self.journal: List[Dict] = []
+        self.future: Optional[asyncio.Future] = None
+
+    def add_balance(self, user_id: str, delta: float):
+        self.balance_deltas[user_id] = self.balance_deltas.get(user_id, 0.0) + delta
+
+    def add_history(self, user_id: str, record: Dict):
+        self.history.setdefault(user_id, []).append(record)
+
+    def add_stats(self, user_id: str, **transfer):
+        """Count a transfer in the user's ledger_stats (see ledger_stats.add_transfer)"""
+        if user_id not in self.stats:
+            self.stats[user_id] = empty_stats()
+        add_transfer(self.stats[user_id], **transfer)
+
+    def add_journal(self, entry: Dict):
+        """Commit an idempotency key with this entry (see TransferJournal.entry)"""
+        self.journal.append(entry)
+
+class LedgerWriter:
+    """
+    Group-commit writer for balance updates and transaction history
+
+    Entries submitted within max_latency_ms of each other (up to
+    max_batch_size) are committed together: one read of the current
+    balances, then one bulk_write to users, one to user_transactions and
+    one to the counterparty counts.
+    Batches are committed one at a time, so balance read-modify-writes
+    never interleave inside this process.
+
+    Each batch runs in a single multi-document transaction, so a batch is
+    applied completely or not at all, and with_transaction retries the
+    whole batch (including the balance read) on transient errors. If a
+    batch still fails, its entries are committed again one at a time, so
+    one bad entry (such as a repeated idempotency key) does not fail the
+    transfers it was batched with. Idempotency keys are written to the
+    journal in the same transaction, so a key is never recorded for a
+    transfer that was not applied.
+
+    Transactions need MongoDB running as a replica set; on a standalone
+    server every commit fails with TRANSACTIONS_REQUIRED.
+    """
+
+    def __init__(self, users_collection, transactions_collection, journal=None, counterparties=None, max_batch_size: int = 100, max_latency_ms: float = 5.0):
+        self.users = users_collection
+        self.transactions = transactions_collection
+        self.journal = journal
+        self.counterparties = counterparties
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.commit_listeners: List[Callable[[Dict[str, float]], None]] = []
+        self.transactions_supported: Optional[bool] = None
+
+    def add_commit_listener(self, callback: Callable[[Dict[str, float]], None]):
+        """Call callback on the event loop with the new balances of every committed batch"""
+        if callback not in self.commit_listeners:
+            self.commit_listeners.append(callback)
+
+    async def submit(self, entry: LedgerEntry) -> Dict[str, float]:
+        """Queue an entry and wait for its batch; returns the new balances it touched"""
+        if self.task is None or self.task.done():
+            self.queue = asyncio.Queue()
+            self.task = asyncio.get_running_loop().create_task(self._run())
+        entry.future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait(entry)
+        return await entry.future
+
+    async def _collect(self) -> List[LedgerEntry]:
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                results = await asyncio.to_thread(self._commit, batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    self._fail(batch[0], e)
+                    continue
+                # Nothing of the failed batch was written, so each entry is retried
+                # on its own and only the entries that fail themselves are reported
+                print(f"Error committing ledger batch of {len(batch)} entries, committing them one by one: {e}")
+                for entry in batch:
+                    try:
+                        entry_results = await asyncio.to_thread(self._commit, [entry])
+                    except Exception as entry_error:
+                        self._fail(entry, entry_error)
+                        continue
+                    self._resolve([entry], entry_results)
+                continue
+            self._resolve(batch, results)
+
+    def _resolve(self, batch: List[LedgerEntry], results: List[Dict[str, float]]):
+        for entry, result in zip(batch, results):
+            if not entry.future.done():
+                entry.future.set_result(result)
+        self._notify(results)
+
+    def _fail(self, entry: LedgerEntry, error: Exception):
+        # A completed idempotency key is an expected outcome, not an error
+        if not isinstance(error, DuplicateKeyError):
+            print(f"Error committing ledger entry: {error}")
+            print("".join(traceback.format_exception(error)))
+        if not entry.future.done():
+            entry.future.set_exception(error)
+
+    def _notify(self, results: List[Dict[str, float]]):
+        if not self.commit_listeners:
+            return
+        balances = {}
+        for result in results:
+            balances.update(result)
+        for callback in self.commit_listeners:
+            try:
+                callback(balances)
+            except Exception as e:
+                print(f"Error in ledger commit listener: {e}")
+                print(traceback.format_exc())
+
+    def supports_transactions(self) -> bool:
+        """Whether the server is a replica set member or mongos (blocking, asked once)"""
+        if self.transactions_supported is None:
+            hello = self.users.database.client.admin.command("hello")
+            self.transactions_supported = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+        return self.transactions_supported
+
+    def _commit(self, batch: List[LedgerEntry]) -> List[Dict[str, float]]:
+        """Apply a batch in one transaction (runs in a worker thread)"""
+        # A standalone server would reject the transaction with a less helpful error
+        if not self.supports_transactions():
+            raise RuntimeError(TRANSACTIONS_REQUIRED)
+        # Indexes cannot be created inside the transaction
+        if self.journal is not None and any(entry.journal for entry in batch):
+            self.journal.ensure_indexes()
+        if self.counterparties is not None:
+            self.counterparties.ensure_indexes()
+        with self.users.database.client.start_session() as session:
+            return session.with_transaction(lambda session: self._apply(batch, session))
+
+    def _apply(self, batch: List[LedgerEntry], session) -> List[Dict[str, float]]:
+        """One read and one bulk_write per collection, all inside the batch's transaction"""
+        user_ids = set()
+        stats: Dict[str, Dict] = {}
+        for entry in batch:
+            user_ids.update(entry.balance_deltas)
+            for user_id, user_stats in entry.stats.items():
+                merge_stats(stats.setdefault(user_id, empty_stats()), user_stats)
+
+        # Balances are stored as strings, so apply the deltas in memory
+        balances = {}
+        if user_ids:
+            documents = self.users.find(
+                {"user_id": {"$in": list(user_ids)}}, {"user_id": 1, "balance": 1}, session=session
+            )
+            for document in documents:
+                balances[document["user_id"]] = float(document.get("balance", "0"))
+
+        results = []
+        for entry in batch:
+            for user_id, delta in entry.balance_deltas.items():
+                balances[user_id] = round(balances.get(user_id, 0.0) + delta, 8)
+            results.append({user_id: balances[user_id] for user_id in entry.balance_deltas})
+
+        # Balances and ledger_stats go out in the same update
+        operations = []
+        for user_id in user_ids | set(stats):
+            update = stats_update(stats[user_id]) if user_id in stats else {}
+            if user_id in balances:
+                update["$set"] = {"balance": str(balances[user_id])}
+            operations.append(UpdateOne({"user_id": user_id}, update))
+        if operations:
+            self.users.bulk_write(operations, session=session)
+
+        if self.counterparties is not None:
+            counterparty_operations = [
+                operation
+                for user_id, user_stats in stats.items()
+                for operation in self.counterparties.operations(user_id, user_stats["counterparties"])
+            ]
+            if counterparty_operations:
+                self.counterparties.collection.bulk_write(counterparty_operations, session=session)
+
+        # Group history records per user so each user gets a single update
+        history: Dict[str, List[Dict]] = {}
+        for entry in batch:
+            for user_id, records in entry.history.items():
+                history.setdefault(user_id, []).extend(records)
+        if history:
+            self.transactions.bulk_write([
+                UpdateOne({"user_id": user_id}, {"$addToSet": {"transactions": {"$each": records}}}, upsert=True)
+                for user_id, records in history.items()
+            ], session=session)
+
+        if self.journal is not None:
+            self.journal.write([journal_entry for entry in batch for journal_entry in entry.journal], session)
+
+        return results
@@ -0,0 +1,134 @@
+import datetime
+import time
+import traceback
+from typing import Dict, List, Optional
+
+# Seconds between checkpoints of the volume buckets to MongoDB
+CHECKPOINT_SECONDS = 60
+
+class TransferVolumeTracker:
+    """Rolling network transfer volume kept in a ring buffer of per-minute buckets"""
+
+    def __init__(self, collection, minutes: int = 60, document_id: str = "transfer_volume"):
+        self.collection = collection
+        self.minutes = minutes
+        self.document_id = document_id
+        # Slot i holds the totals of absolute minute bucket_minutes[i]
+        self.bucket_minutes: List[Optional[int]] = [None] * minutes
+        self.volumes = [0.0] * minutes
+        self.counts = [0] * minutes
+        self.loaded = False
+        self.last_checkpoint = time.time()
+
+    def _slot(self, minute: int) -> int:
+        slot = minute % self.minutes
+        if self.bucket_minutes[slot] != minute:
+            # The slot still holds a minute that has left the window
+            self.bucket_minutes[slot] = minute
+            self.volumes[slot] = 0.0
+            self.counts[slot] = 0
+        return slot
+
+    def _load(self):
+        """Restore buckets from the last checkpoint"""
+        self.loaded = True
+        try:
+            document = self.collection.find_one({"_id": self.document_id})
+        except Exception as e:
+            print(f"Error loading transfer volume checkpoint: {e}")
+            return
+        if not document:
+            return
+        oldest = int(time.time() // 60) - self.minutes + 1
+        for bucket in document.get("buckets", []):
+            minute = bucket.get("minute", 0)
+            if minute >= oldest:
+                slot = self._slot(minute)
+                self.volumes[slot] = float(bucket.get("volume", 0))
+                self.counts[slot] = int(bucket.get("count", 0))
+
+    def record(self, amount: float, now: Optional[float] = None):
+        """Add a transfer to the current minute bucket"""
+        if not self.loaded:
+            self._load()
+        now = time.time() if now is None else now
+        slot = self._slot(int(now // 60))
+        self.volumes[slot] += amount
+        self.counts[slot] += 1
+
+    def volume(self, window_minutes: Optional[int] = None, now: Optional[float] = None) -> float:
+        """Total volume over the last window_minutes (including the current minute)"""
+        if not self.loaded:
+            self._load()
+        now = time.time() if now is None else now
+        window = min(window_minutes or self.minutes, self.minutes)
+        oldest = int(now // 60) - window + 1
+        return sum(
+            volume for minute, volume in zip(self.bucket_minutes, self.volumes)
+            if minute is not None and minute >= oldest
+        )
+
+    def maybe_checkpoint(self):
+        """Persist the buckets if the last checkpoint is old enough"""
+        if time.time() - self.last_checkpoint < CHECKPOINT_SECONDS:
+            return
+        self.last_checkpoint = time.time()
+        buckets = [
+            {"minute": minute, "volume": volume, "count": count}
+            for minute, volume, count in zip(self.bucket_minutes, self.volumes, self.counts)
+            if minute is not None
+        ]
+        try:
+            self.collection.update_one(
+                {"_id": self.document_id},
+                {"$set": {"buckets": buckets, "updated_at": datetime.datetime.now()}},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"Error checkpointing transfer volume: {e}")
+            print(traceback.format_exc())
+
+# Function to pick the tax rate for the current network volume
+def dynamic_tax_rate(transfer_settings: Dict, volume: float) -> Optional[str]:
+    """
+    Return the tax_rate for the highest dynamic tier reached by volume
+
+    Configured on the settings document as:
+    "dynamic_tax": {"enabled": true, "window_minutes": "60",
+                    "tiers": [{"min_volume": "10000", "tax_rate": "0.02"}]}
+    """
+    dynamic_tax = transfer_settings.get("dynamic_tax") or {}
+    rate = None
+    best_volume = None
+    for tier in dynamic_tax.get("tiers", []):
+        try:
+            min_volume = float(tier.get("min_volume", 0))
+        except (TypeError, ValueError):
+            continue
+        if volume >= min_volume and (best_volume is None or min_volume > best_volume):
+            best_volume = min_volume
+            rate = str(tier.get("tax_rate", transfer_settings.get("tax_rate", "0.01")))
+    return rate
+
+# Function to overlay the dynamic tax rate on a settings snapshot
+def apply_dynamic_tax(transfer_settings: Optional[Dict], tracker: TransferVolumeTracker) -> Optional[Dict]:
+    if not transfer_settings:
+        return transfer_settings
+    dynamic_tax = transfer_settings.get("dynamic_tax") or {}
+    if not dynamic_tax.get("enabled", False):
+        return transfer_settings
+
+    try:
+        window_minutes = int(dynamic_tax.get("window_minutes", tracker.minutes))
+    except (TypeError, ValueError):
+        window_minutes = tracker.minutes
+    volume = tracker.volume(window_minutes)
+    rate = dynamic_tax_rate(transfer_settings, volume)
+
+    # Never mutate the cached document; callers get their own snapshot
+    snapshot = dict(transfer_settings)
+    snapshot["base_tax_rate"] = transfer_settings.get("tax_rate", "0.01")
+    snapshot["network_volume"] = volume
+    if rate is not None:
+        snapshot["tax_rate"] = rate
+    return snapshot
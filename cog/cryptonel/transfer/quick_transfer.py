@@ -16,10 +16,9 @@ from .utils import (
     check_transfer_status,
     get_transfer_settings,
     check_recipient,
-    calculate_fee,
-    record_transaction,
     TransferRateLimiter
 )
+from .dispatcher import execute_transfer
 
 # Load environment variables
 load_dotenv('clyne.env')
@@ -138,24 +137,26 @@ class ContactsDropdown(Select):
         transfer_modal = QuickTransferModal(
             user_data=user_data,
             recipient_data=recipient_data,
-            transfer_settings=transfer_settings
+            transfer_settings=transfer_settings,
+            origin_interaction_id=interaction.id
         )
         
         await interaction.response.send_modal(transfer_modal)
 
 # Ultra-Simplified Quick Transfer Modal
 class QuickTransferModal(Modal):
-    def __init__(self, user_data, recipient_data, transfer_settings):
+    def __init__(self, user_data, recipient_data, transfer_settings, origin_interaction_id=None):
         super().__init__(title="Quick Transfer")
         self.user_data = user_data
+        # Submissions of the same modal share one idempotency key
+        self.idempotency_key = f"quick_transfer:{origin_interaction_id}" if origin_interaction_id else None
         self.recipient_data = recipient_data
         self.transfer_settings = transfer_settings
         
         # Current balance
         self.balance = float(user_data.get("balance", "0"))
         
-        # Initialize fee rate
-        self.fee_rate = float(transfer_settings.get("tax_rate", "0.01"))
+        # Premium status for fee exemption
         self.is_premium = user_data.get("premium", False)
         
         # Create form field - only amount
@@ -200,19 +201,6 @@ class QuickTransferModal(Modal):
                 await interaction.followup.send(embed=embed, ephemeral=True)
                 return
             
-            # Check if user has enough balance
-            if amount > self.balance:
-                embed = discord.Embed(
-                    title="❌ Insufficient Balance",
-                    description=f"You don't have enough CRN. Your balance: {self.balance} CRN",
-                    color=0x8f92b1
-                )
-                await interaction.followup.send(embed=embed, ephemeral=True)
-                return
-            
-            # Calculate fee
-            fee_amount, recipient_amount = await calculate_fee(amount, self.is_premium, self.transfer_settings)
-            
             # Format amount displays
             def format_amount(value):
                 """Format amount for display with proper decimal places"""
@@ -226,17 +214,40 @@ class QuickTransferModal(Modal):
                 except:
                     return str(value)
             
-            # Process transfer and record in database
+            # Process transfer through the per-sender queue, which checks the current balance
             # Emails are automatically sent by the record_transaction function
-            transaction_id = await record_transaction(
-                sender_data=self.user_data,
-                recipient_data=self.recipient_data,
-                amount=amount,
-                recipient_amount=recipient_amount,
-                fee=fee_amount,
-                reason=reason
+            result = await execute_transfer(
+                self.user_data.get("user_id"),
+                self.recipient_data,
+                amount,
+                reason,
+                self.transfer_settings,
+                idempotency_key=self.idempotency_key
             )
             
+            if result["status"] == "no_wallet":
+                embed = discord.Embed(
+                    title="❌ No Wallet Found",
+                    description="Your wallet could not be found. Transfer cancelled.",
+                    color=0x8f92b1
+                )
+                await interaction.followup.send(embed=embed, ephemeral=True)
+                return
+            
+            # Check if user has enough balance
+            if result["status"] != "completed":
+                embed = discord.Embed(
+                    title="❌ Insufficient Balance",
+                    description=f"You don't have enough CRN. Your balance: {format_amount(result.get('balance', 0))} CRN",
+                    color=0x8f92b1
+                )
+                await interaction.followup.send(embed=embed, ephemeral=True)
+                return
+            
+            transaction_id = result["tx_id"]
+            fee_amount = result["fee"]
+            recipient_amount = result["amount_after_fee"]
+            
             # Send success message
             embed = discord.Embed(
                 title="✅ Transfer Successful",
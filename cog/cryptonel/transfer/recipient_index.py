@@ -0,0 +1,187 @@
+import asyncio
+import bisect
+import time
+import traceback
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .utils import db_wallet
+
+# Define collections
+contacts = db_wallet['quick_transfer_contacts']
+transactions = db_wallet['user_transactions']
+
+# How many history entries are scanned for recent counterparties
+RECENT_COUNTERPARTY_LIMIT = 50
+
+# Discord limits autocomplete results to 25 choices
+MAX_RESULTS = 25
+
+# Seconds before a cached index is rebuilt to pick up renames and contact changes
+INDEX_TTL_SECONDS = 300
+
+# Function to load a user's contacts and recent counterparties (blocking, run off the event loop)
+def load_recipient_entries(user_id: str) -> List[Dict]:
+    entries = []
+    seen = set()
+
+    def add_entry(username, private_address, source):
+        if not private_address or private_address in seen:
+            return
+        seen.add(private_address)
+        entries.append({
+            "username": username or "Unknown",
+            "private_address": private_address,
+            "source": source
+        })
+
+    # Saved contacts come first
+    user_contacts = contacts.find_one({"user_id": user_id})
+    if user_contacts:
+        for contact in user_contacts.get("contacts", []):
+            add_entry(contact.get("username"), contact.get("private_address"), "contact")
+
+    # Then the most recent counterparties we sent funds to
+    history = transactions.find_one(
+        {"user_id": user_id},
+        {"transactions": {"$slice": -RECENT_COUNTERPARTY_LIMIT}}
+    )
+    if history:
+        for tx in reversed(history.get("transactions", [])):
+            if tx.get("type") != "sent":
+                continue
+            add_entry(tx.get("counterparty_username"), tx.get("counterparty_address"), "recent")
+
+    return entries
+
+class RecipientIndex:
+    """Sorted prefix index over one user's contacts and recent counterparties"""
+
+    def __init__(self, entries: List[Dict]):
+        self.entries: List[Dict] = []
+        self.addresses: Dict[str, int] = {}
+        # Sorted (lowercase key, entry position) pairs searched with bisect
+        self.keys: List[Tuple[str, int]] = []
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry: Dict):
+        """Add an entry, or refresh the username of an existing address"""
+        address = entry.get("private_address")
+        if not address:
+            return
+        if address in self.addresses:
+            position = self.addresses[address]
+            old_username = self.entries[position].get("username", "")
+            new_username = entry.get("username", "Unknown")
+            if old_username == new_username:
+                return
+            # Renamed: the old username must stop matching
+            if old_username:
+                cursor = bisect.bisect_left(self.keys, (old_username.lower(), position))
+                if cursor < len(self.keys) and self.keys[cursor] == (old_username.lower(), position):
+                    del self.keys[cursor]
+            self.entries[position]["username"] = new_username
+            if new_username:
+                bisect.insort(self.keys, (new_username.lower(), position))
+            return
+
+        position = len(self.entries)
+        self.entries.append(dict(entry))
+        self.addresses[address] = position
+        for key in (entry.get("username", ""), address):
+            if key:
+                bisect.insort(self.keys, (key.lower(), position))
+
+    def search(self, prefix: str, limit: int = MAX_RESULTS) -> List[Dict]:
+        """Return entries whose username or address starts with prefix"""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return self.entries[:limit]
+
+        matched = set()
+        cursor = bisect.bisect_left(self.keys, (prefix,))
+        while cursor < len(self.keys) and self.keys[cursor][0].startswith(prefix):
+            matched.add(self.keys[cursor][1])
+            cursor += 1
+
+        # Keep contacts ahead of recent counterparties, as in the dropdown
+        return [self.entries[position] for position in sorted(matched)[:limit]]
+
+class RecipientIndexCache:
+    """
+    LRU cache of per-user recipient indexes, built lazily in the background
+
+    Indexes older than ttl_seconds keep answering autocomplete while a
+    fresh copy is built, so renamed counterparties and contacts saved on
+    the dashboard show up without a restart.
+    """
+
+    def __init__(self, max_users: int = 2000, ttl_seconds: float = INDEX_TTL_SECONDS):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.indexes: "OrderedDict[str, RecipientIndex]" = OrderedDict()
+        self.built_at: Dict[str, float] = {}
+        self.pending: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Optional[RecipientIndex]:
+        """Return a cached index without touching the database"""
+        index = self.indexes.get(user_id)
+        if index is not None:
+            self.indexes.move_to_end(user_id)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return index
+
+    def is_fresh(self, user_id: str) -> bool:
+        built_at = self.built_at.get(user_id)
+        return built_at is not None and time.monotonic() - built_at < self.ttl_seconds
+
+    def warm(self, user_id: str):
+        """Schedule a background build if the user has no fresh cached index"""
+        if user_id in self.pending or (user_id in self.indexes and self.is_fresh(user_id)):
+            return
+        self.pending[user_id] = asyncio.get_running_loop().create_task(self._build(user_id))
+
+    async def _build(self, user_id: str):
+        try:
+            entries = await asyncio.to_thread(load_recipient_entries, user_id)
+            self.indexes[user_id] = RecipientIndex(entries)
+            self.built_at[user_id] = time.monotonic()
+            self.indexes.move_to_end(user_id)
+            while len(self.indexes) > self.max_users:
+                evicted, _ = self.indexes.popitem(last=False)
+                self.built_at.pop(evicted, None)
+        except Exception as e:
+            print(f"Error building recipient index for {user_id}: {e}")
+            print(traceback.format_exc())
+        finally:
+            self.pending.pop(user_id, None)
+
+    def record_counterparty(self, user_id: str, username: str, private_address: str):
+        """Move a committed transfer's recipient to the front of the recents in a cached index"""
+        index = self.indexes.get(user_id)
+        if index is None or not private_address:
+            return
+        saved = [entry for entry in index.entries if entry["source"] == "contact"]
+        if any(entry["private_address"] == private_address for entry in saved):
+            # Saved contacts keep their place; only a rename is applied
+            index.add({"username": username, "private_address": private_address, "source": "contact"})
+            return
+        recents = [
+            entry for entry in index.entries
+            if entry["source"] != "contact" and entry["private_address"] != private_address
+        ]
+        latest = {"username": username, "private_address": private_address, "source": "recent"}
+        # Positions are the display order, so the index is rebuilt (a few dozen entries)
+        self.indexes[user_id] = RecipientIndex(saved + [latest] + recents[:RECENT_COUNTERPARTY_LIMIT - 1])
+
+    def invalidate(self, user_id: str):
+        self.indexes.pop(user_id, None)
+        self.built_at.pop(user_id, None)
+
+# Shared cache used by the /transfer autocomplete
+recipient_index_cache = RecipientIndexCache()
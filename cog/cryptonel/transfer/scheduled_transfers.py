@@ -0,0 +1,339 @@
+import discord
+from discord.ui import Modal, TextInput, View, Select, Button
+import asyncio
+import datetime
+import traceback
+import uuid
+import re
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+# Import utility functions
+from .utils import db_wallet, users, verify_auth, get_transfer_settings, get_auth_method, check_transfer_status
+from .dispatcher import execute_transfer
+from ..scheduler import DeadlineScheduler, as_utc, utc_now
+
+# Maximum number of active schedules per user
+MAX_SCHEDULES_PER_USER = 10
+
+# Run results that end a job instead of moving it to its next run
+TERMINAL_RESULTS = {"no_wallet", "sender_banned", "recipient_banned"}
+
+class ScheduledTransferService:
+    """
+    Scheduled and recurring transfers stored in cryptonel_wallet.scheduled_transfers
+
+    A job has a next_run time and an optional interval_days. The deadline
+    scheduler loads the active jobs due within its lookahead window and
+    hands due jobs over in batches; each run goes through execute_transfer
+    with the idempotency key scheduled:<job>:<run>, so a run interrupted by
+    a restart is never paid twice. If the bot was down for several
+    intervals, a recurring job pays once and moves on to its next future run.
+
+    Every run re-checks both wallets, as the interactive path does. A ban
+    on either side ends the job. A wallet lock skips the run; a recurring
+    job then waits for its next run, and a one-time job fails.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.scheduler = DeadlineScheduler("scheduled transfers", self.load_window, self.run_batch)
+        self.indexes_ready = False
+
+    def ensure_indexes(self):
+        if self.indexes_ready:
+            return
+        self.collection.create_index([("status", ASCENDING), ("next_run", ASCENDING)])
+        self.collection.create_index([("user_id", ASCENDING), ("status", ASCENDING)])
+        self.indexes_ready = True
+
+    def start(self):
+        self.scheduler.start()
+
+    def stop(self):
+        self.scheduler.stop()
+
+    def load_window(self, horizon: datetime.datetime):
+        self.ensure_indexes()
+        cursor = self.collection.find({"status": "active", "next_run": {"$lte": horizon}}, {"next_run": 1})
+        return [(job["_id"], job["next_run"]) for job in cursor]
+
+    def active_jobs(self, user_id: str) -> List[Dict]:
+        return list(self.collection.find({"user_id": user_id, "status": "active"}).sort("next_run", ASCENDING))
+
+    def create(self, user_id: str, recipient_data: Dict, amount: float, reason: str, first_run: datetime.datetime, interval_days: int) -> Dict:
+        self.ensure_indexes()
+        job = {
+            "_id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "recipient_id": recipient_data.get("user_id"),
+            "recipient_address": recipient_data.get("private_address"),
+            "recipient_username": recipient_data.get("username", "Unknown"),
+            "amount": f"{amount:.8f}",
+            "reason": reason,
+            "interval_days": interval_days,
+            "next_run": first_run,
+            "run_count": 0,
+            "status": "active",
+            "created_at": utc_now()
+        }
+        self.collection.insert_one(job)
+        self.scheduler.schedule(job["_id"], first_run)
+        return job
+
+    def cancel(self, user_id: str, job_id: str) -> bool:
+        result = self.collection.update_one(
+            {"_id": job_id, "user_id": user_id, "status": "active"},
+            {"$set": {"status": "cancelled", "cancelled_at": utc_now()}}
+        )
+        self.scheduler.cancel(job_id)
+        return result.modified_count > 0
+
+    async def run_batch(self, job_ids: List[str]):
+        """Run a batch of due jobs: one read for the jobs, one for both wallets, one bulk_write"""
+        jobs = await asyncio.to_thread(lambda: list(self.collection.find({"_id": {"$in": job_ids}, "status": "active"})))
+        if not jobs:
+            return
+        # Senders and recipients are read together so every run sees their current ban and lock flags
+        user_ids = list({job["recipient_id"] for job in jobs} | {job["user_id"] for job in jobs})
+        wallets = await asyncio.to_thread(lambda: {
+            doc["user_id"]: doc for doc in users.find({"user_id": {"$in": user_ids}})
+        })
+        transfer_settings = await get_transfer_settings()
+
+        # Different senders run in parallel; the dispatcher serializes each sender
+        results = await asyncio.gather(
+            *(self.run_job(job, wallets.get(job["user_id"]), wallets.get(job["recipient_id"]), transfer_settings) for job in jobs),
+            return_exceptions=True
+        )
+
+        now = utc_now()
+        operations = []
+        for job, result in zip(jobs, results):
+            if isinstance(result, Exception):
+                print(f"Error running scheduled transfer {job['_id']}: {result}")
+                status = "error"
+            else:
+                status = result
+            update = {"last_run_at": now, "last_result": status, "run_count": job.get("run_count", 0) + 1}
+
+            interval_days = job.get("interval_days", 0)
+            if interval_days > 0 and status not in TERMINAL_RESULTS:
+                next_run = as_utc(job["next_run"])
+                while next_run <= now:
+                    next_run += datetime.timedelta(days=interval_days)
+                update["next_run"] = next_run
+                self.scheduler.schedule(job["_id"], next_run)
+            else:
+                update["status"] = "completed" if status == "completed" else "failed"
+            operations.append(UpdateOne({"_id": job["_id"], "status": "active"}, {"$set": update}))
+
+        await asyncio.to_thread(self.collection.bulk_write, operations, ordered=False)
+
+    async def run_job(self, job: Dict, sender_data: Optional[Dict], recipient_data: Optional[Dict], transfer_settings: Dict) -> str:
+        if not sender_data or not recipient_data:
+            return "no_wallet"
+        # The same checks as check_transfer_status; either wallet may have changed since the job was created
+        for role, wallet in (("sender", sender_data), ("recipient", recipient_data)):
+            if wallet.get("ban", False):
+                return f"{role}_banned"
+            if wallet.get("wallet_lock", False):
+                return f"{role}_locked"
+        result = await execute_transfer(
+            job["user_id"],
+            recipient_data,
+            float(job["amount"]),
+            job.get("reason", "Scheduled transfer"),
+            transfer_settings,
+            idempotency_key=f"scheduled:{job['_id']}:{job.get('run_count', 0)}"
+        )
+        return result["status"]
+
+# Shared service started by the transfer cog
+scheduled_transfers = ScheduledTransferService(db_wallet['scheduled_transfers'])
+
+# Function to describe a job's schedule
+def describe_schedule(job: Dict) -> str:
+    next_run = as_utc(job["next_run"]).strftime("%Y-%m-%d %H:%M UTC")
+    interval_days = job.get("interval_days", 0)
+    repeat = f"every {interval_days} day(s)" if interval_days else "once"
+    return f"{job['amount']} CRN to {job.get('recipient_username', 'Unknown')}, {repeat}, next: {next_run}"
+
+# Modal for creating a scheduled or recurring transfer
+class ScheduledTransferModal(Modal):
+    def __init__(self, user_data, transfer_settings, auth_type, auth_label):
+        super().__init__(title="Schedule a Transfer")
+        self.user_data = user_data
+        self.transfer_settings = transfer_settings
+        self.auth_type = auth_type
+        self.auth_label = auth_label
+
+        self.address = TextInput(
+            label="Recipient's Private Address",
+            placeholder="Enter the recipient's private address",
+            required=True
+        )
+        self.add_item(self.address)
+
+        self.amount = TextInput(
+            label="Amount",
+            placeholder="Enter the amount of CRN to send each time",
+            required=True
+        )
+        self.add_item(self.amount)
+
+        self.first_run = TextInput(
+            label="First Payment (UTC)",
+            placeholder="YYYY-MM-DD HH:MM",
+            required=True,
+            max_length=16
+        )
+        self.add_item(self.first_run)
+
+        self.interval = TextInput(
+            label="Repeat Every (days, 0 = once)",
+            placeholder="0",
+            default="0",
+            required=True,
+            max_length=3
+        )
+        self.add_item(self.interval)
+
+        self.auth_input = TextInput(
+            label=f"Enter your {auth_label}",
+            placeholder=f"Provide your {auth_label} for security verification",
+            required=True
+        )
+        self.add_item(self.auth_input)
+
+    async def send_error(self, interaction: discord.Interaction, title: str, description: str):
+        embed = discord.Embed(title=title, description=description, color=0x8f92b1)
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            if not await verify_auth(self.user_data, self.auth_input.value.strip(), self.auth_type):
+                embed = discord.Embed(
+                    title="❌ Authentication Failed",
+                    description=f"The {self.auth_label} you provided is incorrect. Schedule cancelled.",
+                    color=0xff0000
+                )
+                await interaction.followup.send(embed=embed, ephemeral=True)
+                return
+
+            amount_str = self.amount.value.strip().replace(',', '.')
+            try:
+                if re.match(r'^0\d+', amount_str):
+                    raise ValueError
+                amount = float(f"{float(amount_str):.8f}")
+            except ValueError:
+                await self.send_error(interaction, "❌ Invalid Amount", "Please enter a valid number.")
+                return
+            min_amount = float(self.transfer_settings.get("min_amount", "0.25"))
+            max_amount = float(self.transfer_settings.get("max_amount", "1000.0"))
+            if amount < min_amount or amount > max_amount:
+                await self.send_error(interaction, "❌ Invalid Amount", f"Amount must be between {min_amount} and {max_amount} CRN.")
+                return
+
+            try:
+                first_run = datetime.datetime.strptime(self.first_run.value.strip(), "%Y-%m-%d %H:%M").replace(tzinfo=datetime.timezone.utc)
+            except ValueError:
+                await self.send_error(interaction, "❌ Invalid Date", "Please use the format YYYY-MM-DD HH:MM (UTC).")
+                return
+            if first_run <= utc_now():
+                await self.send_error(interaction, "❌ Invalid Date", "The first payment must be in the future.")
+                return
+
+            try:
+                interval_days = int(self.interval.value.strip())
+            except ValueError:
+                interval_days = -1
+            if interval_days < 0 or interval_days > 365:
+                await self.send_error(interaction, "❌ Invalid Interval", "Repeat interval must be between 0 and 365 days.")
+                return
+
+            recipient_data = users.find_one({"private_address": self.address.value.strip()})
+            if not recipient_data:
+                await self.send_error(interaction, "❌ Invalid Recipient", "The private address you provided does not exist.")
+                return
+            user_id = self.user_data.get("user_id")
+            if recipient_data.get("user_id") == user_id:
+                await self.send_error(interaction, "❌ Self Transfer", "You cannot transfer funds to yourself.")
+                return
+
+            if len(scheduled_transfers.active_jobs(user_id)) >= MAX_SCHEDULES_PER_USER:
+                await self.send_error(interaction, "❌ Too Many Schedules", f"You can have at most {MAX_SCHEDULES_PER_USER} active schedules.")
+                return
+
+            reason = "Recurring transfer" if interval_days else "Scheduled transfer"
+            job = scheduled_transfers.create(user_id, recipient_data, amount, reason, first_run, interval_days)
+
+            embed = discord.Embed(
+                title="✅ Transfer Scheduled",
+                description=describe_schedule(job),
+                color=0x00ff00
+            )
+            embed.add_field(name="Schedule ID", value=job["_id"], inline=False)
+            embed.set_footer(text="Fees are calculated at the time of each payment. Make sure your balance covers it.")
+            await interaction.followup.send(embed=embed, ephemeral=True)
+
+        except Exception as e:
+            print(f"Error scheduling transfer: {e}")
+            print(traceback.format_exc())
+
+            embed = discord.Embed(
+                title="❌ Schedule Error",
+                description="An error occurred while scheduling your transfer. Please try again later.",
+                color=0x8f92b1
+            )
+            await interaction.followup.send(embed=embed, ephemeral=True)
+
+# Dropdown for cancelling an active schedule
+class CancelScheduleSelect(Select):
+    def __init__(self, jobs: List[Dict]):
+        options = [
+            discord.SelectOption(label=f"{job['amount']} CRN to {job.get('recipient_username', 'Unknown')}"[:100], value=job["_id"], description=describe_schedule(job)[:100])
+            for job in jobs[:25]
+        ]
+        super().__init__(placeholder="Cancel a schedule...", options=options)
+
+    async def callback(self, interaction: discord.Interaction):
+        cancelled = scheduled_transfers.cancel(str(interaction.user.id), self.values[0])
+        embed = discord.Embed(
+            title="Schedule Cancelled" if cancelled else "Schedule Not Found",
+            description="The scheduled transfer has been cancelled." if cancelled else "This schedule is no longer active.",
+            color=0x8f92b1
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# View listing the user's schedules with actions
+class ScheduledTransfersView(View):
+    def __init__(self, jobs: List[Dict]):
+        super().__init__(timeout=120)
+        new_button = Button(label="New Schedule", style=discord.ButtonStyle.primary)
+        new_button.callback = self.new_schedule_callback
+        self.add_item(new_button)
+        if jobs:
+            self.add_item(CancelScheduleSelect(jobs))
+
+    async def new_schedule_callback(self, interaction: discord.Interaction):
+        if not await check_transfer_status(interaction):
+            return
+        user_data = users.find_one({"user_id": str(interaction.user.id)})
+        transfer_settings = await get_transfer_settings()
+        auth_type, auth_label = get_auth_method(user_data)
+        await interaction.response.send_modal(ScheduledTransferModal(user_data, transfer_settings, auth_type, auth_label))
+
+# Function to show the user's scheduled transfers
+async def show_scheduled_transfers(interaction: discord.Interaction):
+    jobs = scheduled_transfers.active_jobs(str(interaction.user.id))
+    embed = discord.Embed(
+        title="📅 Scheduled Transfers",
+        description="\n".join(f"• {describe_schedule(job)}" for job in jobs) if jobs else "You have no scheduled transfers.",
+        color=0x8f92b1
+    )
+    embed.set_footer(text=f"Up to {MAX_SCHEDULES_PER_USER} active schedules. Payments run automatically through your wallet.")
+    await interaction.response.send_message(embed=embed, view=ScheduledTransfersView(jobs), ephemeral=True)
@@ -0,0 +1,173 @@
+import discord
+from discord.ui import Modal, TextInput
+import traceback
+import re
+from typing import Dict, List, Tuple
+
+# Import utility functions
+from .utils import users, verify_auth
+from .dispatcher import execute_split_transfer
+
+# Default maximum number of recipients in one split payment
+DEFAULT_MAX_RECIPIENTS = 10
+
+# Function to parse "address amount" lines
+def parse_split_lines(text: str) -> Tuple[List[Tuple[str, float]], List[str]]:
+    """Return the parsed (address, amount) pairs and the lines that could not be read"""
+    entries = []
+    invalid = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        parts = re.split(r'[\s;]+', line)
+        if len(parts) != 2 or re.match(r'^0\d+', parts[1]):
+            invalid.append(line)
+            continue
+        try:
+            amount = float(f"{float(parts[1].replace(',', '.')):.8f}")
+        except ValueError:
+            invalid.append(line)
+            continue
+        entries.append((parts[0], amount))
+    return entries, invalid
+
+# Split payment modal for sending CRN to several recipients at once
+class SplitTransferModal(Modal):
+    def __init__(self, user_data, transfer_settings, auth_type, auth_label, origin_interaction_id=None):
+        super().__init__(title="Split Payment")
+        self.user_data = user_data
+        self.transfer_settings = transfer_settings
+        self.auth_type = auth_type
+        self.auth_label = auth_label
+        self.max_recipients = int(transfer_settings.get("max_split_recipients", DEFAULT_MAX_RECIPIENTS))
+        # Submissions of the same modal share one idempotency key
+        self.idempotency_key = f"split:{origin_interaction_id}" if origin_interaction_id else None
+
+        self.recipients = TextInput(
+            label=f"Recipients (up to {self.max_recipients})",
+            placeholder="One per line: <private address> <amount>",
+            style=discord.TextStyle.paragraph,
+            required=True
+        )
+        self.add_item(self.recipients)
+
+        self.reason = TextInput(
+            label="Reason for Transfer",
+            placeholder="Enter the reason for this split payment",
+            required=True,
+            max_length=100
+        )
+        self.add_item(self.reason)
+
+        self.auth_input = TextInput(
+            label=f"Enter your {auth_label}",
+            placeholder=f"Provide your {auth_label} for security verification",
+            required=True
+        )
+        self.add_item(self.auth_input)
+
+    async def send_error(self, interaction: discord.Interaction, title: str, description: str):
+        embed = discord.Embed(title=title, description=description, color=0x8f92b1)
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            # One authentication check for the whole batch
+            if not await verify_auth(self.user_data, self.auth_input.value.strip(), self.auth_type):
+                embed = discord.Embed(
+                    title="❌ Authentication Failed",
+                    description=f"The {self.auth_label} you provided is incorrect. Transfer cancelled.",
+                    color=0xff0000
+                )
+                await interaction.followup.send(embed=embed, ephemeral=True)
+                return
+
+            entries, invalid = parse_split_lines(self.recipients.value)
+            if invalid:
+                await self.send_error(interaction, "❌ Invalid Lines", "Could not read these lines:\n" + "\n".join(f"`{line[:60]}`" for line in invalid[:5]))
+                return
+            if not entries:
+                await self.send_error(interaction, "❌ No Recipients", "Please enter at least one recipient.")
+                return
+            if len(entries) > self.max_recipients:
+                await self.send_error(interaction, "❌ Too Many Recipients", f"A split payment can have at most {self.max_recipients} recipients.")
+                return
+
+            addresses = [address for address, _ in entries]
+            if len(set(addresses)) != len(addresses):
+                await self.send_error(interaction, "❌ Duplicate Recipient", "Each recipient can only appear once.")
+                return
+
+            # Validate every amount against the transfer limits
+            min_amount = float(self.transfer_settings.get("min_amount", "0.25"))
+            max_amount = float(self.transfer_settings.get("max_amount", "1000.0"))
+            for address, amount in entries:
+                if amount < min_amount or amount > max_amount:
+                    await self.send_error(interaction, "❌ Invalid Amount", f"Each amount must be between {min_amount} and {max_amount} CRN.")
+                    return
+
+            # Resolve all recipients with a single query
+            found = {doc["private_address"]: doc for doc in users.find({"private_address": {"$in": addresses}})}
+            missing = [address for address in addresses if address not in found]
+            if missing:
+                await self.send_error(interaction, "❌ Invalid Recipient", "These private addresses do not exist:\n" + "\n".join(f"`{address[:40]}`" for address in missing[:5]))
+                return
+            recipients = [found[address] for address in addresses]
+            if any(recipient.get("user_id") == self.user_data.get("user_id") for recipient in recipients):
+                await self.send_error(interaction, "❌ Self Transfer", "You cannot transfer funds to yourself.")
+                return
+
+            result = await execute_split_transfer(
+                self.user_data.get("user_id"),
+                recipients,
+                [amount for _, amount in entries],
+                self.reason.value.strip(),
+                self.transfer_settings,
+                idempotency_key=self.idempotency_key,
+                send_emails=self.transfer_settings.get("split_emails_enabled", True)
+            )
+
+            if result["status"] == "insufficient_funds":
+                await self.send_error(
+                    interaction,
+                    "❌ Insufficient Funds",
+                    f"This split payment needs {result['required']:.8f} CRN including fees.\n"
+                    f"Your balance: {result['balance']:.8f} CRN"
+                )
+                return
+            if result["status"] != "completed":
+                await self.send_error(interaction, "❌ Transfer Failed", "Your wallet could not be found.")
+                return
+
+            def format_amount(value):
+                return f"{float(value):.8f}".rstrip('0').rstrip('.')
+
+            embed = discord.Embed(
+                title="✅ Split Payment Complete",
+                description=f"You have successfully sent CRN to {len(recipients)} recipient(s).",
+                color=0x00ff00
+            )
+            if result.get("quotes"):
+                lines = [
+                    f"{recipient.get('username', 'Unknown')}: {format_amount(quote.amount_after_fee)} CRN (fee {format_amount(quote.fee)})"
+                    for recipient, quote in zip(recipients, result["quotes"])
+                ]
+                embed.add_field(name="Recipients", value="\n".join(lines)[:1024], inline=False)
+                embed.add_field(name="Total Deducted", value=f"{format_amount(result['required'])} CRN", inline=True)
+            embed.add_field(name="Batch ID", value=result["batch_id"], inline=False)
+
+            await interaction.followup.send(embed=embed, ephemeral=True)
+
+        except Exception as e:
+            print(f"Error in split transfer: {e}")
+            print(traceback.format_exc())
+
+            embed = discord.Embed(
+                title="❌ Transfer Error",
+                description="An error occurred while processing your split payment. Please try again later.",
+                color=0x8f92b1
+            )
+            await interaction.followup.send(embed=embed, ephemeral=True)
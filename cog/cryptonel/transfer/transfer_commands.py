@@ -17,9 +17,20 @@ from .utils import (
     check_recipient,
     calculate_fee,
     verify_auth,
+    get_auth_method,
     record_transaction,
-    TransferRateLimiter
+    TransferRateLimiter,
+    transfer_settings_cache,
+    counterparty_counts
 )
+from .recipient_index import recipient_index_cache
+from .fee_engine import compile_fee_schedule
+from .dispatcher import execute_transfer
+from .ledger_stats import STATS_FIELD
+from .scheduled_transfers import scheduled_transfers
+from .escrow import escrow_service, EscrowButton
+from cog.stats.metrics.registry import registry, track_interaction, count_queries
+from cog.stats.metrics.tracing import start_trace, span
 # Email sending is handled by record_transaction
 
 # Load environment variables
@@ -40,22 +51,32 @@ transfer_rate_limiter = TransferRateLimiter()
 
 # Set up the dropdown view
 class TransferView(View):
-    def __init__(self, bot, cog):
+    def __init__(self, bot, cog, recipient_address=None):
         super().__init__(timeout=60)
         self.bot = bot
         self.cog = cog
-        self.add_item(TransferDropdown(bot, cog))
+        self.add_item(TransferDropdown(bot, cog, recipient_address))
 
 # Create dropdown menu for transfer options
 class TransferDropdown(Select):
-    def __init__(self, bot, cog):
+    def __init__(self, bot, cog, recipient_address=None):
         self.bot = bot
         self.cog = cog
+        # Recipient picked through the /transfer autocomplete, if any
+        self.recipient_address = recipient_address
         options = [
             discord.SelectOption(label="Send CRN", value="send_coins", 
                                 description="Transfer CRN to another user"),
+            discord.SelectOption(label="Split Payment", value="split_transfer", 
+                                description="Send CRN to several users at once"),
+            discord.SelectOption(label="Escrow Transfer", value="escrow_transfer", 
+                                description="Hold CRN until the recipient accepts"),
+            discord.SelectOption(label="Scheduled Transfers", value="scheduled_transfers", 
+                                description="Schedule one-off or recurring transfers"),
             discord.SelectOption(label="Transfer History", value="transfer_history", 
                                 description="View your transfer history"),
+            discord.SelectOption(label="Transfer Stats", value="transfer_stats", 
+                                description="View your lifetime transfer statistics"),
             discord.SelectOption(label="Fee Calculator", value="fee_calculator", 
                                 description="Calculate fee on your transfers"),
             discord.SelectOption(label="⚡ Quick Transfer (Premium)", value="quick_transfer",
@@ -65,14 +86,23 @@ class TransferDropdown(Select):
     
     async def callback(self, interaction: discord.Interaction):
         try:
-            if self.values[0] == "send_coins":
-                await self.send_coins_callback(interaction)
-            elif self.values[0] == "transfer_history":
-                await self.transfer_history_callback(interaction)
-            elif self.values[0] == "fee_calculator":
-                await self.fee_calculator_callback(interaction)
-            elif self.values[0] == "quick_transfer":
-                await self.quick_transfer_callback(interaction)
+            with track_interaction("dropdown", f"transfer:{self.values[0]}"), start_trace(f"transfer:{self.values[0]}", interaction):
+                if self.values[0] == "send_coins":
+                    await self.send_coins_callback(interaction)
+                elif self.values[0] == "split_transfer":
+                    await self.split_transfer_callback(interaction)
+                elif self.values[0] == "escrow_transfer":
+                    await self.escrow_transfer_callback(interaction)
+                elif self.values[0] == "scheduled_transfers":
+                    await self.scheduled_transfers_callback(interaction)
+                elif self.values[0] == "transfer_history":
+                    await self.transfer_history_callback(interaction)
+                elif self.values[0] == "transfer_stats":
+                    await self.transfer_stats_callback(interaction)
+                elif self.values[0] == "fee_calculator":
+                    await self.fee_calculator_callback(interaction)
+                elif self.values[0] == "quick_transfer":
+                    await self.quick_transfer_callback(interaction)
         except Exception as e:
             print(f"Error in transfer dropdown callback: {e}")
             print(traceback.format_exc())
@@ -117,27 +147,80 @@ class TransferDropdown(Select):
             return
         
         # Determine authentication method
-        auth_methods = user_data.get("transfer_auth", {"secret_word": True})
-        auth_type = None
-        auth_label = None
-        
-        if auth_methods.get("secret_word", True):
-            auth_type = "secret_word"
-            auth_label = "Secret Word"
-        elif auth_methods.get("2fa", False):
-            auth_type = "2fa"
-            auth_label = "2FA Code"
-        elif auth_methods.get("password", False):
-            auth_type = "password"
-            auth_label = "Transfer Password"
-        else:
-            # Default to secret_word if nothing is specified
-            auth_type = "secret_word"
-            auth_label = "Secret Word"
+        auth_type, auth_label = get_auth_method(user_data)
             
         # Create modal for transfer information with authentication
-        transfer_modal = TransferModal(user_data, transfer_settings, auth_type, auth_label)
-        await interaction.response.send_modal(transfer_modal)
+        transfer_modal = TransferModal(user_data, transfer_settings, auth_type, auth_label, self.recipient_address, interaction.id)
+        with span("discord_response", call="send_modal"):
+            await interaction.response.send_modal(transfer_modal)
+
+    async def split_transfer_callback(self, interaction: discord.Interaction):
+        # Check if user can transfer funds
+        if not await check_transfer_status(interaction):
+            return
+        
+        # Get user data and transfer settings
+        user_id = str(interaction.user.id)
+        user_data = users.find_one({"user_id": user_id})
+        transfer_settings = await get_transfer_settings()
+        
+        # The whole split payment counts as a single transfer for rate limiting
+        is_limited, remaining, reset_time = await transfer_rate_limiter.check_rate_limit(
+            user_id, transfer_settings
+        )
+        if is_limited:
+            embed = discord.Embed(
+                title="⏱️ Rate Limited",
+                description=f"You've reached the maximum number of transfers. Please wait {reset_time} minute(s) to make another transfer.",
+                color=0x8f92b1
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        
+        # Show the split payment modal with a single authentication field
+        from .split_transfer import SplitTransferModal
+        auth_type, auth_label = get_auth_method(user_data)
+        await interaction.response.send_modal(
+            SplitTransferModal(user_data, transfer_settings, auth_type, auth_label, interaction.id)
+        )
+
+    async def escrow_transfer_callback(self, interaction: discord.Interaction):
+        # Check if user can transfer funds
+        if not await check_transfer_status(interaction):
+            return
+        
+        # Get user data and transfer settings
+        user_id = str(interaction.user.id)
+        user_data = users.find_one({"user_id": user_id})
+        transfer_settings = await get_transfer_settings()
+        
+        # Creating an escrow counts as a transfer for rate limiting
+        is_limited, remaining, reset_time = await transfer_rate_limiter.check_rate_limit(
+            user_id, transfer_settings
+        )
+        if is_limited:
+            embed = discord.Embed(
+                title="⏱️ Rate Limited",
+                description=f"You've reached the maximum number of transfers. Please wait {reset_time} minute(s) to make another transfer.",
+                color=0x8f92b1
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        
+        from .escrow import EscrowModal
+        auth_type, auth_label = get_auth_method(user_data)
+        await interaction.response.send_modal(
+            EscrowModal(user_data, transfer_settings, auth_type, auth_label, interaction.id)
+        )
+
+    async def scheduled_transfers_callback(self, interaction: discord.Interaction):
+        # Check if user can transfer funds
+        if not await check_transfer_status(interaction):
+            return
+        
+        # Show the user's schedules with options to add or cancel
+        from .scheduled_transfers import show_scheduled_transfers
+        await show_scheduled_transfers(interaction)
 
     async def transfer_history_callback(self, interaction: discord.Interaction):
         # Check if user can use transfer features
@@ -231,6 +314,68 @@ class TransferDropdown(Select):
             )
             await interaction.followup.send(embed=embed, ephemeral=True)
 
+    async def transfer_stats_callback(self, interaction: discord.Interaction):
+        # Check if user can use transfer features
+        if not await check_transfer_status(interaction):
+            return
+        
+        await interaction.response.defer(ephemeral=True)
+        
+        try:
+            # Totals are kept on the wallet document, so this is a single read
+            user_id = str(interaction.user.id)
+            user_data = users.find_one({"user_id": user_id}, {STATS_FIELD: 1})
+            stats = (user_data or {}).get(STATS_FIELD)
+            
+            if not stats or not stats.get("transfer_count"):
+                embed = discord.Embed(
+                    title="📊 Transfer Stats",
+                    description="You don't have any transfers yet.",
+                    color=0x8f92b1
+                )
+                await interaction.followup.send(embed=embed, ephemeral=True)
+                return
+            
+            def format_amount(value):
+                return f"{float(value):.8f}".rstrip('0').rstrip('.')
+            
+            def format_date(value):
+                return value.strftime("%Y-%m-%d %H:%M:%S") if value else "Unknown"
+            
+            embed = discord.Embed(
+                title="📊 Transfer Stats",
+                description="Your lifetime transfer statistics:",
+                color=0x8f92b1
+            )
+            embed.add_field(name="Total Sent", value=f"{format_amount(stats.get('total_sent', 0))} CRN", inline=True)
+            embed.add_field(name="Total Received", value=f"{format_amount(stats.get('total_received', 0))} CRN", inline=True)
+            embed.add_field(name="Fees Paid", value=f"{format_amount(stats.get('total_fees_paid', 0))} CRN", inline=True)
+            embed.add_field(name="Transfers", value=str(stats.get("transfer_count", 0)), inline=True)
+            embed.add_field(name="First Transfer", value=format_date(stats.get("first_transfer_at")), inline=True)
+            embed.add_field(name="Last Transfer", value=format_date(stats.get("last_transfer_at")), inline=True)
+            
+            # Top counterparties come from their own indexed collection; resolve their usernames in one query
+            top = counterparty_counts.top(user_id)
+            if top:
+                names = {
+                    doc["user_id"]: doc.get("username", "Unknown")
+                    for doc in users.find({"user_id": {"$in": [counterparty_id for counterparty_id, _ in top]}}, {"user_id": 1, "username": 1})
+                }
+                lines = [f"{names.get(counterparty_id, 'Unknown')} - {count} transfer(s)" for counterparty_id, count in top]
+                embed.add_field(name="Top Counterparties", value="\n".join(lines), inline=False)
+            
+            await interaction.followup.send(embed=embed, ephemeral=True)
+        except Exception as e:
+            print(f"Error in transfer stats: {e}")
+            print(traceback.format_exc())
+            
+            embed = discord.Embed(
+                title="❌ Error",
+                description="An error occurred while retrieving your transfer stats. Please try again later.",
+                color=0x8f92b1
+            )
+            await interaction.followup.send(embed=embed, ephemeral=True)
+
     async def fee_calculator_callback(self, interaction: discord.Interaction):
         # Check if user can use fee calculator
         if not await check_transfer_status(interaction):
@@ -262,34 +407,32 @@ class TransferDropdown(Select):
 
 # Transfer modal for collecting transfer details
 class TransferModal(Modal):
-    def __init__(self, user_data, transfer_settings, auth_type, auth_label):
+    def __init__(self, user_data, transfer_settings, auth_type, auth_label, recipient_address=None, origin_interaction_id=None):
         super().__init__(title="Transfer Funds")
         self.user_data = user_data
+        # Submissions of the same modal share one idempotency key
+        self.idempotency_key = f"transfer:{origin_interaction_id}" if origin_interaction_id else None
         self.transfer_settings = transfer_settings
         self.auth_type = auth_type
         self.auth_label = auth_label
         
-        # Calculate fee rate and set placeholder text
-        fee_rate = float(transfer_settings.get("tax_rate", "0.01"))
-        fee_percentage = fee_rate * 100
+        # Set placeholder text from the compiled fee schedule
+        fee_schedule = compile_fee_schedule(transfer_settings)
         is_premium = user_data.get("premium", False)
-        premium_settings = transfer_settings.get("premium_settings", {})
-        
-        # Determine if fee applies to this user
-        fee_applies = transfer_settings.get("tax_enabled", True)
-        if is_premium and premium_settings.get("tax_exempt_enabled", True) and premium_settings.get("tax_exempt", True):
-            fee_applies = False
         
         # Create fee info text
-        if fee_applies:
-            fee_info = f"({fee_percentage:.1f}% fee will be deducted)"
-        else:
+        if not fee_schedule.is_exempt(is_premium):
+            fee_info = f"({fee_schedule.describe()} fee will be deducted)"
+        elif fee_schedule.enabled:
             fee_info = "(No fee - Premium Benefit)"
+        else:
+            fee_info = "(No fee)"
         
         # Add inputs
         self.private_address = TextInput(
             label="Recipient's Private Address",
             placeholder="Enter the recipient's private address",
+            default=recipient_address,
             required=True
         )
         self.add_item(self.private_address)
@@ -322,8 +465,13 @@ class TransferModal(Modal):
         self.add_item(self.auth_input)
     
     async def on_submit(self, interaction: discord.Interaction):
+        with count_queries("modal transfer:submit"), start_trace("transfer:submit", interaction):
+            await self.process_submit(interaction)
+    
+    async def process_submit(self, interaction: discord.Interaction):
         # Defer the response to give us time to process
-        await interaction.response.defer(ephemeral=True)
+        with span("discord_response", call="defer"):
+            await interaction.response.defer(ephemeral=True)
         
         try:
             # Get input values
@@ -407,16 +555,17 @@ class TransferModal(Modal):
                 is_premium = self.user_data.get("premium", False)
                 fee, amount_after_fee = await calculate_fee(amount, is_premium, self.transfer_settings)
                 
-                # Check if user has enough balance for amount
+                # Check if user has enough balance for amount plus fee (the dispatcher checks again under the lock)
                 user_balance = float(self.user_data.get("balance", "0"))
-                if amount > user_balance:
+                required = float(f"{amount + fee:.8f}")
+                if required > user_balance:
                     # Calculate how much they need to add
-                    shortfall = amount - user_balance
+                    shortfall = required - user_balance
                     
                     embed = discord.Embed(
                         title="❌ Insufficient Funds",
                         description=f"You don't have enough funds to send {amount} CRN.\n\n"
-                                    f"Required: {amount:.2f} CRN\n"
+                                    f"Required: {required:.2f} CRN (including fee)\n"
                                     f"Your balance: {user_balance:.2f} CRN\n"
                                     f"Shortfall: {shortfall:.2f} CRN",
                         color=0x8f92b1
@@ -433,9 +582,7 @@ class TransferModal(Modal):
                 await interaction.followup.send(embed=embed, ephemeral=True)
                 return
             
-            # Calculate fee for display
-            is_premium = self.user_data.get("premium", False)
-            fee, amount_after_fee = await calculate_fee(amount, is_premium, self.transfer_settings)
+            # Total amount for display
             total_amount = amount + fee  # This is what will be deducted from sender
             
             # Format amounts for display with appropriate decimals
@@ -452,29 +599,40 @@ class TransferModal(Modal):
             
             # Process the transfer
             try:
-                # Double check user's balance before proceeding
-                updated_user = users.find_one({"user_id": self.user_data.get("user_id")})
-                current_balance = float(updated_user.get("balance", "0"))
+                # The dispatcher re-reads the balance while holding the sender's lock,
+                # so concurrent submissions from the same wallet cannot double-spend
+                result = await execute_transfer(
+                    self.user_data.get("user_id"),
+                    recipient_data,
+                    amount,
+                    reason,
+                    self.transfer_settings,
+                    idempotency_key=self.idempotency_key
+                )
                 
-                if amount > current_balance:
+                if result["status"] == "no_wallet":
+                    embed = discord.Embed(
+                        title="❌ No Wallet Found",
+                        description="Your wallet could not be found. Transfer cancelled.",
+                        color=0xff0000
+                    )
+                    await interaction.followup.send(embed=embed, ephemeral=True)
+                    return
+                if result["status"] != "completed":
+                    current_balance = result.get("balance", 0.0)
                     embed = discord.Embed(
                         title="❌ Insufficient Funds",
-                        description=f"Your balance has changed. You need {amount} CRN to complete this transfer.\n"
+                        description=f"Your balance has changed. You need {format_amount(result.get('required', amount))} CRN to complete this transfer.\n"
                                     f"Current balance: {current_balance:.2f} CRN",
                         color=0xff0000
                     )
                     await interaction.followup.send(embed=embed, ephemeral=True)
                     return
                 
-                # Process the transfer - ensure all values are properly formatted to 8 decimal places
-                tx_id = await record_transaction(
-                    self.user_data,
-                    recipient_data,
-                    float(f"{amount:.8f}"),  # Format to 8 decimal places
-                    float(f"{amount_after_fee:.8f}"),  # Recipient gets amount after fee
-                    float(f"{fee:.8f}"),
-                    reason
-                )
+                tx_id = result["tx_id"]
+                fee = result["fee"]
+                amount_after_fee = result["amount_after_fee"]
+                fee_display = format_amount(fee)
                 
                 # Send confirmation to sender
                 embed = discord.Embed(
@@ -520,7 +678,8 @@ class TransferModal(Modal):
                     inline=False
                 )
                 
-                await interaction.followup.send(embed=embed, ephemeral=True)
+                with span("discord_response", call="followup"):
+                    await interaction.followup.send(embed=embed, ephemeral=True)
                 
                 # Try to send DM to recipient
                 try:
@@ -590,11 +749,33 @@ class TransferCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
     
+    async def cog_load(self):
+        # Start running scheduled and recurring transfers
+        scheduled_transfers.start()
+        
+        # Escrow buttons are persistent, so register them before any interaction arrives
+        self.bot.add_dynamic_items(EscrowButton)
+        await escrow_service.start()
+        
+        registry.register_cache("transfer_settings", transfer_settings_cache)
+        registry.register_cache("recipient_index", recipient_index_cache)
+    
+    async def cog_unload(self):
+        scheduled_transfers.stop()
+        escrow_service.stop()
+        self.bot.remove_dynamic_items(EscrowButton)
+    
     @app_commands.command(name="transfer", description="Transfer CRN to another user")
-    async def transfer(self, interaction: discord.Interaction):
+    @app_commands.describe(recipient="Pick one of your contacts or recent recipients")
+    async def transfer(self, interaction: discord.Interaction, recipient: Optional[str] = None):
+        with start_trace("/transfer", interaction):
+            await self.show_transfer_options(interaction, recipient)
+    
+    async def show_transfer_options(self, interaction: discord.Interaction, recipient: Optional[str] = None):
         try:
             # Defer response immediately to prevent timeout
-            await interaction.response.defer(ephemeral=True)
+            with span("discord_response", call="defer"):
+                await interaction.response.defer(ephemeral=True)
             
             # Check if user can use transfer features
             status_check = await check_transfer_status(interaction)
@@ -608,6 +789,9 @@ class TransferCog(commands.Cog):
             # Double check user has a wallet (should already be checked by check_transfer_status)
             if not user_data:
                 return
+            
+            # Prepare the recipient autocomplete index for this user
+            recipient_index_cache.warm(user_id)
                 
             transfer_settings = await get_transfer_settings()
             
@@ -617,21 +801,18 @@ class TransferCog(commands.Cog):
                 color=0x8f92b1
             )
             
-            # Get fee rate and check premium status
-            fee_rate = float(transfer_settings.get("tax_rate", "0.01"))
-            fee_percentage = fee_rate * 100
+            # Get fee schedule and check premium status
+            fee_schedule = compile_fee_schedule(transfer_settings)
             is_premium = user_data.get("premium", False)
-            premium_settings = transfer_settings.get("premium_settings", {})
             
             # Build description with fee info
             description = "Select an option to proceed:\n\n"
             
-            if transfer_settings.get("tax_enabled", True):
-                if is_premium and premium_settings.get("tax_exempt_enabled", True) and premium_settings.get("tax_exempt", True):
-                    description += f"**Current Fee Rate:** 0% (Premium Benefit)\n"
+            if fee_schedule.enabled:
+                description += f"**Current Fee Rate:** {fee_schedule.describe(is_premium)}\n"
+                if fee_schedule.is_exempt(is_premium):
                     description += "As a premium user, you are exempt from transfer fees."
                 else:
-                    description += f"**Current Fee Rate:** {fee_percentage:.1f}%\n"
                     description += f"This fee will be deducted from your transfer amount."
             else:
                 description += "**Current Fee Rate:** 0%\n"
@@ -644,9 +825,10 @@ class TransferCog(commands.Cog):
             embed.description = description
             
             # Create view with dropdown menu
-            view = TransferView(self.bot, self)
+            view = TransferView(self.bot, self, recipient)
             
-            await interaction.followup.send(embed=embed, view=view, ephemeral=True)
+            with span("discord_response", call="followup"):
+                await interaction.followup.send(embed=embed, view=view, ephemeral=True)
             
         except Exception as e:
             print(f"Error in transfer command: {e}")
@@ -664,6 +846,26 @@ class TransferCog(commands.Cog):
             except:
                 pass
 
+    @transfer.autocomplete("recipient")
+    async def recipient_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+        # Autocomplete has a tight deadline, so only the in-memory index is used here
+        user_id = str(interaction.user.id)
+        index = recipient_index_cache.get(user_id)
+        # Build a missing or stale index in the background; later keystrokes will be served from it
+        recipient_index_cache.warm(user_id)
+        if index is None:
+            return []
+        
+        choices = []
+        for entry in index.search(current):
+            address = entry["private_address"]
+            if len(address) > 100:
+                continue
+            label = "Contact" if entry.get("source") == "contact" else "Recent"
+            name = f"{entry['username']} ({address[:12]}...) - {label}"
+            choices.append(app_commands.Choice(name=name[:100], value=address))
+        return choices
+
 # Setup function for loading the cog
 async def setup(bot):
     await bot.add_cog(TransferCog(bot))
@@ -0,0 +1,92 @@
+import datetime
+import re
+import time
+from typing import Dict, List, Optional, Set
+
+from pymongo.errors import AutoReconnect, PyMongoError
+
+# Function to tell whether a MongoDB error is safe to retry
+def is_transient_error(error: Exception) -> bool:
+    if isinstance(error, AutoReconnect):
+        return True
+    return isinstance(error, PyMongoError) and error.has_error_label("RetryableWriteError")
+
+# Function to retry an idempotent MongoDB operation on transient errors (blocking, run it in a worker thread)
+def retry_transient(operation, *args, attempts: int = 4, base_delay: float = 0.05, **kwargs):
+    for attempt in range(attempts):
+        try:
+            return operation(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts - 1 or not is_transient_error(e):
+                raise
+            print(f"Transient MongoDB error, retrying ({attempt + 1}/{attempts}): {e}")
+            time.sleep(base_delay * (2 ** attempt))
+
+class TransferJournal:
+    """
+    Journal of idempotency keys for transfers
+
+    Each key is stored once (unique index) together with the tx_id it
+    produced, and expires through a TTL index. The ledger writer writes the
+    key in the same transaction as the balance changes, so a key only exists
+    once its transfer was applied. A duplicate submission gets the original
+    tx_id back instead of moving money again. Keys of long-running jobs
+    are written without created_at, so they stay until release starts
+    their TTL once the job is done.
+    """
+
+    def __init__(self, collection, ttl_seconds: int = 86400):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.indexes_ready = False
+
+    def ensure_indexes(self):
+        if self.indexes_ready:
+            return
+        self.collection.create_index("idempotency_key", unique=True)
+        self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+        self.indexes_ready = True
+
+    def completed(self, idempotency_key: str) -> Optional[Dict]:
+        """The entry of a key whose transfer was applied, if any (blocking)"""
+        self.ensure_indexes()
+        return retry_transient(self.collection.find_one, {"idempotency_key": idempotency_key})
+
+    def completed_keys(self, idempotency_keys: List[str]) -> Set[str]:
+        """The keys among idempotency_keys whose transfers were applied (blocking)"""
+        self.ensure_indexes()
+        documents = retry_transient(
+            lambda: list(self.collection.find({"idempotency_key": {"$in": idempotency_keys}}, {"idempotency_key": 1}))
+        )
+        return {document["idempotency_key"] for document in documents}
+
+    def entry(self, idempotency_key: str, tx_id: str, details: Dict, expires: bool = True) -> Dict:
+        """Build the journal document a ledger entry commits for its key"""
+        # The TTL index only removes documents that have created_at
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return {
+            "idempotency_key": idempotency_key,
+            "tx_id": tx_id,
+            ("created_at" if expires else "recorded_at"): now,
+            **details
+        }
+
+    def release(self, key_prefix: str) -> int:
+        """Start the TTL of the non-expiring keys under a prefix (blocking)"""
+        result = retry_transient(
+            self.collection.update_many,
+            {"idempotency_key": {"$regex": f"^{re.escape(key_prefix)}"}, "created_at": {"$exists": False}},
+            {"$set": {"created_at": datetime.datetime.now(datetime.timezone.utc)}}
+        )
+        return result.modified_count
+
+    def write(self, entries: List[Dict], session):
+        """
+        Write journal documents inside the ledger transaction
+
+        A key that was already used raises DuplicateKeyError on the unique
+        index, which aborts the whole transaction. Copies are inserted, since
+        insert_one adds an _id and a failed batch is retried entry by entry.
+        """
+        for entry in entries:
+            self.collection.insert_one(dict(entry), session=session)
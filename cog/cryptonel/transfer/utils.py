@@ -5,7 +5,17 @@ from dotenv import load_dotenv
 import datetime
 import uuid
 import time
+import asyncio
 from typing import Dict, List, Tuple, Optional, Any
+from pymongo.errors import DuplicateKeyError
+from .fee_engine import compile_fee_schedule
+from .network_volume import TransferVolumeTracker, apply_dynamic_tax
+from .ledger_writer import LedgerEntry, LedgerWriter
+from .transfer_journal import TransferJournal
+from .ledger_stats import CounterpartyCounts
+from ..settings_cache import SettingsCache
+from cog.stats.metrics.registry import RATE_LIMIT_REJECTIONS
+from cog.stats.metrics.tracing import traced, span
 
 # Load environment variables
 load_dotenv('clyne.env')
@@ -20,11 +30,32 @@ users = db_wallet['users']
 db_settings = client['cryptonel_settings']
 settings = db_settings['settings']
 
+# Cached transfer settings and rolling network volume used for dynamic fees
+transfer_settings_cache = SettingsCache(db_wallet['settings'], "transfer_settings")
+network_volume = TransferVolumeTracker(db_wallet['network_stats'])
+
+# Idempotency keys of recent transfers (expire after a day)
+transfer_journal = TransferJournal(db_wallet['transfer_journal'])
+
+# Transfer counts per (user, counterparty), read by the transfer stats view
+counterparty_counts = CounterpartyCounts(db_wallet['ledger_counterparties'])
+
+# Group-commit writer for balances, transaction history and idempotency keys
+ledger_writer = LedgerWriter(
+    users,
+    db_wallet['user_transactions'],
+    journal=transfer_journal,
+    counterparties=counterparty_counts,
+    max_batch_size=int(os.getenv('LEDGER_MAX_BATCH_SIZE', '100')),
+    max_latency_ms=float(os.getenv('LEDGER_MAX_LATENCY_MS', '5'))
+)
+
 # Class for rate limiting transfers
 class TransferRateLimiter:
     def __init__(self):
         self.rate_limits = {}
         
+    @traced("rate_limit")
     async def check_rate_limit(self, user_id: str, transfer_settings: Dict) -> Tuple[bool, int, int]:
         # Get rate limit settings
         max_transfers = int(transfer_settings.get("max_transfers_per_window", "3"))
@@ -67,12 +98,15 @@ class TransferRateLimiter:
         # If not limited, add a new transfer
         if not is_limited:
             self.rate_limits[user_id]["transfers"].append(current_time)
+        else:
+            RATE_LIMIT_REJECTIONS.inc(limiter="transfer")
         
         # Return result
         transfers_remaining = max(0, max_transfers - transfers_made)
         return is_limited, transfers_remaining, minutes_until_reset
 
 # Function to check if user can use transfer features
+@traced("access_check")
 async def check_transfer_status(interaction: discord.Interaction) -> bool:
     user_id = str(interaction.user.id)
     
@@ -130,15 +164,16 @@ async def check_transfer_status(interaction: discord.Interaction) -> bool:
     return True
 
 # Function to get transfer settings
+@traced("settings_fetch")
 async def get_transfer_settings() -> Dict:
-    # Look for settings in cryptonel_wallet database
-    wallet_settings = db_wallet['settings']
-    transfer_settings = wallet_settings.find_one({"_id": "transfer_settings"})
+    # Look for settings in cryptonel_wallet database (cached snapshot)
+    transfer_settings = transfer_settings_cache.get()
     
-    # Just return what is in the database
-    return transfer_settings
+    # Adjust tax_rate to the recent network volume if dynamic tax is enabled
+    return apply_dynamic_tax(transfer_settings, network_volume)
 
 # Function to check if recipient exists
+@traced("recipient_check")
 async def check_recipient(private_address: str) -> Tuple[bool, Optional[Dict]]:
     recipient = users.find_one({"private_address": private_address})
     if not recipient:
@@ -146,27 +181,15 @@ async def check_recipient(private_address: str) -> Tuple[bool, Optional[Dict]]:
     return True, recipient
 
 # Function to calculate fee on transfer
+@traced("fee_computation")
 async def calculate_fee(amount: float, is_premium: bool, transfer_settings: Dict) -> Tuple[float, float]:
-    # Check if fee is enabled
-    fee_enabled = transfer_settings.get("tax_enabled", True)
-    if not fee_enabled:
-        return 0.0, amount
-    
-    # Check premium fee exemption
-    premium_settings = transfer_settings.get("premium_settings", {})
-    if is_premium and premium_settings.get("tax_exempt_enabled", True) and premium_settings.get("tax_exempt", True):
-        return 0.0, amount
-    
-    # Calculate fee
-    fee_rate = float(transfer_settings.get("tax_rate", "0.01"))
-    fee_amount = amount * fee_rate
-    
-    # Fee is deducted from the amount (not added)
+    # Fee rules live in the compiled fee schedule
     # Recipient gets amount - fee, sender pays the full amount
-    amount_after_fee = amount - fee_amount
-    return fee_amount, amount_after_fee
+    quote = compile_fee_schedule(transfer_settings).quote(amount, is_premium)
+    return quote.fee, quote.amount_after_fee
 
 # Function to verify authentication
+@traced("auth_check")
 async def verify_auth(user_data: Dict, auth_value: str, auth_type: str) -> bool:
     if auth_type == "secret_word":
         return auth_value == user_data.get("secret_word", "")
@@ -178,36 +201,40 @@ async def verify_auth(user_data: Dict, auth_value: str, auth_type: str) -> bool:
         return auth_value == user_data.get("transfer_password", "")
     return False
 
-# Function to record transaction
-async def record_transaction(
-    sender_data: Dict, 
-    recipient_data: Dict, 
-    amount: float, 
-    recipient_amount: float, 
-    fee: float, 
-    reason: str
-) -> str:
-    # Generate transaction ID
-    tx_id = str(uuid.uuid4())
-    timestamp = datetime.datetime.now()
+# Function to determine which authentication method a user transfers with
+def get_auth_method(user_data: Dict) -> Tuple[str, str]:
+    auth_methods = user_data.get("transfer_auth", {"secret_word": True})
+    
+    if auth_methods.get("secret_word", True):
+        return "secret_word", "Secret Word"
+    elif auth_methods.get("2fa", False):
+        return "2fa", "2FA Code"
+    elif auth_methods.get("password", False):
+        return "password", "Transfer Password"
     
+    # Default to secret_word if nothing is specified
+    return "secret_word", "Secret Word"
+
+# Function to add one sender -> recipient leg to a ledger entry
+def add_transfer_leg(
+    ledger_entry: LedgerEntry,
+    tx_id: str,
+    timestamp: datetime.datetime,
+    sender_data: Dict,
+    recipient_data: Dict,
+    amount: float,
+    recipient_amount: float,
+    fee: float,
+    reason: str,
+    extra: Optional[Dict] = None
+) -> Dict:
     # Get IDs
     sender_id = sender_data.get("user_id")
     recipient_id = recipient_data.get("user_id")
     
-    # Update sender balance
-    new_sender_balance = float(sender_data.get("balance", "0")) - (amount + fee)
-    users.update_one(
-        {"user_id": sender_id},
-        {"$set": {"balance": str(new_sender_balance)}}
-    )
-    
-    # Update recipient balance
-    new_recipient_balance = float(recipient_data.get("balance", "0")) + recipient_amount
-    users.update_one(
-        {"user_id": recipient_id},
-        {"$set": {"balance": str(new_recipient_balance)}}
-    )
+    # Sender pays amount + fee, recipient gets the amount after fee
+    ledger_entry.add_balance(sender_id, -(amount + fee))
+    ledger_entry.add_balance(recipient_id, recipient_amount)
     
     # Format all amounts to 8 decimal places for consistency
     formatted_amount = f"{float(amount):.8f}"
@@ -228,22 +255,12 @@ async def record_transaction(
         "sender_id": sender_id,
         "status": "completed",
         "fee": formatted_fee,
-        "reason": reason
+        "reason": reason,
+        **(extra or {})
     }
     
-    users_transactions = db_wallet["user_transactions"]
-    sender_tx_record = users_transactions.find_one({"user_id": sender_id})
-    
-    if sender_tx_record:
-        users_transactions.update_one(
-            {"user_id": sender_id},
-            {"$push": {"transactions": sender_tx}}
-        )
-    else:
-        users_transactions.insert_one({
-            "user_id": sender_id,
-            "transactions": [sender_tx]
-        })
+    ledger_entry.add_history(sender_id, sender_tx)
+    ledger_entry.add_stats(sender_id, sent=amount, fee=fee, counterparty_id=recipient_id, timestamp=timestamp)
     
     # Record transaction for recipient
     recipient_tx = {
@@ -259,24 +276,15 @@ async def record_transaction(
         "recipient_id": recipient_id,
         "status": "completed",
         "fee": formatted_fee,
-        "reason": reason
+        "reason": reason,
+        **(extra or {})
     }
     
-    recipient_tx_record = users_transactions.find_one({"user_id": recipient_id})
-    
-    if recipient_tx_record:
-        users_transactions.update_one(
-            {"user_id": recipient_id},
-            {"$push": {"transactions": recipient_tx}}
-        )
-    else:
-        users_transactions.insert_one({
-            "user_id": recipient_id,
-            "transactions": [recipient_tx]
-        })
+    ledger_entry.add_history(recipient_id, recipient_tx)
+    ledger_entry.add_stats(recipient_id, received=recipient_amount, counterparty_id=sender_id, timestamp=timestamp)
     
     # Create transaction object for email
-    transaction_for_email = {
+    return {
         "tx_id": tx_id,
         "amount": formatted_amount,
         "tax": formatted_fee,
@@ -286,15 +294,155 @@ async def record_transaction(
         "sender_public_address": sender_data.get("public_address", "Unknown"),
         "recipient_public_address": recipient_data.get("public_address", "Unknown")
     }
+
+# Function to show committed recipients first in the sender's /transfer autocomplete
+def remember_counterparties(sender_id: str, recipients: List[Dict]):
+    from .recipient_index import recipient_index_cache
+    # The last one recorded ends up first, so walk the recipients backwards
+    for recipient_data in reversed(recipients):
+        recipient_index_cache.record_counterparty(
+            sender_id,
+            recipient_data.get("username", "Unknown"),
+            recipient_data.get("private_address")
+        )
+
+# Function to look up the completed transfer behind an idempotency key
+async def find_completed_transfer(idempotency_key: Optional[str]) -> Optional[Dict]:
+    if not idempotency_key:
+        return None
+    return await asyncio.to_thread(transfer_journal.completed, idempotency_key)
+
+# Function to commit a ledger entry together with its idempotency key
+@traced("ledger_commit")
+async def commit_ledger_entry(
+    ledger_entry: LedgerEntry,
+    idempotency_key: Optional[str] = None,
+    tx_id: Optional[str] = None,
+    details: Optional[Dict] = None
+) -> Optional[str]:
+    """
+    Commit balances, history and the journal entry for idempotency_key in
+    one transaction
+
+    Returns None once committed. If the key had already completed, nothing
+    is written and the original tx_id is returned instead.
+    """
+    if idempotency_key:
+        ledger_entry.add_journal(transfer_journal.entry(idempotency_key, tx_id, details or {}))
+    # Balances and history are committed together with other transfers arriving at the same time
+    try:
+        await ledger_writer.submit(ledger_entry)
+    except DuplicateKeyError:
+        existing = await find_completed_transfer(idempotency_key)
+        if existing is None:
+            raise
+        return existing.get("tx_id")
+    return None
+
+# Function to record transaction
+@traced("record_transaction")
+async def record_transaction(
+    sender_data: Dict, 
+    recipient_data: Dict, 
+    amount: float, 
+    recipient_amount: float, 
+    fee: float, 
+    reason: str,
+    idempotency_key: Optional[str] = None
+) -> str:
+    # Generate transaction ID
+    tx_id = str(uuid.uuid4())
+    timestamp = datetime.datetime.now()
+    
+    ledger_entry = LedgerEntry()
+    transaction_for_email = add_transfer_leg(
+        ledger_entry, tx_id, timestamp, sender_data, recipient_data, amount, recipient_amount, fee, reason
+    )
+    
+    # A retried or double-submitted transfer gets the original tx_id back without any writes
+    original_tx_id = await commit_ledger_entry(ledger_entry, idempotency_key, tx_id, {
+        "sender_id": sender_data.get("user_id"),
+        "recipient_id": recipient_data.get("user_id"),
+        "amount": f"{float(amount):.8f}",
+        "recipient_amount": f"{float(recipient_amount):.8f}",
+        "fee": f"{float(fee):.8f}"
+    })
+    if original_tx_id:
+        return original_tx_id
+    
+    # Only committed transfers reach the recents
+    remember_counterparties(sender_data.get("user_id"), [recipient_data])
+    
+    # Feed the rolling network volume used by dynamic fees
+    network_volume.record(amount)
+    network_volume.maybe_checkpoint()
     
     # Import email sender here to avoid circular imports
     try:
         from .email_sender import send_transaction_emails
         # Send email notifications
-        send_transaction_emails(sender_data, recipient_data, transaction_for_email, users)
+        with span("email_enqueue"):
+            send_transaction_emails(sender_data, recipient_data, transaction_for_email, users)
     except Exception as e:
         print(f"Error sending transaction emails: {str(e)}")
         # Continue with the transaction even if email sending fails
     
     # Return transaction ID
-    return tx_id 
\ No newline at end of file
+    return tx_id
+
+# Function to record a split payment from one sender to many recipients
+async def record_split_transaction(
+    sender_data: Dict,
+    legs: List[Dict],
+    reason: str,
+    idempotency_key: Optional[str] = None,
+    send_emails: bool = True
+) -> Tuple[str, List[str]]:
+    """
+    Record every leg of a split payment as one ledger entry
+
+    Each leg is a dict with recipient_data, amount, recipient_amount and fee.
+    The sender is debited once for the total and all legs are committed in
+    the same ledger transaction, so either every recipient is credited or
+    none is. Returns the batch ID and the tx_id of each leg.
+    """
+    batch_id = str(uuid.uuid4())
+    timestamp = datetime.datetime.now()
+    
+    ledger_entry = LedgerEntry()
+    emails = []
+    tx_ids = []
+    for leg in legs:
+        tx_id = str(uuid.uuid4())
+        transaction_for_email = add_transfer_leg(
+            ledger_entry, tx_id, timestamp, sender_data, leg["recipient_data"],
+            leg["amount"], leg["recipient_amount"], leg["fee"], reason,
+            extra={"batch_id": batch_id}
+        )
+        emails.append((leg["recipient_data"], transaction_for_email))
+        tx_ids.append(tx_id)
+    
+    original_batch_id = await commit_ledger_entry(ledger_entry, idempotency_key, batch_id, {
+        "sender_id": sender_data.get("user_id"),
+        "recipient_count": len(legs),
+        "amount": f"{sum(leg['amount'] for leg in legs):.8f}",
+        "fee": f"{sum(leg['fee'] for leg in legs):.8f}"
+    })
+    if original_batch_id:
+        return original_batch_id, []
+    
+    remember_counterparties(sender_data.get("user_id"), [leg["recipient_data"] for leg in legs])
+    
+    # Feed the rolling network volume used by dynamic fees
+    for leg in legs:
+        network_volume.record(leg["amount"])
+    network_volume.maybe_checkpoint()
+    
+    if send_emails:
+        try:
+            from .email_sender import send_batch_transaction_emails
+            send_batch_transaction_emails(sender_data, emails, users)
+        except Exception as e:
+            print(f"Error sending split transaction emails: {str(e)}")
+    
+    return batch_id, tx_ids
@@ -0,0 +1,169 @@
+import asyncio
+import datetime
+import io
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+# Pillow is optional; without it the balance is shown without a chart
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+    ImageDraw = None
+
+# Number of recent transactions the chart is drawn from
+CHART_TRANSACTIONS = 60
+CHART_SIZE = (480, 140)
+CHART_BACKGROUND = (43, 45, 49)
+CHART_LINE = (143, 146, 177)
+CHART_FILL = (143, 146, 177, 60)
+
+# Function to draw the balance chart (runs in a worker process)
+def render_balance_chart(points: List[float], size: Tuple[int, int] = CHART_SIZE) -> bytes:
+    width, height = size
+    padding = 8
+    image = Image.new("RGBA", size, CHART_BACKGROUND + (255,))
+    overlay = Image.new("RGBA", size, (0, 0, 0, 0))
+
+    low, high = min(points), max(points)
+    spread = (high - low) or 1.0
+    step = (width - 2 * padding) / max(len(points) - 1, 1)
+    coordinates = [
+        (padding + index * step, height - padding - (value - low) / spread * (height - 2 * padding))
+        for index, value in enumerate(points)
+    ]
+
+    ImageDraw.Draw(overlay).polygon(
+        coordinates + [(coordinates[-1][0], height - padding), (coordinates[0][0], height - padding)],
+        fill=CHART_FILL
+    )
+    image = Image.alpha_composite(image, overlay)
+    ImageDraw.Draw(image).line(coordinates, fill=CHART_LINE, width=2)
+
+    output = io.BytesIO()
+    image.convert("RGB").save(output, format="PNG", optimize=True)
+    return output.getvalue()
+
+# Function to rebuild the balance after each of the user's recent transactions
+def balance_points(balance: float, transactions: List[Dict]) -> List[float]:
+    """Walk backwards from the current balance through the transaction history"""
+    transactions = sorted(
+        transactions,
+        key=lambda tx: tx.get("timestamp") if isinstance(tx.get("timestamp"), datetime.datetime) else datetime.datetime.min
+    )
+    points = [balance]
+    for tx in reversed(transactions):
+        try:
+            amount = float(tx.get("amount", "0"))
+            fee = float(tx.get("fee", "0"))
+        except (TypeError, ValueError):
+            continue
+        if tx.get("type") == "sent":
+            balance += amount + fee
+        else:
+            balance -= amount
+        points.append(balance)
+    points.reverse()
+    return points
+
+class ChartCache:
+    """
+    One cached PNG per user, capped by total bytes
+
+    Each entry is keyed by user_id and remembers the balance it was drawn
+    for, so a balance changed outside the bot's ledger (the dashboard,
+    mining) is a miss without any query. Transfers committed by the bot
+    drop the user's entry through invalidate_many. Least recently used
+    charts are evicted once max_bytes is exceeded.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str, balance: str) -> Optional[bytes]:
+        entry = self.entries.get(user_id)
+        if entry is None or entry[0] != balance:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id: str, balance: str, png: bytes):
+        self.invalidate(user_id)
+        if len(png) > self.max_bytes:
+            return
+        self.entries[user_id] = (balance, png)
+        self.total_bytes += len(png)
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+    def invalidate(self, user_id: str):
+        entry = self.entries.pop(user_id, None)
+        if entry is not None:
+            self.total_bytes -= len(entry[1])
+
+    def invalidate_many(self, user_ids):
+        for user_id in user_ids:
+            self.invalidate(user_id)
+
+class BalanceChartService:
+    """
+    Renders balance-over-time charts for Check Balance
+
+    Drawing with Pillow is CPU-bound, so it runs in a small process pool
+    and never on the event loop. Finished charts are cached per user and
+    dropped when the ledger writer commits a new transaction for them.
+    """
+
+    def __init__(self, transactions_collection, max_bytes: int, workers: int):
+        self.transactions = transactions_collection
+        self.cache = ChartCache(max_bytes)
+        self.workers = workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def render(self, user_id: str, balance: str) -> Optional[bytes]:
+        """Draw and cache a chart; returns None when there is not enough history"""
+        document = await asyncio.to_thread(
+            self.transactions.find_one, {"user_id": user_id}, {"transactions": {"$slice": -CHART_TRANSACTIONS}}
+        )
+        transactions = (document or {}).get("transactions") or []
+        if not transactions:
+            return None
+        points = balance_points(float(balance), transactions)
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        png = await asyncio.get_running_loop().run_in_executor(self.executor, render_balance_chart, points)
+        self.cache.put(user_id, balance, png)
+        return png
+
+    async def get_chart(self, user_id: str, balance: str) -> Optional[bytes]:
+        if not self.available:
+            return None
+        try:
+            # Repeat views are served from memory without touching the database
+            png = self.cache.get(user_id, balance)
+            if png is not None:
+                return png
+            return await self.render(user_id, balance)
+        except Exception as e:
+            print(f"Error rendering balance chart: {e}")
+            print(traceback.format_exc())
+            return None
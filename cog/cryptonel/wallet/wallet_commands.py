@@ -7,9 +7,14 @@ import pymongo
 import os
 from dotenv import load_dotenv
 import asyncio
+import io
 import traceback
 from typing import Dict, List, Optional
 from .utils import check_wallet_status
+from .balance_chart import BalanceChartService
+from ..transfer.utils import ledger_writer
+from cog.stats.metrics.registry import registry, track_interaction, RATE_LIMIT_REJECTIONS
+from cog.stats.metrics.tracing import start_trace
 
 # Load environment variables
 load_dotenv('clyne.env')
@@ -22,6 +27,13 @@ client = pymongo.MongoClient(MONGODB_URI)
 db_wallet = client['cryptonel_wallet']
 users = db_wallet['users']
 
+# Balance charts shown with Check Balance, rendered in a separate process
+balance_charts = BalanceChartService(
+    db_wallet['user_transactions'],
+    max_bytes=int(os.getenv('BALANCE_CHART_CACHE_BYTES', str(8 * 1024 * 1024))),
+    workers=int(os.getenv('BALANCE_CHART_WORKERS', '1'))
+)
+
 # Rate limit implementation
 class RateLimiter:
     def __init__(self, max_calls: int = 10, cooldown: int = 60):
@@ -70,10 +82,11 @@ class WalletDropdown(Select):
     
     async def callback(self, interaction: discord.Interaction):
         try:
-            if self.values[0] == "check_balance":
-                await self.check_balance_callback(interaction)
-            elif self.values[0] == "private_address":
-                await self.private_address_callback(interaction)
+            with track_interaction("dropdown", f"wallet:{self.values[0]}"), start_trace(f"wallet:{self.values[0]}", interaction):
+                if self.values[0] == "check_balance":
+                    await self.check_balance_callback(interaction)
+                elif self.values[0] == "private_address":
+                    await self.private_address_callback(interaction)
         except Exception as e:
             print(f"Error in wallet dropdown callback: {e}")
             print(traceback.format_exc())
@@ -144,7 +157,18 @@ class WalletDropdown(Select):
                 embed.add_field(name="Dashboard", value="[Open Wallet Dashboard](https://cryptonel.online/wallet)", inline=False)
                 embed.set_footer(text="Cryptonel Wallet")
                 
-                await interaction.response.send_message(embed=embed)
+                if not balance_charts.available:
+                    await interaction.response.send_message(embed=embed)
+                    return
+                
+                # Drawing a new chart can take a moment, so acknowledge the interaction first
+                await interaction.response.defer()
+                chart = await balance_charts.get_chart(user_id, str(balance))
+                if chart is None:
+                    await interaction.followup.send(embed=embed)
+                    return
+                embed.set_image(url="attachment://balance.png")
+                await interaction.followup.send(embed=embed, file=discord.File(io.BytesIO(chart), filename="balance.png"))
             except Exception as e:
                 print(f"Error retrieving balance: {e}")
                 print(traceback.format_exc())
@@ -264,6 +288,14 @@ class WalletCog(commands.Cog):
         self.bot = bot
         self.rate_limiter = RateLimiter(max_calls=10, cooldown=60)
     
+    async def cog_load(self):
+        # A committed transfer makes the charts of everyone involved stale
+        ledger_writer.add_commit_listener(balance_charts.cache.invalidate_many)
+        registry.register_cache("balance_chart", balance_charts.cache)
+    
+    async def cog_unload(self):
+        balance_charts.shutdown()
+    
     @app_commands.command(name="wallet", description="Access Cryptonel wallet features")
     async def wallet(self, interaction: discord.Interaction):
         """Wallet command with dropdown menu for various wallet options"""
@@ -274,6 +306,7 @@ class WalletCog(commands.Cog):
                 
             # Check rate limiting
             if self.rate_limiter.is_rate_limited(str(interaction.user.id)):
+                RATE_LIMIT_REJECTIONS.inc(limiter="wallet")
                 embed = discord.Embed(
                     title="⚠️ Rate Limited",
                     description="You're using this command too frequently. Please wait a minute before trying again.",
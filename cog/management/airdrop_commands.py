@@ -0,0 +1,268 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+import pymongo
+import os
+import asyncio
+import datetime
+import time
+import uuid
+from dotenv import load_dotenv
+import traceback
+from typing import Dict, List, Optional
+
+from .server_commands import OWNER_IDS
+from cog.cryptonel.transfer.utils import users, transfer_journal, commit_ledger_entry
+from cog.cryptonel.transfer.ledger_writer import LedgerEntry
+
+# Number of members joined against the wallets and credited per write
+CHUNK_SIZE = 1000
+# Minimum seconds between two edits of the status message
+PROGRESS_INTERVAL = 3
+
+class AirdropCommands(commands.Cog):
+    """
+    Owner-only airdrops to every wallet holder in a tracked server
+
+    Members are streamed from Discord in ascending ID order and processed in
+    chunks, so only one chunk is ever held in memory. Each chunk is joined
+    against the wallets with a single $in query and credited through the
+    ledger writer, with one idempotency key per member (airdrop:<job>:<user>)
+    committed in the same transaction as the credits. The cursor is
+    checkpointed in staff.airdrop_jobs after every chunk, so an interrupted
+    airdrop resumes at the first chunk that was not checkpointed. Members
+    whose key exists are skipped, so nobody is paid twice even if the
+    membership changed and the resumed chunk has different boundaries. The
+    keys do not expire while the job runs; their TTL starts when it ends.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.running_servers = set()
+
+        # Load environment variables
+        load_dotenv('clyne.env')
+
+        # Connect to MongoDB
+        self.mongodb_uri = os.getenv('MONGODB_URI')
+        if self.mongodb_uri:
+            try:
+                self.mongo_client = pymongo.MongoClient(self.mongodb_uri)
+                self.db = self.mongo_client.get_database("staff")
+                self.server_collection = self.db["server_trade_crn"]
+                self.jobs_collection = self.db["airdrop_jobs"]
+                print("MongoDB connection established for airdrops")
+            except Exception as e:
+                print(f"Error connecting to MongoDB: {e}")
+                self.mongo_client = None
+                self.server_collection = None
+                self.jobs_collection = None
+        else:
+            print("WARNING: MongoDB URI not found in environment variables")
+            self.mongo_client = None
+            self.server_collection = None
+            self.jobs_collection = None
+
+    # Owner-only check
+    def is_owner(self, user_id):
+        return user_id in OWNER_IDS
+
+    @app_commands.command(name="airdrop", description="Send CRN to every wallet holder in a tracked server")
+    @app_commands.describe(
+        server_id="The ID of the tracked server",
+        amount="Amount of CRN each wallet holder receives",
+        reason="Reason shown in the recipients' transaction history",
+        resume="Resume the unfinished airdrop for this server instead of starting a new one"
+    )
+    async def airdrop(
+        self,
+        interaction: discord.Interaction,
+        server_id: str,
+        amount: Optional[float] = None,
+        reason: Optional[str] = None,
+        resume: bool = False
+    ):
+        # Check if the user is an owner
+        if not self.is_owner(interaction.user.id):
+            await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+            return
+
+        await interaction.response.defer()
+        status_message = await interaction.followup.send(content="Preparing airdrop...")
+
+        try:
+            guild_id = int(server_id)
+        except ValueError:
+            await status_message.edit(content="Invalid server ID. Please provide a valid numeric ID.")
+            return
+
+        if self.jobs_collection is None:
+            await status_message.edit(content="Database connection is not available.")
+            return
+
+        # Streaming the member list needs the privileged members intent
+        if not self.bot.intents.members:
+            await status_message.edit(content="The members intent is disabled. Set MEMBERS_INTENT=true and enable it in the developer portal.")
+            return
+
+        if guild_id in self.running_servers:
+            await status_message.edit(content="An airdrop for this server is already running.")
+            return
+
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            await status_message.edit(content="I couldn't find a server with this ID or I'm not a member of it.")
+            return
+
+        if self.server_collection.find_one({"server_id": guild_id}, {"_id": 1}) is None:
+            await status_message.edit(content="This server is not tracked. Add it with /serveradd first.")
+            return
+
+        unfinished = self.jobs_collection.find_one({"server_id": guild_id, "status": "running"})
+        if resume:
+            if unfinished is None:
+                await status_message.edit(content="There is no unfinished airdrop for this server.")
+                return
+            job = unfinished
+        else:
+            if unfinished is not None:
+                await status_message.edit(content=f"An unfinished airdrop (`{unfinished['_id']}`) exists for this server. Run the command with resume set to True.")
+                return
+            if amount is None or amount <= 0:
+                await status_message.edit(content="Please provide a positive amount for the airdrop.")
+                return
+            if not reason:
+                await status_message.edit(content="Please provide a reason for the airdrop.")
+                return
+            job = {
+                "_id": str(uuid.uuid4()),
+                "server_id": guild_id,
+                "server_name": guild.name,
+                "amount": f"{float(amount):.8f}",
+                "reason": reason[:100],
+                "status": "running",
+                "last_member_id": None,
+                "scanned": 0,
+                "credited": 0,
+                "started_by": str(interaction.user.id),
+                "created_at": datetime.datetime.now(),
+                "updated_at": datetime.datetime.now()
+            }
+            self.jobs_collection.insert_one(job)
+
+        self.running_servers.add(guild_id)
+        try:
+            await self.run_airdrop(guild, job, status_message)
+        except Exception as e:
+            print(f"Error running airdrop {job['_id']}: {e}")
+            traceback.print_exc()
+            await status_message.edit(content=f"The airdrop stopped at {job['scanned']} members: {str(e)}\nRun the command again with resume set to True to continue.")
+        finally:
+            self.running_servers.discard(guild_id)
+
+    async def run_airdrop(self, guild, job: Dict, status_message):
+        amount = float(job["amount"])
+        after = discord.Object(id=job["last_member_id"]) if job.get("last_member_id") else None
+        last_progress = 0
+
+        chunk: List[discord.Member] = []
+        async for member in guild.fetch_members(limit=None, after=after):
+            if member.bot:
+                continue
+            chunk.append(member)
+            if len(chunk) >= CHUNK_SIZE:
+                await self.credit_chunk(guild, job, chunk, amount)
+                chunk = []
+                if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    await status_message.edit(content=self.progress_text(guild, job))
+        if chunk:
+            await self.credit_chunk(guild, job, chunk, amount)
+
+        job["status"] = "completed"
+        self.jobs_collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": "completed", "updated_at": datetime.datetime.now()}}
+        )
+        # A completed job is never resumed, so its keys can expire like any other
+        await asyncio.to_thread(transfer_journal.release, f"airdrop:{job['_id']}:")
+
+        embed = discord.Embed(
+            title="Airdrop Complete",
+            description=f"Sent **{job['amount']} CRN** to every wallet holder in **{guild.name}**.",
+            color=0x8f92b1
+        )
+        embed.add_field(name="Members Scanned", value=str(job["scanned"]), inline=True)
+        embed.add_field(name="Wallets Credited", value=str(job["credited"]), inline=True)
+        embed.add_field(name="Total Sent", value=f"{job['credited'] * amount:.8f} CRN", inline=True)
+        embed.add_field(name="Airdrop ID", value=job["_id"], inline=False)
+        await status_message.edit(content=None, embed=embed)
+
+    async def credit_chunk(self, guild, job: Dict, chunk: List[discord.Member], amount: float):
+        """Credit the wallet holders in one chunk of members and checkpoint the cursor"""
+        member_ids = [str(member.id) for member in chunk]
+        wallets = await asyncio.to_thread(lambda: list(users.find(
+            {"user_id": {"$in": member_ids}, "ban": {"$ne": True}, "wallet_lock": {"$ne": True}},
+            {"user_id": 1, "username": 1}
+        )))
+
+        # Members paid before an interruption already have their key
+        keys = {wallet["user_id"]: f"airdrop:{job['_id']}:{wallet['user_id']}" for wallet in wallets}
+        paid = await asyncio.to_thread(transfer_journal.completed_keys, list(keys.values())) if keys else set()
+        unpaid = [wallet for wallet in wallets if keys[wallet["user_id"]] not in paid]
+
+        tx_id = str(uuid.uuid4())
+        if unpaid:
+            timestamp = datetime.datetime.now()
+            ledger_entry = LedgerEntry()
+            for wallet in unpaid:
+                user_id = wallet["user_id"]
+                ledger_entry.add_balance(user_id, amount)
+                ledger_entry.add_history(user_id, {
+                    "tx_id": tx_id,
+                    "type": "received",
+                    "amount": job["amount"],
+                    "timestamp": timestamp,
+                    "counterparty_address": "Airdrop",
+                    "counterparty_public_address": "Airdrop",
+                    "counterparty_id": None,
+                    "counterparty_username": f"{guild.name} Airdrop",
+                    "recipient_username": wallet.get("username", "Unknown"),
+                    "recipient_id": user_id,
+                    "status": "completed",
+                    "fee": "0.00000000",
+                    "reason": job["reason"],
+                    "airdrop_id": job["_id"]
+                })
+                ledger_entry.add_stats(user_id, received=amount, timestamp=timestamp)
+                ledger_entry.add_journal(transfer_journal.entry(keys[user_id], tx_id, {
+                    "airdrop_id": job["_id"],
+                    "amount": job["amount"],
+                    "fee": "0.00000000"
+                }, expires=False))
+            await commit_ledger_entry(ledger_entry)
+
+        job["last_member_id"] = chunk[-1].id
+        job["scanned"] += len(chunk)
+        job["credited"] += len(wallets)
+        self.jobs_collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": {
+                "last_member_id": job["last_member_id"],
+                "scanned": job["scanned"],
+                "credited": job["credited"],
+                "updated_at": datetime.datetime.now()
+            }}
+        )
+
+    def progress_text(self, guild, job: Dict) -> str:
+        total = guild.member_count or "?"
+        return f"Airdrop in progress for **{guild.name}**: {job['scanned']}/{total} members scanned, {job['credited']} wallets credited..."
+
+async def setup(bot):
+    try:
+        await bot.add_cog(AirdropCommands(bot))
+        print("AirdropCommands cog loaded successfully")
+    except Exception as e:
+        print(f"Error loading AirdropCommands cog: {e}")
+        traceback.print_exc()
@@ -0,0 +1,211 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+from discord.ui import View, Button, DynamicItem
+import asyncio
+import re
+import traceback
+from typing import Dict, Optional
+
+from .directory_snapshot import DirectorySnapshot, SERVER_TYPES
+from cog.cryptonel.change_feed import ChangeFeed
+# The bot's shared MongoDB client; server_commands imports this module, so a client here would be a second pool
+from cog.cryptonel.transfer.utils import client
+
+# Define database and collection
+db_staff = client['staff']
+server_collection = db_staff['server_trade_crn']
+
+# Servers shown per page
+PAGE_SIZE = 5
+# Longest search kept in a button's custom_id (Discord allows 100 characters in total)
+MAX_QUERY_LENGTH = 40
+# Seconds to wait for more changes before rebuilding the snapshot
+REBUILD_DELAY_SECONDS = 2
+# How often the snapshot is rebuilt when change streams are not available
+FALLBACK_REBUILD_SECONDS = 600
+
+TYPE_LABELS = {
+    "partner": "🤝 Partner",
+    "service": "🛠️ Service",
+    "server_shop": "🛒 Server Shop"
+}
+
+DIRECTORY_FIELDS = ["server_name", "member_count", "invite_link", "server_type", "icon_url"]
+
+class ServerDirectory:
+    """
+    Serves /servers from an in-memory snapshot of server_trade_crn
+
+    The snapshot is rebuilt in a worker thread and swapped in whole, so
+    readers always see a consistent copy. Rebuilds are triggered by the
+    change feed, by the management commands after their writes (the feed
+    does not report deletes), and every FALLBACK_REBUILD_SECONDS as a
+    safety net. Bursts of changes are collapsed into one rebuild, and a
+    change that arrives while a rebuild is loading triggers another pass.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.snapshot = DirectorySnapshot([])
+        self.feed = ChangeFeed("server directory", collection, DIRECTORY_FIELDS)
+        self.rebuild_task: Optional[asyncio.Task] = None
+        self.dirty = False
+        # Rebuilds run one at a time, so an older load never replaces a newer snapshot
+        self.rebuild_lock = asyncio.Lock()
+
+    def load(self) -> DirectorySnapshot:
+        """Read the whole directory (blocking)"""
+        projection = {"_id": 0, "server_id": 1, **{field: 1 for field in DIRECTORY_FIELDS}}
+        return DirectorySnapshot(list(self.collection.find({}, projection)))
+
+    async def rebuild(self):
+        async with self.rebuild_lock:
+            try:
+                self.snapshot = await asyncio.to_thread(self.load)
+            except Exception as e:
+                print(f"Error rebuilding server directory: {e}")
+                print(traceback.format_exc())
+
+    def mark_stale(self, document: Optional[Dict] = None):
+        """Schedule a rebuild; also used as the change feed subscriber"""
+        self.dirty = True
+        if self.rebuild_task is None or self.rebuild_task.done():
+            self.rebuild_task = asyncio.get_running_loop().create_task(self._delayed_rebuild())
+
+    async def _delayed_rebuild(self):
+        # The flag is cleared before each load, so changes made during the load run another pass
+        while self.dirty:
+            await asyncio.sleep(REBUILD_DELAY_SECONDS)
+            self.dirty = False
+            await self.rebuild()
+
+    async def refresh_loop(self):
+        await self.rebuild()
+        while True:
+            await asyncio.sleep(FALLBACK_REBUILD_SECONDS)
+            await self.rebuild()
+
+# Shared directory, refreshed by the directory cog and the management commands
+server_directory = ServerDirectory(server_collection)
+
+# Function to keep a search usable inside a custom_id
+def clean_query(query: Optional[str]) -> str:
+    return " ".join((query or "").split())[:MAX_QUERY_LENGTH]
+
+# Function to build one page of the directory
+def directory_page(page: int, server_type: str, query: str):
+    results = server_directory.snapshot.search(query, None if server_type == "all" else server_type)
+    pages = max(1, (len(results) + PAGE_SIZE - 1) // PAGE_SIZE)
+    page = min(max(page, 0), pages - 1)
+
+    filters = []
+    if server_type != "all":
+        filters.append(TYPE_LABELS.get(server_type, server_type))
+    if query:
+        filters.append(f"matching “{query}”")
+    embed = discord.Embed(
+        title="🌐 Cryptonel Server Directory",
+        description=(" • ".join(filters) + "\n") if filters else "Partners, services and server shops.\n",
+        color=0x8f92b1
+    )
+    if not results:
+        embed.description += "\nNo servers found."
+
+    for entry in results[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]:
+        member_count = entry.get("member_count")
+        members = f"{member_count:,} members" if isinstance(member_count, int) else "Members unknown"
+        invite_link = entry.get("invite_link") or ""
+        join = f"\n[Join Server]({invite_link})" if invite_link.startswith("https://") else ""
+        embed.add_field(
+            name=(entry.get("server_name") or "Unknown")[:256],
+            value=f"{TYPE_LABELS.get(entry.get('server_type'), 'Unknown')} • {members}{join}",
+            inline=False
+        )
+    embed.set_footer(text=f"Page {page + 1}/{pages} • {len(results)} server(s)")
+
+    view = View(timeout=None)
+    view.add_item(DirectoryPageButton("prev", page - 1, server_type, query, disabled=page == 0))
+    view.add_item(DirectoryPageButton("next", page + 1, server_type, query, disabled=page >= pages - 1))
+    return embed, view
+
+class DirectoryPageButton(
+    DynamicItem[Button],
+    template=r'servers:(?P<direction>prev|next):(?P<page>-?\d{1,4}):(?P<server_type>all|partner|service|server_shop):(?P<query>.{0,40})'
+):
+    def __init__(self, direction: str, page: int, server_type: str, query: str, disabled: bool = False):
+        self.direction = direction
+        self.page = page
+        self.server_type = server_type
+        self.query = query
+        super().__init__(
+            Button(
+                label="◀ Previous" if direction == "prev" else "Next ▶",
+                style=discord.ButtonStyle.secondary,
+                custom_id=f"servers:{direction}:{page}:{server_type}:{query}",
+                disabled=disabled
+            )
+        )
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Button, match: re.Match):
+        return cls(match["direction"], int(match["page"]), match["server_type"], match["query"])
+
+    async def callback(self, interaction: discord.Interaction):
+        try:
+            # Served from the snapshot; paging never queries the database
+            embed, view = directory_page(self.page, self.server_type, self.query)
+            await interaction.response.edit_message(embed=embed, view=view)
+        except Exception as e:
+            print(f"Error paging server directory: {e}")
+            print(traceback.format_exc())
+            if not interaction.response.is_done():
+                await interaction.response.send_message("An error occurred while loading this page. Please try again later.", ephemeral=True)
+
+class DirectoryCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.refresh_task = None
+
+    async def cog_load(self):
+        # Page buttons keep working on old messages and across restarts
+        self.bot.add_dynamic_items(DirectoryPageButton)
+        server_directory.feed.subscribe(server_directory.mark_stale)
+        server_directory.feed.start()
+        self.refresh_task = asyncio.create_task(server_directory.refresh_loop())
+
+    async def cog_unload(self):
+        server_directory.feed.stop()
+        self.bot.remove_dynamic_items(DirectoryPageButton)
+        if self.refresh_task:
+            self.refresh_task.cancel()
+
+    @app_commands.command(name="servers", description="Browse Cryptonel partner, service and shop servers")
+    @app_commands.describe(
+        server_type="Only show one type of server",
+        search="Search server names"
+    )
+    @app_commands.choices(server_type=[
+        app_commands.Choice(name="Partner", value="partner"),
+        app_commands.Choice(name="Service", value="service"),
+        app_commands.Choice(name="Server Shop", value="server_shop")
+    ])
+    async def servers(self, interaction: discord.Interaction, server_type: Optional[str] = None, search: Optional[str] = None):
+        try:
+            embed, view = directory_page(0, server_type if server_type in SERVER_TYPES else "all", clean_query(search))
+            await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+        except Exception as e:
+            print(f"Error in servers command: {e}")
+            print(traceback.format_exc())
+            embed = discord.Embed(
+                title="❌ Error",
+                description="An error occurred while loading the server directory. Please try again later.",
+                color=0x8f92b1
+            )
+            if interaction.response.is_done():
+                await interaction.followup.send(embed=embed, ephemeral=True)
+            else:
+                await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(DirectoryCog(bot))
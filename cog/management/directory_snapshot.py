@@ -0,0 +1,63 @@
+import bisect
+import re
+from typing import Dict, List, Optional, Set
+
+# Server types shown in the public directory
+SERVER_TYPES = ("partner", "service", "server_shop")
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Function to split a server name into lowercase search tokens
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+# Function to sort servers by member count, biggest first
+def member_sort_key(entry: Dict):
+    count = entry.get("member_count")
+    return (-(count if isinstance(count, int) else 0), (entry.get("server_name") or "").lower())
+
+class DirectorySnapshot:
+    """
+    Immutable in-memory copy of the server directory
+
+    Entries are sorted by member count once. An inverted index maps every
+    name token to the positions of the servers containing it, and a sorted
+    token list lets a query word match by prefix ("crypt" finds
+    "Cryptonel"). A search intersects the position sets of every query word
+    and the chosen type, so browsing never touches the database.
+    """
+
+    def __init__(self, records: List[Dict]):
+        self.entries: List[Dict] = sorted(
+            (record for record in records if record.get("server_type") in SERVER_TYPES),
+            key=member_sort_key
+        )
+        self.index: Dict[str, Set[int]] = {}
+        self.by_type: Dict[str, Set[int]] = {server_type: set() for server_type in SERVER_TYPES}
+        for position, entry in enumerate(self.entries):
+            self.by_type[entry["server_type"]].add(position)
+            for token in tokenize(entry.get("server_name")):
+                self.index.setdefault(token, set()).add(position)
+        self.tokens: List[str] = sorted(self.index)
+
+    def _prefix_matches(self, prefix: str) -> Set[int]:
+        matched: Set[int] = set()
+        cursor = bisect.bisect_left(self.tokens, prefix)
+        while cursor < len(self.tokens) and self.tokens[cursor].startswith(prefix):
+            matched |= self.index[self.tokens[cursor]]
+            cursor += 1
+        return matched
+
+    def search(self, query: str = "", server_type: Optional[str] = None) -> List[Dict]:
+        """Servers whose name matches every query word, biggest first"""
+        positions: Optional[Set[int]] = None
+        if server_type in self.by_type:
+            positions = set(self.by_type[server_type])
+        for word in tokenize(query):
+            matched = self._prefix_matches(word)
+            positions = matched if positions is None else positions & matched
+            if not positions:
+                return []
+        if positions is None:
+            return list(self.entries)
+        return [self.entries[position] for position in sorted(positions)]
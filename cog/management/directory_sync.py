@@ -0,0 +1,94 @@
+import asyncio
+import traceback
+from typing import Dict, Set
+
+from pymongo import UpdateOne
+
+# Fields of a tracked server that follow the guild without an owner reload
+SYNCED_FIELDS = ("server_name", "member_count", "icon_url", "banner_url")
+
+# Function to read the directory fields of a guild
+def guild_fields(guild) -> Dict:
+    return {
+        "server_name": guild.name,
+        "member_count": guild.member_count or "Unknown",
+        "icon_url": guild.icon.url if guild.icon else None,
+        "banner_url": guild.banner.url if guild.banner else None
+    }
+
+class DirectorySync:
+    """
+    Keeps tracked servers in server_trade_crn in step with their guilds
+
+    The last stored value of each synced field is kept per tracked server.
+    Guild updates and member joins/leaves only mark a server dirty; flush()
+    runs periodically, diffs the dirty guilds against what is stored and
+    writes just the changed fields in one bulk_write. A busy server's
+    member churn therefore costs one write per flush at most.
+    """
+
+    def __init__(self, bot, collection):
+        self.bot = bot
+        self.collection = collection
+        self.stored: Dict[int, Dict] = {}
+        self.dirty: Set[int] = set()
+
+    async def load(self):
+        if self.collection is None:
+            return
+        projection = {"server_id": 1, **{field: 1 for field in SYNCED_FIELDS}}
+        records = await asyncio.to_thread(lambda: list(self.collection.find({}, projection)))
+        self.stored = {
+            record["server_id"]: {field: record.get(field) for field in SYNCED_FIELDS}
+            for record in records if record.get("server_id") is not None
+        }
+        # Anything that changed while the bot was offline is picked up on the first flush
+        self.dirty = set(self.stored)
+
+    def is_tracked(self, guild_id: int) -> bool:
+        return guild_id in self.stored
+
+    def track(self, server_data: Dict):
+        """Remember what was just written for a server by add or reload"""
+        self.stored[server_data["server_id"]] = {field: server_data.get(field) for field in SYNCED_FIELDS}
+
+    def untrack(self, guild_id: int):
+        self.stored.pop(guild_id, None)
+        self.dirty.discard(guild_id)
+
+    def mark_dirty(self, guild_id: int):
+        if guild_id in self.stored:
+            self.dirty.add(guild_id)
+
+    async def flush(self) -> int:
+        """Write the changed fields of every dirty server; returns how many were updated"""
+        if self.collection is None or not self.dirty:
+            return 0
+        dirty, self.dirty = self.dirty, set()
+
+        operations = []
+        updates = {}
+        for guild_id in dirty:
+            guild = self.bot.get_guild(guild_id)
+            stored = self.stored.get(guild_id)
+            if guild is None or stored is None:
+                continue
+            changes = {field: value for field, value in guild_fields(guild).items() if stored.get(field) != value}
+            if changes:
+                operations.append(UpdateOne({"server_id": guild_id}, {"$set": changes}))
+                updates[guild_id] = changes
+
+        if not operations:
+            return 0
+        try:
+            await asyncio.to_thread(self.collection.bulk_write, operations, ordered=False)
+        except Exception as e:
+            # Retry these servers on the next flush
+            self.dirty.update(updates)
+            print(f"Error syncing server directory: {e}")
+            print(traceback.format_exc())
+            return 0
+        for guild_id, changes in updates.items():
+            if guild_id in self.stored:
+                self.stored[guild_id].update(changes)
+        return len(operations)
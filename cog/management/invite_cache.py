@@ -0,0 +1,107 @@
+import discord
+import re
+import time
+from typing import Dict, Optional, Tuple
+
+# Seconds a checked invite is trusted before it is validated again
+INVITE_TTL_SECONDS = 6 * 3600
+
+INVITE_PATTERN = re.compile(r"(?:https?://)?(?:www\.)?(?:discord\.gg|discord(?:app)?\.com/invite)/([\w-]+)")
+
+# Function to pull the invite code out of a stored invite link
+def invite_code(link: Optional[str]) -> Optional[str]:
+    if not link:
+        return None
+    match = INVITE_PATTERN.search(link)
+    return match.group(1) if match else None
+
+class InviteCache:
+    """
+    Reuses permanent invites instead of creating a new one on every add and reload
+
+    Checks run cheapest first. A stored invite validated within
+    INVITE_TTL_SECONDS is reused without any API call. Otherwise the
+    stored invite is checked with one fetch, and kept as it is if Discord
+    cannot answer (rate limit, outage). If it is gone, one guild.invites()
+    call looks for a permanent invite the bot created earlier. Only if there is none is a new invite created, from the
+    guild's cached invite channel. Deleted invites are dropped through
+    on_invite_delete.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.validated: Dict[int, Tuple[str, float]] = {}
+        self.channels: Dict[int, int] = {}
+
+    async def get_invite_link(self, guild: discord.Guild, stored_link: Optional[str] = None) -> str:
+        code = invite_code(stored_link)
+        cached = self.validated.get(guild.id)
+        if code and cached and cached[0] == code and time.monotonic() - cached[1] < INVITE_TTL_SECONDS:
+            return stored_link
+
+        if code:
+            valid = await self.is_valid(guild, code)
+            if valid:
+                return self.remember(guild, code)
+            if valid is None:
+                # Unknown is not invalid: keep the stored invite and check it again next time
+                return stored_link
+
+        invite = await self.find_bot_invite(guild)
+        if invite is not None:
+            return self.remember(guild, invite.code)
+
+        channel = self.invite_channel(guild)
+        if channel is None:
+            return "Could not generate an invite link (missing permissions)"
+        invite = await channel.create_invite(max_age=0, max_uses=0, unique=False, reason="Server directory invite")
+        return self.remember(guild, invite.code)
+
+    def remember(self, guild: discord.Guild, code: str) -> str:
+        self.validated[guild.id] = (code, time.monotonic())
+        return f"https://discord.gg/{code}"
+
+    def forget(self, guild_id: int, code: Optional[str] = None):
+        cached = self.validated.get(guild_id)
+        if cached and (code is None or cached[0] == code):
+            del self.validated[guild_id]
+
+    async def is_valid(self, guild: discord.Guild, code: str) -> Optional[bool]:
+        """Whether the invite still works; None when Discord could not tell"""
+        try:
+            invite = await self.bot.fetch_invite(code, with_counts=False)
+        except discord.NotFound:
+            return False
+        except discord.HTTPException as e:
+            print(f"Error checking invite {code} for {guild.id}: {e}")
+            return None
+        # Only permanent invites into this same server are worth keeping
+        invite_guild = getattr(invite, "guild", None)
+        return invite_guild is not None and invite_guild.id == guild.id and invite.expires_at is None
+
+    async def find_bot_invite(self, guild: discord.Guild) -> Optional[discord.Invite]:
+        # Listing invites needs Manage Server; without it go straight to creating one
+        if not guild.me.guild_permissions.manage_guild:
+            return None
+        try:
+            invites = await guild.invites()
+        except discord.HTTPException as e:
+            print(f"Error listing invites for {guild.id}: {e}")
+            return None
+        for invite in invites:
+            if invite.inviter and invite.inviter.id == self.bot.user.id and not invite.max_age and not invite.max_uses and not invite.temporary:
+                return invite
+        return None
+
+    def invite_channel(self, guild: discord.Guild) -> Optional[discord.TextChannel]:
+        """The cached invite channel, or the first one the bot can invite from"""
+        channel = guild.get_channel(self.channels.get(guild.id, 0))
+        if channel is not None and channel.permissions_for(guild.me).create_instant_invite:
+            return channel
+        for channel in guild.text_channels:
+            # Check if the bot has permission to create invites in this channel
+            if channel.permissions_for(guild.me).create_instant_invite:
+                self.channels[guild.id] = channel.id
+                return channel
+        self.channels.pop(guild.id, None)
+        return None
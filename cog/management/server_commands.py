@@ -1,12 +1,30 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 import pymongo
+from pymongo import UpdateOne
 import os
 import asyncio
 from dotenv import load_dotenv
 import traceback
 from enum import Enum
+from .invite_cache import InviteCache
+from .directory_sync import DirectorySync, guild_fields
+from .directory_commands import server_directory
+
+# List of owners who can use the management commands
+OWNER_IDS = [
+    964005304943661106,  # Original owner
+    1137470473819656293,  # Added owner
+    217013625066356738    # Added owner
+]
+
+# Servers refreshed at the same time during a reload
+RELOAD_CONCURRENCY = 5
+# Seconds between two progress updates of the reload status message
+RELOAD_PROGRESS_INTERVAL = 2
+# Seconds between two writes of server details picked up from gateway events
+DIRECTORY_FLUSH_SECONDS = 60
 
 class ServerAction(Enum):
     ADD = "add"
@@ -22,11 +40,9 @@ class ServerManagement(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         # List of owners who can use the command
-        self.owner_ids = [
-            964005304943661106,  # Original owner
-            1137470473819656293,  # Added owner
-            217013625066356738    # Added owner
-        ]
+        self.owner_ids = OWNER_IDS
+        # Permanent invites are reused across adds and reloads
+        self.invites = InviteCache(bot)
         
         # Load environment variables
         load_dotenv('clyne.env')
@@ -49,6 +65,32 @@ class ServerManagement(commands.Cog):
             self.mongo_client = None
             self.db = None
             self.server_collection = None
+        
+        # Keeps tracked servers' names, member counts and images current between reloads
+        self.directory = DirectorySync(bot, self.server_collection)
+
+    async def cog_load(self):
+        try:
+            await self.directory.load()
+        except Exception as e:
+            print(f"Error loading tracked servers: {e}")
+            traceback.print_exc()
+        self.directory_task.start()
+
+    async def cog_unload(self):
+        self.directory_task.cancel()
+
+    @tasks.loop(seconds=DIRECTORY_FLUSH_SECONDS)
+    async def directory_task(self):
+        """Writes the changes of tracked servers marked dirty by gateway events"""
+        updated = await self.directory.flush()
+        if updated:
+            server_directory.mark_stale()
+            print(f"Server directory synced: {updated} server(s) updated")
+
+    @directory_task.before_loop
+    async def before_directory_task(self):
+        await self.bot.wait_until_ready()
 
     # Owner-only check
     def is_owner(self, user_id):
@@ -120,8 +162,13 @@ class ServerManagement(commands.Cog):
                 await status_message.edit(content="I couldn't find a server with this ID or I'm not a member of it.")
                 return
                 
+            # Reuse the invite stored by an earlier add, if it still works
+            existing = None
+            if self.server_collection is not None:
+                existing = self.server_collection.find_one({"server_id": guild.id}, {"invite_link": 1})
+            
             # Get server data and save to database
-            server_data = await self.get_server_data(guild)
+            server_data = await self.get_server_data(guild, (existing or {}).get("invite_link"))
             
             # Add server type information
             server_data.update({
@@ -143,6 +190,8 @@ class ServerManagement(commands.Cog):
                         {"$set": server_data},
                         upsert=True
                     )
+                    self.directory.track(server_data)
+                    server_directory.mark_stale()
                     print(f"Server data saved to MongoDB: {server_data}")
                 except Exception as mongo_error:
                     print(f"MongoDB error: {mongo_error}")
@@ -181,6 +230,8 @@ class ServerManagement(commands.Cog):
                 
             # Remove server from database
             self.server_collection.delete_one({"server_id": guild_id})
+            self.directory.untrack(guild_id)
+            server_directory.mark_stale()
             
             # Create embed for confirmation
             embed = discord.Embed(
@@ -208,49 +259,58 @@ class ServerManagement(commands.Cog):
                 return
                 
             # Get all servers from database
-            server_records = list(self.server_collection.find({}))
+            server_records = await asyncio.to_thread(lambda: list(self.server_collection.find({})))
             
             if not server_records:
                 await status_message.edit(content="No servers found in the database.")
                 return
-                
+            
+            # Guilds are refreshed concurrently; discord.py waits out per-route rate limits itself
+            semaphore = asyncio.Semaphore(RELOAD_CONCURRENCY)
+            
+            async def reload_one(server_record):
+                async with semaphore:
+                    return await self.reload_server(server_record)
+            
+            operations = []
+            refreshed = []
             updated_count = 0
+            unchanged_count = 0
             failed_count = 0
+            last_progress = asyncio.get_running_loop().time()
             
-            for server_record in server_records:
-                try:
-                    guild_id = server_record.get("server_id")
-                    guild = self.bot.get_guild(guild_id)
-                    
-                    if guild:
-                        # Get updated server data
-                        server_data = await self.get_server_data(guild)
-                        
-                        # Preserve the server type information
-                        server_data.update({
-                            "partner": server_record.get("partner", False),
-                            "service": server_record.get("service", False),
-                            "server_shop": server_record.get("server_shop", False),
-                            "server_type": server_record.get("server_type", "unknown")
-                        })
-                        
-                        # Update database
-                        self.server_collection.update_one(
-                            {"server_id": guild_id},
-                            {"$set": server_data}
-                        )
-                        updated_count += 1
-                    else:
-                        failed_count += 1
-                        print(f"Could not find guild with ID: {guild_id}")
-                except Exception as e:
+            reload_tasks = [asyncio.create_task(reload_one(server_record)) for server_record in server_records]
+            for done, task in enumerate(asyncio.as_completed(reload_tasks), start=1):
+                status, operation, server_data = await task
+                if status == "updated":
+                    updated_count += 1
+                    operations.append(operation)
+                    refreshed.append(server_data)
+                elif status == "unchanged":
+                    unchanged_count += 1
+                else:
                     failed_count += 1
-                    print(f"Error updating server {server_record.get('server_name', 'Unknown')}: {e}")
+                
+                # Keep progress edits well below the message edit rate limit
+                now = asyncio.get_running_loop().time()
+                if now - last_progress >= RELOAD_PROGRESS_INTERVAL and done < len(reload_tasks):
+                    last_progress = now
+                    await status_message.edit(
+                        content=f"Reloading servers... {done}/{len(reload_tasks)} "
+                                f"({updated_count} changed, {unchanged_count} unchanged, {failed_count} failed)"
+                    )
+            
+            # One round trip for every server that changed
+            if operations:
+                await asyncio.to_thread(self.server_collection.bulk_write, operations, ordered=False)
+                for server_data in refreshed:
+                    self.directory.track(server_data)
+                server_directory.mark_stale()
             
             # Create summary embed
             summary_embed = discord.Embed(
                 title="Server Reload Summary",
-                description=f"Updated {updated_count} servers\nFailed to update {failed_count} servers",
+                description=f"Updated {updated_count} servers\nUnchanged {unchanged_count} servers\nFailed to update {failed_count} servers",
                 color=0x8f92b1
             )
             
@@ -262,46 +322,74 @@ class ServerManagement(commands.Cog):
             traceback.print_exc()
             await status_message.edit(content=f"An error occurred: {str(e)}")
 
-    async def get_server_data(self, guild):
-        """Get all relevant data for a server"""
-        # Create an invite link
+    async def reload_server(self, server_record):
+        """Refresh one stored server; returns its status and the update to write, if any"""
         try:
-            # Find a text channel to create an invite from
-            invite_channel = None
-            for channel in guild.text_channels:
-                # Check if the bot has permission to create invites in this channel
-                if channel.permissions_for(guild.me).create_instant_invite:
-                    invite_channel = channel
-                    break
+            guild_id = server_record.get("server_id")
+            guild = self.bot.get_guild(guild_id)
             
-            if invite_channel is None:
-                invite_link = "Could not generate an invite link (missing permissions)"
-            else:
-                invite = await invite_channel.create_invite(max_age=0, max_uses=0, reason="Server reload")
-                invite_link = str(invite)
+            if guild is None:
+                print(f"Could not find guild with ID: {guild_id}")
+                return "failed", None, None
+            
+            # Get updated server data
+            server_data = await self.get_server_data(guild, server_record.get("invite_link"))
+            
+            # Preserve the server type information
+            server_data.update({
+                "partner": server_record.get("partner", False),
+                "service": server_record.get("service", False),
+                "server_shop": server_record.get("server_shop", False),
+                "server_type": server_record.get("server_type", "unknown")
+            })
+            
+            # Only write the fields that actually changed
+            changes = {
+                key: value for key, value in server_data.items()
+                if key not in server_record or server_record[key] != value
+            }
+            if not changes:
+                return "unchanged", None, server_data
+            return "updated", UpdateOne({"server_id": guild_id}, {"$set": changes}), server_data
+        except Exception as e:
+            print(f"Error updating server {server_record.get('server_name', 'Unknown')}: {e}")
+            return "failed", None, None
+
+    async def get_server_data(self, guild, stored_invite_link=None):
+        """Get all relevant data for a server"""
+        # Reuse a working invite link, creating one only when there is none
+        try:
+            invite_link = await self.invites.get_invite_link(guild, stored_invite_link)
         except Exception as e:
             print(f"Error creating invite: {e}")
             invite_link = f"Could not generate an invite link: {str(e)}"
         
-        # Count members
-        total_members = guild.member_count or "Unknown"
-        
-        # Get server icon URL
-        icon_url = guild.icon.url if guild.icon else None
-        
-        # Get server banner URL if available
-        banner_url = guild.banner.url if guild.banner else None
-        
-        # Return server data
+        # Name, member count, icon and banner
         return {
             "server_id": guild.id,
-            "server_name": guild.name,
-            "member_count": total_members,
-            "invite_link": invite_link,
-            "icon_url": icon_url,
-            "banner_url": banner_url
+            **guild_fields(guild),
+            "invite_link": invite_link
         }
         
+    @commands.Cog.listener()
+    async def on_invite_delete(self, invite):
+        # A deleted invite must be checked again before it is reused
+        if invite.guild is not None:
+            self.invites.forget(invite.guild.id, invite.code)
+
+    @commands.Cog.listener()
+    async def on_guild_update(self, before, after):
+        self.directory.mark_dirty(after.id)
+
+    # Member events only arrive with the members intent
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        self.directory.mark_dirty(member.guild.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.directory.mark_dirty(member.guild.id)
+
     def create_server_embed(self, server_data):
         """Create an embed for server information"""
         embed = discord.Embed(
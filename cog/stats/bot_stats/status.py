@@ -1,9 +1,11 @@
 import discord
 from discord.ext import commands, tasks
+from cog.stats.stats_server.guild_counters import guild_counters
 
 class StatusCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.status_version = None
         self.status_task.start()
 
     def cog_unload(self):
@@ -11,9 +13,15 @@ class StatusCog(commands.Cog):
 
     @tasks.loop(minutes=5)
     async def status_task(self):
-        """Changes the bot's status every 5 minutes."""
+        """Updates the bot's status every 5 minutes, only when the figures changed."""
+        if guild_counters.reconciled_at is None:
+            guild_counters.reconcile(self.bot.guilds)
+        # Nothing to send if no server or member count moved since the last update
+        if guild_counters.version == self.status_version:
+            return
+        self.status_version = guild_counters.version
         await self.bot.change_presence(
-            activity=discord.Game(name="CRN")
+            activity=discord.Game(name=f"CRN | {guild_counters.guilds:,} servers • {guild_counters.users:,} users")
         )
 
     @status_task.before_loop
@@ -22,4 +30,4 @@ class StatusCog(commands.Cog):
         await self.bot.wait_until_ready()
 
 async def setup(bot):
-    await bot.add_cog(StatusCog(bot)) 
\ No newline at end of file
+    await bot.add_cog(StatusCog(bot))
\ No newline at end of file
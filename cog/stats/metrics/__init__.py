@@ -0,0 +1 @@
+# This file makes the metrics directory a Python package 
\ No newline at end of file
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, List, Optional
+
+from .registry import registry
+
+# Seconds between two heartbeats on the event loop
+HEARTBEAT_INTERVAL = 0.25
+
+LOOP_LAG = registry.histogram(
+    "bot_event_loop_lag_seconds", "How late event loop heartbeats ran",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+LOOP_BLOCKS = registry.counter("bot_event_loop_blocks_total", "Times the event loop was blocked past the threshold")
+LOOP_STACKS = registry.counter("bot_event_loop_block_stacks_total", "Stack traces captured for blocked callbacks")
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag and captures what is blocking it
+
+    A heartbeat coroutine sleeps HEARTBEAT_INTERVAL seconds at a time and
+    records how late it woke up. A watchdog thread checks the last heartbeat;
+    when the loop has not come back for block_threshold seconds it grabs the
+    loop thread's stack (sys._current_frames) and the running task, so the
+    pymongo or requests call holding the loop shows up by name. At most one
+    stack is captured every report_interval seconds.
+
+    ASYNCIO_DEBUG=true also turns on asyncio debug mode, which logs every
+    callback slower than SLOW_CALLBACK_SECONDS; it is meant for staging.
+    """
+
+    def __init__(self, block_threshold: float, report_interval: float, history: int = 3600):
+        self.block_threshold = block_threshold
+        self.report_interval = report_interval
+        self.samples = deque(maxlen=history)
+        self.reports = deque(maxlen=20)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self.last_beat = time.monotonic()
+        self.max_lag = 0.0
+        self.blocks = 0
+        self.last_report_at = 0.0
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        self.watchdog: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+
+    def start(self):
+        if self.heartbeat_task is not None:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+
+        if os.getenv('ASYNCIO_DEBUG', 'false').strip().lower() == 'true':
+            self.loop.set_debug(True)
+            self.loop.slow_callback_duration = float(os.getenv('SLOW_CALLBACK_SECONDS', '0.1'))
+            print(f"asyncio debug mode on; logging callbacks slower than {self.loop.slow_callback_duration}s")
+
+        self.stop_event.clear()
+        self.heartbeat_task = self.loop.create_task(self.heartbeat())
+        self.watchdog = threading.Thread(target=self.watch, name="loop-lag-watchdog", daemon=True)
+        self.watchdog.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+
+    async def heartbeat(self):
+        while True:
+            expected = time.monotonic() + HEARTBEAT_INTERVAL
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.last_beat = now
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG.observe(lag)
+
+    def watch(self):
+        """Watchdog thread; runs outside the event loop so it sees the stall as it happens"""
+        blocked_since = None
+        while not self.stop_event.wait(HEARTBEAT_INTERVAL):
+            stalled_for = time.monotonic() - self.last_beat - HEARTBEAT_INTERVAL
+            if stalled_for < self.block_threshold:
+                blocked_since = None
+                continue
+            if blocked_since == self.last_beat:
+                # Same stall, already counted
+                continue
+            blocked_since = self.last_beat
+            self.blocks += 1
+            LOOP_BLOCKS.inc()
+            if time.monotonic() - self.last_report_at >= self.report_interval:
+                self.last_report_at = time.monotonic()
+                self.capture(stalled_for)
+
+    def capture(self, stalled_for: float):
+        try:
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                return
+            stack = "".join(traceback.format_stack(frame))
+            task = asyncio.current_task(self.loop)
+            coroutine = task.get_coro() if task is not None else None
+            report = {
+                "at": time.time(),
+                "stalled_for": round(stalled_for, 3),
+                "task": task.get_name() if task is not None else None,
+                "coroutine": getattr(coroutine, "__qualname__", repr(coroutine)) if coroutine is not None else None,
+                "stack": stack
+            }
+            self.reports.append(report)
+            LOOP_STACKS.inc()
+            print(f"Event loop blocked for {report['stalled_for']}s in {report['coroutine'] or 'a callback'} ({report['task']}):")
+            print(stack)
+        except Exception as e:
+            print(f"Error capturing blocked event loop stack: {e}")
+
+    def percentile(self, fraction: float) -> float:
+        samples = sorted(self.samples)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def summary(self) -> Dict:
+        """Lag figures over the recent samples, plus the worst case since the last summary"""
+        result = {
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "max": self.max_lag,
+            "blocks": self.blocks,
+            "reports": len(self.reports)
+        }
+        self.max_lag = 0.0
+        return result
+
+    def recent_reports(self) -> List[Dict]:
+        return list(self.reports)
+
+# Shared monitor started by the metrics cog
+loop_monitor = LoopLagMonitor(
+    block_threshold=float(os.getenv('LOOP_BLOCK_THRESHOLD_SECONDS', '0.5')),
+    report_interval=float(os.getenv('LOOP_BLOCK_REPORT_INTERVAL_SECONDS', '60'))
+)
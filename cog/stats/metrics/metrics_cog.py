@@ -0,0 +1,135 @@
+import discord
+from discord.ext import commands, tasks
+from discord import app_commands
+import os
+import math
+import traceback
+from typing import Optional
+
+from .registry import registry, current_interaction, InteractionQueries, INTERACTIONS, INTERACTION_LATENCY
+from .server import MetricsServer
+from .loop_monitor import loop_monitor
+from .tracing import stop_trace_listener
+from .mongo_listener import mongo_listener, MONGO_SLOW_MS
+from cog.management.server_commands import OWNER_IDS
+from cog.stats.stats_server.guild_counters import guild_counters
+
+# Gauges sampled from the gateway connection
+GATEWAY_LATENCY = registry.gauge("bot_gateway_latency_seconds", "Heartbeat latency of the Discord gateway")
+GUILDS = registry.gauge("bot_guilds", "Servers the bot is in")
+USERS = registry.gauge("bot_users", "Members across all servers the bot is in")
+
+class MetricsCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.server = None
+
+    async def cog_load(self):
+        # METRICS_PORT=0 turns the endpoint off
+        port = int(os.getenv('METRICS_PORT', '9108'))
+        if port:
+            try:
+                self.server = MetricsServer(os.getenv('METRICS_HOST', '127.0.0.1'), port)
+                await self.server.start()
+            except Exception as e:
+                print(f"Error starting metrics endpoint: {e}")
+                print(traceback.format_exc())
+                self.server = None
+        loop_monitor.start()
+        self.gateway_task.start()
+        # Every slash command gets its own MongoDB query counter for N+1 detection
+        self.bot.tree.interaction_check = self.count_command_queries
+
+    async def cog_unload(self):
+        if vars(self.bot.tree).get("interaction_check") == self.count_command_queries:
+            del self.bot.tree.interaction_check
+        self.gateway_task.cancel()
+        loop_monitor.stop()
+        stop_trace_listener()
+        if self.server is not None:
+            await self.server.stop()
+
+    @tasks.loop(seconds=15)
+    async def gateway_task(self):
+        """Sample gateway latency and server counts on the event loop"""
+        if not math.isnan(self.bot.latency) and not math.isinf(self.bot.latency):
+            GATEWAY_LATENCY.set(self.bot.latency)
+        # Totals kept current by the server stats cog from gateway events, no per-guild scan
+        if guild_counters.reconciled_at is not None:
+            GUILDS.set(guild_counters.guilds)
+            USERS.set(guild_counters.users)
+
+    @gateway_task.before_loop
+    async def before_gateway_task(self):
+        await self.bot.wait_until_ready()
+
+    async def count_command_queries(self, interaction: discord.Interaction) -> bool:
+        # The tree awaits this in the task that then runs the command, so the counter covers it
+        name = interaction.command.qualified_name if interaction.command else "unknown"
+        current_interaction.set(InteractionQueries(f"command {name}"))
+        return True
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        if interaction.type == discord.InteractionType.application_command and interaction.data:
+            INTERACTIONS.inc(kind="command", name=interaction.data.get("name", "unknown"))
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, interaction: discord.Interaction, command: app_commands.Command):
+        # Measured from when Discord created the interaction, so gateway delay is included
+        elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        INTERACTION_LATENCY.observe(max(elapsed, 0.0), kind="command", name=command.qualified_name.split(" ")[0])
+
+    # Owner-only check
+    def is_owner(self, user_id):
+        return user_id in OWNER_IDS
+
+    @app_commands.command(name="mongoreport", description="Show the slowest MongoDB query shapes")
+    @app_commands.describe(
+        limit="Number of query shapes to show",
+        sort="Rank by total, max or average time",
+        reset="Clear the collected statistics after showing them"
+    )
+    @app_commands.choices(sort=[
+        app_commands.Choice(name="Total time", value="total"),
+        app_commands.Choice(name="Slowest call", value="max"),
+        app_commands.Choice(name="Average time", value="avg")
+    ])
+    async def mongoreport(
+        self,
+        interaction: discord.Interaction,
+        limit: Optional[app_commands.Range[int, 1, 25]] = 10,
+        sort: Optional[str] = "total",
+        reset: bool = False
+    ):
+        # Check if the user is an owner
+        if not self.is_owner(interaction.user.id):
+            await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+            return
+
+        top = mongo_listener.top(limit, sort)
+        if reset:
+            mongo_listener.reset()
+
+        embed = discord.Embed(
+            title="🐢 Slowest MongoDB Queries",
+            description=f"Ranked by {sort} time. Slow threshold: {MONGO_SLOW_MS:.0f}ms." if top else "No MongoDB commands recorded yet.",
+            color=0x8f92b1
+        )
+        for (collection, command, shape), stats in top:
+            average = stats.total_seconds / stats.count * 1000 if stats.count else 0.0
+            embed.add_field(
+                name=f"{collection}.{command}"[:256],
+                value=(
+                    f"`{shape[:200]}`\n"
+                    f"{stats.count} calls • total {stats.total_seconds:.2f}s • avg {average:.1f}ms • max {stats.max_seconds * 1000:.1f}ms\n"
+                    f"{stats.documents} docs • {stats.bytes / 1024:.1f} KB • {stats.slow} slow • {stats.n_plus_one} N+1"
+                )[:1024],
+                inline=False
+            )
+        if reset:
+            embed.set_footer(text="Statistics have been reset.")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(MetricsCog(bot))
@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import bson
+from pymongo import monitoring
+
+from .registry import registry, current_interaction, MONGO_COMMANDS, MONGO_LATENCY
+from .tracing import current_trace, record_mongo_span
+
+# Commands slower than this are counted and logged as slow
+MONGO_SLOW_MS = float(os.getenv('MONGO_SLOW_MS', '100'))
+# The same query shape running this often in one traced interaction is reported as N+1
+MONGO_N_PLUS_ONE_THRESHOLD = int(os.getenv('MONGO_N_PLUS_ONE_THRESHOLD', '2'))
+# Seconds between two slow-command log lines for the same shape
+SLOW_LOG_INTERVAL = 60
+
+# Commands whose reply carries documents; only these are measured in bytes.
+# pymongo does not expose the reply's wire size, so each batch is estimated
+# from its first document instead of encoding every document again.
+DOCUMENT_COMMANDS = {"find", "getMore", "aggregate", "findAndModify"}
+MAX_SHAPE_LENGTH = 200
+
+MONGO_QUERY_LATENCY = registry.histogram(
+    "bot_mongo_query_seconds", "MongoDB command round-trip time per query shape", ("collection", "command", "shape")
+)
+MONGO_DOCUMENTS = registry.counter("bot_mongo_documents_total", "Documents returned or affected by MongoDB commands", ("collection", "command"))
+MONGO_REPLY_BYTES = registry.counter("bot_mongo_reply_bytes_total", "Estimated bytes of documents returned by MongoDB commands", ("collection", "command"))
+MONGO_SLOW = registry.counter("bot_mongo_slow_commands_total", "MongoDB commands slower than MONGO_SLOW_MS", ("collection", "command"))
+MONGO_N_PLUS_ONE = registry.counter("bot_mongo_n_plus_one_total", "Query shapes repeated within one traced interaction", ("collection", "command"))
+
+# Function to reduce a filter to its shape: field names and operators, no values
+def shape_of(value) -> str:
+    if isinstance(value, dict):
+        return "{" + ",".join(f"{key}:{shape_of(value[key])}" for key in sorted(value)) + "}"
+    if isinstance(value, (list, tuple)):
+        # $in/$or lists collapse to the shape of their first element
+        return "[" + (shape_of(value[0]) if value and isinstance(value[0], (dict, list, tuple)) else "?") + "]"
+    return "?"
+
+# Function to find the part of a command that describes which documents it touches
+def query_shape(command_name: str, command: Dict) -> str:
+    if command_name in ("find", "count", "distinct"):
+        shape = shape_of(command.get("filter", command.get("query", {})))
+    elif command_name == "findAndModify":
+        shape = shape_of(command.get("query", {}))
+    elif command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        shape = shape_of(statements[0].get("q", {}))
+        if len(statements) > 1:
+            shape += f" x{len(statements)}"
+    elif command_name == "aggregate":
+        stages = command.get("pipeline") or []
+        match = next((stage["$match"] for stage in stages if "$match" in stage), None)
+        shape = "|".join(next(iter(stage)) for stage in stages if stage)
+        if match is not None:
+            shape += " " + shape_of(match)
+    elif command_name == "insert":
+        shape = f"x{len(command.get('documents') or [])}"
+    else:
+        shape = "-"
+    return shape[:MAX_SHAPE_LENGTH]
+
+# Function to count the documents a reply returned or affected
+def reply_documents(command_name: str, reply: Dict) -> Tuple[int, Optional[List]]:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch", cursor.get("nextBatch")) or []
+        return len(batch), batch
+    if command_name == "findAndModify":
+        value = reply.get("value")
+        return (1, [value]) if value else (0, None)
+    return int(reply.get("n", 0) or 0), None
+
+class ShapeStats:
+    """Running totals for one (collection, command, shape)"""
+
+    __slots__ = ("count", "total_seconds", "max_seconds", "documents", "bytes", "slow", "n_plus_one", "last_logged")
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.documents = 0
+        self.bytes = 0
+        self.slow = 0
+        self.n_plus_one = 0
+        self.last_logged = 0.0
+
+class MetricsCommandListener(monitoring.CommandListener):
+    """
+    Counts and times every MongoDB command per collection and query shape
+
+    The collection and shape are only known from the started event, so they
+    are kept by request id until the matching succeeded or failed event
+    arrives. Events fire on the thread that issued the command, which is
+    also how commands are attributed to the interaction that sent them for
+    N+1 detection. That works for every interaction; when the interaction
+    is also traced, the finding is added to its trace.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending: Dict[Tuple[str, int], Tuple[str, str]] = {}
+        self.shapes: Dict[Tuple[str, str, str], ShapeStats] = {}
+
+    def started(self, event):
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        else:
+            collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            # Database-level commands like ping or listCollections
+            collection = event.database_name
+        shape = query_shape(event.command_name, event.command)
+        with self.lock:
+            self.pending[(str(event.connection_id), event.request_id)] = (collection, shape)
+
+    def _finish(self, event, outcome: str, reply: Optional[Dict] = None):
+        with self.lock:
+            collection, shape = self.pending.pop((str(event.connection_id), event.request_id), ("unknown", "-"))
+        command = event.command_name
+        seconds = event.duration_micros / 1_000_000
+        MONGO_COMMANDS.inc(collection=collection, command=command, outcome=outcome)
+        MONGO_LATENCY.observe(seconds, collection=collection, command=command)
+        MONGO_QUERY_LATENCY.observe(seconds, collection=collection, command=command, shape=shape)
+        # Runs on the thread that issued the command, so the caller's trace is visible here
+        record_mongo_span(collection, command, seconds)
+
+        documents, size = 0, 0
+        if reply is not None:
+            documents, batch = reply_documents(command, reply)
+            if command in DOCUMENT_COMMANDS and batch and isinstance(batch[0], dict):
+                size = len(bson.encode(batch[0])) * len(batch)
+            MONGO_DOCUMENTS.inc(documents, collection=collection, command=command)
+            if size:
+                MONGO_REPLY_BYTES.inc(size, collection=collection, command=command)
+
+        slow = seconds * 1000 >= MONGO_SLOW_MS
+        log_slow = False
+        key = (collection, command, shape)
+        with self.lock:
+            stats = self.shapes.get(key)
+            if stats is None:
+                stats = self.shapes[key] = ShapeStats()
+            stats.count += 1
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.documents += documents
+            stats.bytes += size
+            if slow:
+                stats.slow += 1
+                now = time.monotonic()
+                if now - stats.last_logged >= SLOW_LOG_INTERVAL:
+                    stats.last_logged = now
+                    log_slow = True
+
+        if slow:
+            MONGO_SLOW.inc(collection=collection, command=command)
+            if log_slow:
+                trace = current_trace.get()
+                where = f" in trace {trace.trace_id} ({trace.name})" if trace is not None else ""
+                print(f"Slow MongoDB {command} on {collection} {shape}: {seconds * 1000:.1f}ms{where}")
+
+        self.check_n_plus_one(key, stats)
+
+    def check_n_plus_one(self, key: Tuple[str, str, str], stats: ShapeStats):
+        queries = current_interaction.get()
+        if queries is None or MONGO_N_PLUS_ONE_THRESHOLD <= 0:
+            return
+        # to_thread workers of the same interaction share its counter
+        with self.lock:
+            count = queries.counts.get(key, 0) + 1
+            queries.counts[key] = count
+            if count != MONGO_N_PLUS_ONE_THRESHOLD:
+                return
+            # Reported once per interaction and shape, when the threshold is first reached
+            stats.n_plus_one += 1
+        collection, command, shape = key
+        MONGO_N_PLUS_ONE.inc(collection=collection, command=command)
+        trace = current_trace.get()
+        where = ""
+        if trace is not None:
+            trace.attrs.setdefault("n_plus_one", []).append(f"{collection}.{command} {shape}")
+            where = f" (trace {trace.trace_id})"
+        print(f"Possible N+1 in {queries.name}{where}: {command} on {collection} {shape} ran {count}+ times")
+
+    def succeeded(self, event):
+        self._finish(event, "success", event.reply)
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+    def top(self, limit: int = 10, sort: str = "total") -> List[Tuple[Tuple[str, str, str], ShapeStats]]:
+        """The query shapes with the highest total, max or average time"""
+        sort_keys = {
+            "total": lambda item: item[1].total_seconds,
+            "max": lambda item: item[1].max_seconds,
+            "avg": lambda item: item[1].total_seconds / item[1].count if item[1].count else 0.0
+        }
+        with self.lock:
+            items = list(self.shapes.items())
+        return sorted(items, key=sort_keys.get(sort, sort_keys["total"]), reverse=True)[:limit]
+
+    def reset(self):
+        with self.lock:
+            self.shapes.clear()
+
+# Shared listener, registered for every client created after install_mongo_listener
+mongo_listener = MetricsCommandListener()
+
+# Function to install the listener; must run before any MongoClient is created
+def install_mongo_listener():
+    monitoring.register(mongo_listener)
@@ -0,0 +1,241 @@
+import bisect
+import contextlib
+import contextvars
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Default histogram buckets in seconds, from 1ms to 30s
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Function to escape a label value for the Prometheus text format
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+# Function to format labels as {name="value",...}
+def format_labels(names: Sequence[str], values: Sequence, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+# Function to format a sample value
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+class Metric:
+    """Base class for metrics; values are keyed by their label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str], lock: threading.Lock):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.lock = lock
+        self.values: Dict[Tuple, object] = {}
+
+    def key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            samples = list(self.values.items())
+        for key, value in sorted(samples):
+            lines.append(f"{self.name}{format_labels(self.label_names, key)} {format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str], lock: threading.Lock, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # Per-bucket counts, then sum and count
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            samples = [(key, (list(state[0]), state[1], state[2])) for key, state in self.values.items()]
+        for key, (counts, total, count) in sorted(samples):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = "+Inf" if math.isinf(bound) else repr(bound)
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, key)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, key)} {count}")
+        return lines
+
+# A collector returns (name, kind, documentation, [(labels, value), ...]) when scraped
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict, float]]]]]
+
+class Registry:
+    """
+    Process-wide metrics registry rendered in the Prometheus text format
+
+    Metrics are updated from the event loop and from worker threads (the
+    MongoDB listener runs on pymongo's threads), so every update takes a
+    short lock. Collectors are called at scrape time for values that are
+    cheaper to read than to track, like cache hit counts or gateway latency.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: Dict[str, Collector] = {}
+        self.caches: Dict[str, object] = {}
+        self.collectors["caches"] = self._collect_caches
+
+    def _get_or_create(self, cls, name: str, documentation: str, labels: Sequence[str], **kwargs) -> Metric:
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, documentation, labels, threading.Lock(), **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labels)
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labels, buckets=buckets)
+
+    def add_collector(self, key: str, collector: Collector):
+        """Register (or replace) a collector under a key"""
+        with self.lock:
+            self.collectors[key] = collector
+
+    def register_cache(self, cache_name: str, cache):
+        """Export the hits and misses attributes of a cache"""
+        with self.lock:
+            self.caches[cache_name] = cache
+
+    def _collect_caches(self):
+        with self.lock:
+            caches = list(self.caches.items())
+        yield ("bot_cache_hits_total", "counter", "Cache lookups served from memory",
+               [({"cache": name}, getattr(cache, "hits", 0)) for name, cache in caches])
+        yield ("bot_cache_misses_total", "counter", "Cache lookups that had to load data",
+               [({"cache": name}, getattr(cache, "misses", 0)) for name, cache in caches])
+
+    def render(self) -> str:
+        """Render every metric and collector (blocking; call from a worker thread)"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+            collectors = list(self.collectors.items())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for key, collector in collectors:
+            try:
+                for name, kind, documentation, samples in collector():
+                    lines.append(f"# HELP {name} {documentation}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for labels, value in samples:
+                        lines.append(f"{name}{format_labels(list(labels), list(labels.values()))} {format_value(value)}")
+            except Exception as e:
+                print(f"Error in metrics collector '{key}': {e}")
+        return "\n".join(lines) + "\n"
+
+# Shared registry for the whole bot
+registry = Registry()
+
+# Interactions (slash commands and dropdown options)
+INTERACTIONS = registry.counter("bot_interactions_total", "Slash commands and dropdown options invoked", ("kind", "name"))
+INTERACTION_LATENCY = registry.histogram("bot_interaction_latency_seconds", "Time to handle a slash command or dropdown option", ("kind", "name"))
+INTERACTION_ERRORS = registry.counter("bot_interaction_errors_total", "Slash commands and dropdown options that raised", ("kind", "name"))
+
+# MongoDB commands, recorded by the command listener
+MONGO_COMMANDS = registry.counter("bot_mongo_commands_total", "MongoDB commands sent", ("collection", "command", "outcome"))
+MONGO_LATENCY = registry.histogram("bot_mongo_command_seconds", "MongoDB command round-trip time", ("collection", "command"))
+
+# Rate limiting and background work
+RATE_LIMIT_REJECTIONS = registry.counter("bot_rate_limit_rejections_total", "Requests rejected by a rate limiter", ("limiter",))
+EMAIL_QUEUE_DEPTH = registry.gauge("bot_email_queue_depth", "Notification emails waiting to be sent or in flight")
+
+class InteractionQueries:
+    """MongoDB commands sent while handling one interaction, for N+1 detection"""
+
+    def __init__(self, name: str):
+        self.name = name
+        # (collection, command, shape) -> commands sent
+        self.counts: Dict[Tuple[str, str, str], int] = {}
+
+# The interaction being handled, traced or not; copied into asyncio.to_thread workers too
+current_interaction: contextvars.ContextVar[Optional[InteractionQueries]] = contextvars.ContextVar("current_interaction", default=None)
+
+# Context manager counting the MongoDB commands of an interaction; nested uses keep the outer count
+@contextlib.contextmanager
+def count_queries(name: str):
+    if current_interaction.get() is not None:
+        yield
+        return
+    token = current_interaction.set(InteractionQueries(name))
+    try:
+        yield
+    finally:
+        current_interaction.reset(token)
+
+# Context manager timing a dropdown option
+@contextlib.contextmanager
+def track_interaction(kind: str, name: str):
+    INTERACTIONS.inc(kind=kind, name=name)
+    start = time.perf_counter()
+    try:
+        with count_queries(f"{kind} {name}"):
+            yield
+    except Exception:
+        INTERACTION_ERRORS.inc(kind=kind, name=name)
+        raise
+    finally:
+        INTERACTION_LATENCY.observe(time.perf_counter() - start, kind=kind, name=name)
@@ -0,0 +1,61 @@
+import asyncio
+import traceback
+from typing import Optional
+
+from .registry import registry
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class MetricsServer:
+    """
+    Minimal HTTP server exposing the registry at /metrics
+
+    Rendering walks every metric under its lock, so it runs in a worker
+    thread and a scrape never blocks the event loop.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        print(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Drain the headers; the request has no body
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?", 1)[0] if len(parts) >= 2 else ""
+            if len(parts) >= 2 and parts[0] == "GET" and path == "/metrics":
+                body = (await asyncio.to_thread(registry.render)).encode("utf-8")
+                status, content_type = "200 OK", CONTENT_TYPE
+            else:
+                body = b"Not Found\n"
+                status, content_type = "404 Not Found", "text/plain; charset=utf-8"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except asyncio.TimeoutError:
+            pass
+        except Exception as e:
+            print(f"Error serving metrics: {e}")
+            print(traceback.format_exc())
+        finally:
+            writer.close()
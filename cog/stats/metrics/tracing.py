@@ -0,0 +1,212 @@
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+# Fraction of interactions that get a trace; 0 (the default) turns tracing off entirely
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+TRACE_FILE_MAX_BYTES = int(os.getenv('TRACE_FILE_MAX_BYTES', str(10 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv('TRACE_FILE_BACKUPS', '5'))
+TRACING_ENABLED = TRACE_SAMPLE_RATE > 0
+
+# The trace and span of the running task; copied into asyncio.to_thread workers too
+current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("current_trace", default=None)
+current_span_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("current_span_id", default=None)
+
+class Trace:
+    """All spans recorded for one sampled interaction"""
+
+    def __init__(self, name: str, attrs: Dict):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.ids = itertools.count(1)
+
+    def add_span(self, name: str, parent: Optional[int], start: float, end: float, attrs: Optional[Dict] = None, span_id: Optional[int] = None):
+        # list.append is atomic, so spans from worker threads need no lock
+        self.spans.append({
+            "id": span_id or next(self.ids),
+            "parent": parent,
+            "name": name,
+            "offset_ms": round((start - self.start) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+            **({"attrs": attrs} if attrs else {})
+        })
+
+class NoopSpan:
+    """Returned when no trace is active, so untraced code pays for one ContextVar lookup"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+NOOP_SPAN = NoopSpan()
+
+class Span:
+    def __init__(self, trace: Trace, name: str, attrs: Dict):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(trace.ids)
+
+    def __enter__(self):
+        self.parent = current_span_id.get()
+        self.token = current_span_id.set(self.span_id)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        current_span_id.reset(self.token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.trace.add_span(self.name, self.parent, self.start, end, self.attrs, self.span_id)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+class RootSpan:
+    """Starts a trace for an interaction and exports it when the handler returns"""
+
+    def __init__(self, name: str, interaction, attrs: Dict):
+        self.name = name
+        self.interaction = interaction
+        self.attrs = attrs
+
+    def __enter__(self):
+        if self.interaction is not None:
+            self.attrs.update({
+                "interaction_id": str(self.interaction.id),
+                "user_id": str(self.interaction.user.id),
+                "guild_id": str(self.interaction.guild_id) if self.interaction.guild_id else None
+            })
+        self.trace = Trace(self.name, self.attrs)
+        if self.interaction is not None:
+            # Time between Discord creating the interaction and the handler starting
+            queued = max(0.0, self.trace.started_at - self.interaction.created_at.timestamp())
+            self.trace.add_span("gateway", None, self.trace.start - queued, self.trace.start)
+        self.trace_token = current_trace.set(self.trace)
+        self.span_token = current_span_id.set(None)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.trace.start
+        current_trace.reset(self.trace_token)
+        current_span_id.reset(self.span_token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        export_trace(self.trace, duration)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+# Function to start a sampled trace, or a child span when one is already running
+def start_trace(name: str, interaction=None, **attrs):
+    if not TRACING_ENABLED:
+        return NOOP_SPAN
+    if current_trace.get() is not None:
+        return span(name, **attrs)
+    if random.random() >= TRACE_SAMPLE_RATE:
+        return NOOP_SPAN
+    return RootSpan(name, interaction, attrs)
+
+# Function to time a block inside the current trace
+def span(name: str, **attrs):
+    trace = current_trace.get()
+    if trace is None:
+        return NOOP_SPAN
+    return Span(trace, name, attrs)
+
+# Decorator wrapping a coroutine function in a span; a no-op when tracing is off
+def traced(name: str):
+    def decorator(func):
+        if not TRACING_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Function to record a MongoDB command that just finished, from the command listener
+def record_mongo_span(collection: str, command: str, duration_seconds: float):
+    trace = current_trace.get()
+    if trace is None:
+        return
+    end = time.perf_counter()
+    trace.add_span(f"mongo {collection}.{command}", current_span_id.get(), end - duration_seconds, end)
+
+# Traces are written by a queue listener thread, so the event loop never touches the file
+trace_logger = logging.getLogger("cryptonel.traces")
+trace_logger.propagate = False
+trace_listener: Optional[logging.handlers.QueueListener] = None
+trace_queue_handler: Optional[logging.handlers.QueueHandler] = None
+trace_listener_lock = threading.Lock()
+
+# Function to set up the rotating JSONL file on first use
+def ensure_trace_listener():
+    global trace_listener, trace_queue_handler
+    with trace_listener_lock:
+        if trace_listener is not None:
+            return
+        file_handler = logging.handlers.RotatingFileHandler(
+            TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS, encoding="utf-8"
+        )
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_queue = queue.SimpleQueue()
+        trace_queue_handler = logging.handlers.QueueHandler(trace_queue)
+        trace_logger.addHandler(trace_queue_handler)
+        trace_logger.setLevel(logging.INFO)
+        trace_listener = logging.handlers.QueueListener(trace_queue, file_handler)
+        trace_listener.start()
+
+# Function to flush and close the trace file; the next trace sets everything up again
+def stop_trace_listener():
+    global trace_listener, trace_queue_handler
+    with trace_listener_lock:
+        # The handler goes first, or a reload would add a second one and write every span twice
+        if trace_queue_handler is not None:
+            trace_logger.removeHandler(trace_queue_handler)
+            trace_queue_handler = None
+        if trace_listener is not None:
+            trace_listener.stop()
+            for handler in trace_listener.handlers:
+                handler.close()
+            trace_listener = None
+
+# Function to write one finished trace as a JSON line
+def export_trace(trace: Trace, duration: float):
+    try:
+        ensure_trace_listener()
+        trace_logger.info(json.dumps({
+            "trace_id": trace.trace_id,
+            "name": trace.name,
+            "started_at": trace.started_at,
+            "duration_ms": round(duration * 1000, 3),
+            "attrs": trace.attrs,
+            "spans": sorted(trace.spans, key=lambda item: item["offset_ms"])
+        }, default=str))
+    except Exception as e:
+        print(f"Error exporting trace {trace.trace_id}: {e}")
@@ -0,0 +1,121 @@
+import datetime
+import time
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+# Raw samples kept per series (every 5 minutes for 2 days)
+RAW_POINTS = 576
+# Hourly points kept after downsampling (a year)
+HOURLY_POINTS = 8760
+
+class GuildCounters:
+    """
+    Server and member totals kept up to date from gateway events
+
+    Each guild's last known member count is remembered, so leaving a server
+    subtracts exactly what it added. Member join/remove events need the
+    members intent; without it the totals only move on guild events and the
+    periodic reconcile catches up. version changes whenever a total does,
+    which lets readers skip work when nothing moved.
+    """
+
+    def __init__(self):
+        self.members: Dict[int, int] = {}
+        self.users = 0
+        self.version = 0
+        self.reconciled_at: Optional[float] = None
+
+    @property
+    def guilds(self) -> int:
+        return len(self.members)
+
+    def _set(self, guild_id: int, member_count: int):
+        previous = self.members.get(guild_id)
+        if previous == member_count:
+            return
+        self.members[guild_id] = member_count
+        self.users += member_count - (previous or 0)
+        self.version += 1
+
+    def guild_joined(self, guild):
+        self._set(guild.id, guild.member_count or 0)
+
+    def guild_removed(self, guild):
+        previous = self.members.pop(guild.id, None)
+        if previous is not None:
+            self.users -= previous
+            self.version += 1
+
+    def member_joined(self, guild):
+        self._set(guild.id, self.members.get(guild.id, 0) + 1)
+
+    def member_removed(self, guild):
+        self._set(guild.id, max(0, self.members.get(guild.id, 0) - 1))
+
+    def reconcile(self, guilds: Iterable) -> int:
+        """Full recount from the guild cache; returns how far the user total had drifted"""
+        members = {guild.id: guild.member_count or 0 for guild in guilds}
+        users = sum(members.values())
+        drift = users - self.users
+        if members != self.members:
+            self.members = members
+            self.users = users
+            self.version += 1
+        self.reconciled_at = time.monotonic()
+        return drift
+
+class StatsSeries:
+    """
+    Server and user totals over time, stored as ring buffers in MongoDB
+
+    Samples go into the "raw" document with $push/$slice, so it never holds
+    more than RAW_POINTS entries. Each finished hour is downsampled to one
+    point (min/max/average users) and pushed to the "hourly" document the
+    same way.
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection
+        self.hour: Optional[datetime.datetime] = None
+        self.hour_samples: List[Dict] = []
+
+    def add(self, guilds: int, users: int, timestamp: Optional[datetime.datetime] = None) -> List[UpdateOne]:
+        """Record a sample; returns the MongoDB writes to persist it"""
+        timestamp = timestamp or datetime.datetime.now(datetime.timezone.utc)
+        point = {"t": timestamp, "guilds": guilds, "users": users}
+        operations = [UpdateOne(
+            {"_id": "raw"},
+            {"$push": {"points": {"$each": [point], "$slice": -RAW_POINTS}}},
+            upsert=True
+        )]
+
+        hour = timestamp.replace(minute=0, second=0, microsecond=0)
+        if self.hour is not None and hour != self.hour and self.hour_samples:
+            operations.append(UpdateOne(
+                {"_id": "hourly"},
+                {"$push": {"points": {"$each": [self.downsample()], "$slice": -HOURLY_POINTS}}},
+                upsert=True
+            ))
+            self.hour_samples = []
+        self.hour = hour
+        self.hour_samples.append(point)
+        return operations
+
+    def downsample(self) -> Dict:
+        users = [sample["users"] for sample in self.hour_samples]
+        return {
+            "t": self.hour,
+            "guilds": self.hour_samples[-1]["guilds"],
+            "users_min": min(users),
+            "users_max": max(users),
+            "users_avg": round(sum(users) / len(users), 1)
+        }
+
+    def persist(self, operations: List[UpdateOne]):
+        """Write the sample (blocking)"""
+        if self.collection is not None and operations:
+            self.collection.bulk_write(operations, ordered=True)
+
+# Shared counters, maintained by the server stats cog and read by the status cog
+guild_counters = GuildCounters()
@@ -1,68 +1,124 @@
 import discord
 from discord.ext import commands, tasks
 import datetime
+import pymongo
+import os
+import asyncio
+import traceback
+from dotenv import load_dotenv
+from cog.stats.metrics.loop_monitor import loop_monitor
+from .guild_counters import guild_counters, StatsSeries
+
+# Hours between two full recounts of the server and member totals
+RECONCILE_HOURS = 6
 
 class ServerStatsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+
+        # Load environment variables
+        load_dotenv('clyne.env')
+
+        # The time series is only persisted when MongoDB is configured
+        collection = None
+        mongodb_uri = os.getenv('MONGODB_URI')
+        if mongodb_uri:
+            try:
+                self.mongo_client = pymongo.MongoClient(mongodb_uri)
+                collection = self.mongo_client.get_database("staff")["bot_stats_series"]
+            except Exception as e:
+                print(f"Error connecting to MongoDB for server stats: {e}")
+        self.series = StatsSeries(collection)
+
         self.stats_task.start()
+        self.sample_task.start()
+        self.reconcile_task.start()
 
     def cog_unload(self):
         self.stats_task.cancel()
+        self.sample_task.cancel()
+        self.reconcile_task.cancel()
 
     @tasks.loop(hours=1)
     async def stats_task(self):
         """Prints server statistics to the terminal every hour"""
-        # Get current time for logging
-        current_time = datetime.datetime.now().strftime("%m-%d %H:%M:%S")
-        
-        # Get statistics
-        server_count = len(self.bot.guilds)
-        user_count = sum(guild.member_count for guild in self.bot.guilds)
-        
-        # Print statistics
-        print(f"{current_time} ==================================================")
-        print(f"{current_time} Logged in as: {self.bot.user.name} (ID: {self.bot.user.id})")
-        print(f"{current_time} Connected to {server_count} servers with {user_count} users")
-        print(f"{current_time} All commands and features are disabled")
-        print(f"{current_time} ==================================================")
-
-    @tasks.loop(hours=1)
-    async def first_run(self):
-        """Run once then cancel itself"""
         await self.print_stats()
-        self.first_run.cancel()
+
+    @tasks.loop(minutes=5)
+    async def sample_task(self):
+        """Adds the current totals to the stats time series"""
+        if guild_counters.reconciled_at is None:
+            guild_counters.reconcile(self.bot.guilds)
+        try:
+            operations = self.series.add(guild_counters.guilds, guild_counters.users)
+            await asyncio.to_thread(self.series.persist, operations)
+        except Exception as e:
+            print(f"Error saving server stats sample: {e}")
+            print(traceback.format_exc())
+
+    @tasks.loop(hours=RECONCILE_HOURS)
+    async def reconcile_task(self):
+        """Recounts every server in case a gateway event was missed"""
+        drift = guild_counters.reconcile(self.bot.guilds)
+        if drift:
+            print(f"Server stats reconciled: user total was off by {drift}")
 
     async def print_stats(self):
         """Prints server statistics to the terminal"""
         # Get current time for logging
         current_time = datetime.datetime.now().strftime("%m-%d %H:%M:%S")
-        
-        # Get statistics
-        server_count = len(self.bot.guilds)
-        user_count = sum(guild.member_count for guild in self.bot.guilds)
-        
+
         # Print statistics
         print(f"{current_time} ==================================================")
         print(f"{current_time} Logged in as: {self.bot.user.name} (ID: {self.bot.user.id})")
-        print(f"{current_time} Connected to {server_count} servers with {user_count} users")
+        print(f"{current_time} Connected to {guild_counters.guilds} servers with {guild_counters.users} users")
         print(f"{current_time} All commands and features are disabled")
+        self.print_loop_lag(current_time)
         print(f"{current_time} ==================================================")
 
+    def print_loop_lag(self, current_time: str):
+        """Prints event loop lag since the last report"""
+        lag = loop_monitor.summary()
+        print(
+            f"{current_time} Event loop lag: p50 {lag['p50'] * 1000:.1f}ms, p99 {lag['p99'] * 1000:.1f}ms, "
+            f"max {lag['max'] * 1000:.1f}ms, {lag['blocks']} blocks, {lag['reports']} stack traces captured"
+        )
+
     @stats_task.before_loop
     async def before_stats_task(self):
         """Wait until the bot is ready before starting the task."""
         await self.bot.wait_until_ready()
 
-    @first_run.before_loop
-    async def before_first_run(self):
-        """Wait until the bot is ready before running."""
+    @sample_task.before_loop
+    async def before_sample_task(self):
+        await self.bot.wait_until_ready()
+
+    @reconcile_task.before_loop
+    async def before_reconcile_task(self):
         await self.bot.wait_until_ready()
 
     @commands.Cog.listener()
     async def on_ready(self):
         """Event triggered when the bot is ready."""
+        guild_counters.reconcile(self.bot.guilds)
         await self.print_stats()
 
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        guild_counters.guild_joined(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        guild_counters.guild_removed(guild)
+
+    # Member events only arrive with the members intent
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        guild_counters.member_joined(member.guild)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        guild_counters.member_removed(member.guild)
+
 async def setup(bot):
-    await bot.add_cog(ServerStatsCog(bot)) 
\ No newline at end of file
+    await bot.add_cog(ServerStatsCog(bot))
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""
+Benchmark: transfer dispatcher throughput under concurrent submissions
+
+Run with: python -m tests.bench_dispatcher [transfers] [senders]
+
+Runs the same scenarios as tests/test_dispatcher.py against the
+in-memory fake: every transfer from one sender, then the transfers
+spread across many senders. Wallets are funded well beyond the run, so
+every transfer completes.
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ["MONGODB_URI"] = "mongodb://localhost:27017"
+
+from cog.cryptonel.transfer import utils, dispatcher, email_sender
+from cog.cryptonel.transfer.ledger_stats import CounterpartyCounts
+from cog.cryptonel.transfer.ledger_writer import LedgerWriter
+from cog.cryptonel.transfer.network_volume import TransferVolumeTracker
+from cog.cryptonel.transfer.transfer_journal import TransferJournal
+from tests.fakes import FakeClient
+
+SETTINGS = {"tax_rate": "0.01", "min_amount": "0"}
+
+def setup_wallet(senders: int):
+    # Same wiring as the ledger fixture in tests/conftest.py
+    wallet = FakeClient()["cryptonel_wallet"]
+    journal = TransferJournal(wallet["transfer_journal"])
+    counterparties = CounterpartyCounts(wallet["ledger_counterparties"])
+    utils.users = wallet["users"]
+    utils.transfer_journal = journal
+    utils.counterparty_counts = counterparties
+    utils.ledger_writer = LedgerWriter(wallet["users"], wallet["user_transactions"], journal=journal, counterparties=counterparties)
+    utils.network_volume = TransferVolumeTracker(wallet["network_stats"])
+    dispatcher.users = wallet["users"]
+    email_sender.send_transaction_emails = lambda *args: True
+    email_sender.send_batch_transaction_emails = lambda *args: True
+
+    for user_id in [str(sender) for sender in range(senders)] + ["recipient"]:
+        wallet["users"].insert_one({
+            "user_id": user_id,
+            "username": f"user{user_id}",
+            "private_address": f"addr-{user_id}",
+            "balance": "1000000"
+        })
+    return wallet
+
+async def run_transfers(wallet, senders: int, transfers: int) -> float:
+    recipient = wallet["users"].find_one({"user_id": "recipient"})
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        dispatcher.execute_transfer(str(i % senders), recipient, 1.0, "bench", SETTINGS)
+        for i in range(transfers)
+    ))
+    return transfers / (time.perf_counter() - start)
+
+def main():
+    transfers = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    senders = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    one_sender = asyncio.run(run_transfers(setup_wallet(1), 1, transfers))
+    many_senders = asyncio.run(run_transfers(setup_wallet(senders), senders, transfers))
+    print(f"{transfers} concurrent transfers")
+    print(f"{'one sender:':<16}{one_sender:10.0f} transfers/s")
+    print(f"{f'{senders} senders:':<16}{many_senders:10.0f} transfers/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Benchmark: compiled fee schedule against re-reading the settings per transfer
+
+Run with: python -m tests.bench_fee_engine [amounts]
+
+"per-call settings" is the pre-engine calculate_fee, which parsed the
+settings document on every transfer. "compile + quote" is the current
+calculate_fee path (the schedule cache is hit on every call), and
+"quote_many" prices the whole list on one compiled schedule.
+"""
+import random
+import sys
+import time
+
+from cog.cryptonel.transfer.fee_engine import compile_fee_schedule
+
+SETTINGS = {
+    "tax_enabled": True,
+    "tax_rate": "0.01",
+    "min_fee": "0.1",
+    "max_fee": "500",
+    "tax_tiers": [{"min_amount": "10000", "tax_rate": "0.005"}, {"min_amount": "100000", "tax_rate": "0.0025"}],
+    "premium_settings": {"tax_exempt_enabled": True, "tax_exempt": True}
+}
+
+def per_call_settings(amount: float, is_premium: bool, transfer_settings: dict):
+    if not transfer_settings.get("tax_enabled", True):
+        return 0.0, amount
+    premium_settings = transfer_settings.get("premium_settings", {})
+    if is_premium and premium_settings.get("tax_exempt_enabled", True) and premium_settings.get("tax_exempt", True):
+        return 0.0, amount
+    fee = amount * float(transfer_settings.get("tax_rate", "0.01"))
+    return fee, amount - fee
+
+def measure(name: str, function, count: int):
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<18} {count / elapsed:>12,.0f} quotes/s")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    amounts = [random.uniform(1, 500_000) for _ in range(count)]
+    schedule = compile_fee_schedule(SETTINGS)
+
+    measure("per-call settings", lambda: [per_call_settings(amount, False, SETTINGS) for amount in amounts], count)
+    measure("compile + quote", lambda: [compile_fee_schedule(SETTINGS).quote(amount) for amount in amounts], count)
+    measure("quote_many", lambda: schedule.quote_many(amounts), count)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: group-commit ledger writer against per-call writes
+
+Run with: python -m tests.bench_ledger_writer [transfers] [latency_ms]
+
+Both sides run against the in-memory fake with a simulated round-trip
+latency, so the numbers compare MongoDB round trips, not server work.
+The per-call side issues the six operations record_transaction used to
+send for every transfer (two find_one, two balance updates, two $push).
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ["MONGODB_URI"] = "mongodb://localhost:27017"
+
+from cog.cryptonel.transfer.ledger_writer import LedgerEntry, LedgerWriter
+from tests.fakes import FakeClient
+
+USERS = 200
+
+def setup_wallet(latency: float):
+    wallet = FakeClient(latency)["cryptonel_wallet"]
+    for user_id in range(USERS):
+        wallet["users"].documents.append({"user_id": str(user_id), "balance": "1000000"})
+    return wallet
+
+def per_call_transfer(wallet, sender_id: str, recipient_id: str, amount: float):
+    users = wallet["users"]
+    history = wallet["user_transactions"]
+    sender = users.find_one({"user_id": sender_id})
+    recipient = users.find_one({"user_id": recipient_id})
+    users.update_one({"user_id": sender_id}, {"$set": {"balance": str(float(sender["balance"]) - amount)}})
+    users.update_one({"user_id": recipient_id}, {"$set": {"balance": str(float(recipient["balance"]) + amount)}})
+    history.update_one({"user_id": sender_id}, {"$push": {"transactions": {"amount": -amount}}}, upsert=True)
+    history.update_one({"user_id": recipient_id}, {"$push": {"transactions": {"amount": amount}}}, upsert=True)
+
+async def run_per_call(transfers: int, latency: float) -> float:
+    wallet = setup_wallet(latency)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        asyncio.to_thread(per_call_transfer, wallet, str(i % USERS), str((i + 1) % USERS), 1.0)
+        for i in range(transfers)
+    ))
+    return transfers / (time.perf_counter() - start)
+
+async def run_group_commit(transfers: int, latency: float) -> float:
+    wallet = setup_wallet(latency)
+    writer = LedgerWriter(wallet["users"], wallet["user_transactions"])
+    start = time.perf_counter()
+
+    async def transfer(i: int):
+        entry = LedgerEntry()
+        entry.add_balance(str(i % USERS), -1.0)
+        entry.add_balance(str((i + 1) % USERS), 1.0)
+        entry.add_history(str(i % USERS), {"tx_id": str(i), "amount": -1.0})
+        entry.add_history(str((i + 1) % USERS), {"tx_id": str(i), "amount": 1.0})
+        await writer.submit(entry)
+
+    await asyncio.gather(*(transfer(i) for i in range(transfers)))
+    return transfers / (time.perf_counter() - start)
+
+def main():
+    transfers = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 1.0) / 1000
+    per_call = asyncio.run(run_per_call(transfers, latency))
+    grouped = asyncio.run(run_group_commit(transfers, latency))
+    print(f"{transfers} transfers, {latency * 1000:.1f}ms per round trip")
+    print(f"per-call writes: {per_call:10.0f} transfers/s")
+    print(f"group commit:    {grouped:10.0f} transfers/s ({grouped / per_call:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+# The cogs create their MongoClient at import time; it connects lazily, so
+# any well-formed URI works. Tests swap every collection for an in-memory fake.
+os.environ["MONGODB_URI"] = "mongodb://localhost:27017"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.fakes import FakeClient
+
+@pytest.fixture
+def ledger(monkeypatch):
+    """Point the transfer modules at a fresh in-memory database"""
+    from cog.cryptonel.transfer import utils, dispatcher, email_sender
+    from cog.cryptonel.transfer.ledger_writer import LedgerWriter
+    from cog.cryptonel.transfer.transfer_journal import TransferJournal
+    from cog.cryptonel.transfer.ledger_stats import CounterpartyCounts
+    from cog.cryptonel.transfer.network_volume import TransferVolumeTracker
+
+    client = FakeClient()
+    wallet = client["cryptonel_wallet"]
+    journal = TransferJournal(wallet["transfer_journal"])
+    counterparties = CounterpartyCounts(wallet["ledger_counterparties"])
+    writer = LedgerWriter(wallet["users"], wallet["user_transactions"], journal=journal, counterparties=counterparties)
+
+    monkeypatch.setattr(utils, "users", wallet["users"])
+    monkeypatch.setattr(utils, "transfer_journal", journal)
+    monkeypatch.setattr(utils, "counterparty_counts", counterparties)
+    monkeypatch.setattr(utils, "ledger_writer", writer)
+    monkeypatch.setattr(utils, "network_volume", TransferVolumeTracker(wallet["network_stats"]))
+    monkeypatch.setattr(dispatcher, "users", wallet["users"])
+    monkeypatch.setattr(email_sender, "send_transaction_emails", lambda *args: True)
+    monkeypatch.setattr(email_sender, "send_batch_transaction_emails", lambda *args: True)
+    return wallet
+
+def add_wallet(wallet, user_id: str, balance: float, **fields):
+    wallet["users"].insert_one({
+        "user_id": user_id,
+        "username": f"user{user_id}",
+        "private_address": f"addr-{user_id}",
+        "balance": str(balance),
+        **fields
+    })
+
+def balance_of(wallet, user_id: str) -> float:
+    return float(wallet["users"].find_one({"user_id": user_id})["balance"])
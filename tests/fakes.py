@@ -0,0 +1,273 @@
+import copy
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+# In-memory stand-ins for the pymongo objects the ledger code uses.
+# Only the operators the bot actually sends are supported.
+
+def get_path(document: Dict, path: str):
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def set_path(document: Dict, path: str, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+def matches(document: Dict, query: Dict) -> bool:
+    for field, condition in query.items():
+        value = get_path(document, field)
+        if isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+            for operator, operand in condition.items():
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$gt" and not (value is not None and value > operand):
+                    return False
+                if operator == "$exists" and (value is not None) != operand:
+                    return False
+                if operator == "$regex" and not (isinstance(value, str) and re.search(operand, value)):
+                    return False
+                if operator == "$lte" and not (value is not None and value <= operand):
+                    return False
+                if operator == "$gte" and not (value is not None and value >= operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+def apply_update(document: Dict, update: Dict):
+    for field, value in update.get("$set", {}).items():
+        set_path(document, field, copy.deepcopy(value))
+    for field, value in update.get("$inc", {}).items():
+        set_path(document, field, (get_path(document, field) or 0) + value)
+    for field, value in update.get("$min", {}).items():
+        current = get_path(document, field)
+        set_path(document, field, value if current is None else min(current, value))
+    for field, value in update.get("$max", {}).items():
+        current = get_path(document, field)
+        set_path(document, field, value if current is None else max(current, value))
+    for operator in ("$addToSet", "$push"):
+        for field, value in update.get(operator, {}).items():
+            items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+            current = get_path(document, field)
+            if current is None:
+                current = []
+                set_path(document, field, current)
+            for item in items:
+                if operator == "$push" or item not in current:
+                    current.append(copy.deepcopy(item))
+
+class FakeCollection:
+    def __init__(self, database, name: str):
+        self.database = database
+        self.name = name
+        self.documents: List[Dict] = []
+        self.unique_fields: List[str] = []
+        # Operation name -> exception raised by the next call of that operation
+        self.failures: Dict[str, Exception] = {}
+        self.calls: Dict[str, int] = {}
+
+    def _round_trip(self):
+        # Simulated network latency, paid outside the lock like a real connection pool
+        if self.database.client.latency:
+            time.sleep(self.database.client.latency)
+
+    @property
+    def lock(self):
+        return self.database.client.lock
+
+    def fail_next(self, operation: str, error: Exception):
+        self.failures[operation] = error
+
+    def _enter(self, operation: str):
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        error = self.failures.pop(operation, None)
+        if error is not None:
+            raise error
+
+    def create_index(self, keys, unique: bool = False, **kwargs):
+        # A unique index is a tuple of fields; a single field index is a one-field tuple
+        fields = (keys,) if isinstance(keys, str) else tuple(field for field, _ in keys)
+        if unique and fields not in self.unique_fields:
+            self.unique_fields.append(fields)
+        return keys
+
+    def _check_unique(self, document: Dict):
+        for fields in self.unique_fields:
+            values = [document.get(field) for field in fields]
+            if any(value is None for value in values):
+                continue
+            if any(other is not document and [other.get(field) for field in fields] == values for other in self.documents):
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {'_'.join(fields)}", 11000)
+
+    def find(self, query: Optional[Dict] = None, projection: Optional[Dict] = None, session=None, sort=None, limit: int = 0, batch_size: int = 0):
+        self._round_trip()
+        with self.lock:
+            self._enter("find")
+            documents = [copy.deepcopy(document) for document in self.documents if matches(document, query or {})]
+        for field, direction in reversed(sort or []):
+            documents.sort(key=lambda document: get_path(document, field), reverse=direction < 0)
+        return documents[:limit] if limit else documents
+
+    def find_one(self, query: Optional[Dict] = None, projection: Optional[Dict] = None, session=None):
+        self._round_trip()
+        with self.lock:
+            self._enter("find_one")
+            for document in self.documents:
+                if matches(document, query or {}):
+                    return copy.deepcopy(document)
+            return None
+
+    def insert_one(self, document: Dict, session=None):
+        self._round_trip()
+        with self.lock:
+            self._enter("insert_one")
+            stored = copy.deepcopy(document)
+            self.documents.append(stored)
+            try:
+                self._check_unique(stored)
+            except DuplicateKeyError:
+                self.documents.remove(stored)
+                raise
+
+    def _update(self, query: Dict, update: Dict, upsert: bool):
+        for document in self.documents:
+            if matches(document, query):
+                backup = copy.deepcopy(document)
+                apply_update(document, update)
+                try:
+                    self._check_unique(document)
+                except DuplicateKeyError:
+                    document.clear()
+                    document.update(backup)
+                    raise
+                return
+        if upsert:
+            document = {
+                field: value for field, value in query.items()
+                if not (isinstance(value, dict) and any(key.startswith("$") for key in value))
+            }
+            apply_update(document, update)
+            self.documents.append(document)
+            try:
+                self._check_unique(document)
+            except DuplicateKeyError:
+                self.documents.remove(document)
+                raise
+
+    def update_one(self, query: Dict, update: Dict, upsert: bool = False, session=None):
+        self._round_trip()
+        with self.lock:
+            self._enter("update_one")
+            self._update(query, update, upsert)
+
+    def update_many(self, query: Dict, update: Dict, session=None):
+        self._round_trip()
+        with self.lock:
+            self._enter("update_many")
+            matched = [document for document in self.documents if matches(document, query)]
+            for document in matched:
+                apply_update(document, update)
+            return SimpleNamespace(modified_count=len(matched))
+
+    def delete_many(self, query: Dict, session=None):
+        self._round_trip()
+        with self.lock:
+            self._enter("delete_many")
+            kept = [document for document in self.documents if not matches(document, query)]
+            deleted = len(self.documents) - len(kept)
+            self.documents = kept
+            return SimpleNamespace(deleted_count=deleted)
+
+    def find_one_and_update(self, query: Dict, update: Dict, upsert: bool = False, return_document: bool = False, session=None):
+        self._round_trip()
+        with self.lock:
+            self._enter("find_one_and_update")
+            before = next((copy.deepcopy(document) for document in self.documents if matches(document, query)), None)
+            self._update(query, update, upsert)
+            if return_document:
+                return next((copy.deepcopy(document) for document in self.documents if matches(document, query)), None)
+            return before
+
+    def bulk_write(self, operations: List[UpdateOne], ordered: bool = True, session=None):
+        self._round_trip()
+        with self.lock:
+            self._enter("bulk_write")
+            for operation in operations:
+                self._update(operation._filter, operation._doc, operation._upsert)
+
+class FakeDatabase:
+    def __init__(self, client, name: str):
+        self.client = client
+        self.name = name
+        self.collections: Dict[str, FakeCollection] = {}
+
+    def command(self, name: str):
+        if name == "hello":
+            return dict(self.client.hello)
+        raise NotImplementedError(name)
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self, name)
+        return self.collections[name]
+
+class FakeSession:
+    """Runs a transaction by restoring every collection if the callback raises"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def with_transaction(self, callback):
+        with self.client.lock:
+            snapshot = {
+                collection: copy.deepcopy(collection.documents)
+                for database in self.client.databases.values()
+                for collection in database.collections.values()
+            }
+            try:
+                return callback(self)
+            except Exception:
+                for collection, documents in snapshot.items():
+                    collection.documents = documents
+                raise
+
+class FakeClient:
+    def __init__(self, latency: float = 0.0):
+        self.databases: Dict[str, FakeDatabase] = {}
+        self.lock = threading.RLock()
+        # Seconds added to every operation
+        self.latency = latency
+        # Reply to the hello command; a replica set member unless a test says otherwise
+        self.hello = {"isWritablePrimary": True, "setName": "rs0"}
+
+    @property
+    def admin(self) -> FakeDatabase:
+        return self["admin"]
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        if name not in self.databases:
+            self.databases[name] = FakeDatabase(self, name)
+        return self.databases[name]
+
+    def start_session(self):
+        return FakeSession(self)
@@ -0,0 +1,123 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from cog.management import airdrop_commands
+from tests.conftest import add_wallet, balance_of
+from tests.fakes import FakeClient
+
+MEMBER_IDS = list(range(1, 8))
+
+class FakeGuild:
+    id = 42
+    name = "Partner Server"
+
+    def __init__(self, member_ids=MEMBER_IDS):
+        self.member_ids = member_ids
+        self.member_count = len(member_ids)
+
+    async def fetch_members(self, limit=None, after=None):
+        for member_id in self.member_ids:
+            if after is None or member_id > after.id:
+                yield SimpleNamespace(id=member_id, bot=False)
+
+class FakeMessage:
+    async def edit(self, **kwargs):
+        pass
+
+@pytest.fixture
+def airdrop(ledger, monkeypatch):
+    from cog.cryptonel.transfer import utils
+    monkeypatch.setattr(airdrop_commands, "users", ledger["users"])
+    monkeypatch.setattr(airdrop_commands, "transfer_journal", utils.transfer_journal)
+    monkeypatch.setattr(airdrop_commands, "CHUNK_SIZE", 3)
+    for member_id in MEMBER_IDS:
+        add_wallet(ledger, str(member_id), 0)
+
+    cog = airdrop_commands.AirdropCommands(SimpleNamespace())
+    cog.jobs_collection = FakeClient()["staff"]["airdrop_jobs"]
+    job = {"_id": "job-1", "amount": "10.00000000", "reason": "test", "status": "running", "last_member_id": None, "scanned": 0, "credited": 0}
+    cog.jobs_collection.insert_one(job)
+    return cog
+
+def run(cog, job, member_ids=MEMBER_IDS):
+    asyncio.run(cog.run_airdrop(FakeGuild(member_ids), job, FakeMessage()))
+
+def resume(cog):
+    return cog.jobs_collection.find_one({"_id": "job-1"})
+
+def balances(ledger, member_ids=MEMBER_IDS):
+    return [balance_of(ledger, str(member_id)) for member_id in member_ids]
+
+def test_resume_after_crash_inside_chunk_commit(ledger, airdrop):
+    # The first chunk commits, the second one dies partway through its transaction
+    original_bulk_write = ledger["user_transactions"].bulk_write
+    calls = []
+
+    def crash_on_second_chunk(operations, **kwargs):
+        calls.append(len(operations))
+        if len(calls) == 2:
+            raise OperationFailure("bot process killed")
+        return original_bulk_write(operations, **kwargs)
+
+    ledger["user_transactions"].bulk_write = crash_on_second_chunk
+    with pytest.raises(OperationFailure):
+        run(airdrop, resume(airdrop))
+    assert balances(ledger) == [10, 10, 10, 0, 0, 0, 0]
+
+    run(airdrop, resume(airdrop))
+
+    assert balances(ledger) == [10] * len(MEMBER_IDS)
+    assert resume(airdrop)["status"] == "completed"
+
+def test_resume_after_crash_before_checkpoint(ledger, airdrop):
+    # The second chunk is paid, but the bot dies before its cursor is saved
+    original_update = airdrop.jobs_collection.update_one
+    calls = []
+
+    def crash_on_second_checkpoint(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 2:
+            raise OperationFailure("bot process killed")
+        return original_update(*args, **kwargs)
+
+    airdrop.jobs_collection.update_one = crash_on_second_checkpoint
+    with pytest.raises(OperationFailure):
+        run(airdrop, resume(airdrop))
+    airdrop.jobs_collection.update_one = original_update
+    assert resume(airdrop)["last_member_id"] == 3
+
+    run(airdrop, resume(airdrop))
+
+    # The resumed job skips the paid chunk instead of paying it twice
+    assert balances(ledger) == [10] * len(MEMBER_IDS)
+
+def test_resume_after_membership_changed(ledger, airdrop):
+    original_update = airdrop.jobs_collection.update_one
+    calls = []
+
+    def crash_on_second_checkpoint(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 2:
+            raise OperationFailure("bot process killed")
+        return original_update(*args, **kwargs)
+
+    # Members 4, 5 and 6 are paid, but the cursor still points at member 3
+    airdrop.jobs_collection.update_one = crash_on_second_checkpoint
+    with pytest.raises(OperationFailure):
+        run(airdrop, resume(airdrop))
+    airdrop.jobs_collection.update_one = original_update
+    # Keys of a running job never expire
+    assert ledger["transfer_journal"].find_one({"idempotency_key": "airdrop:job-1:4"}).get("created_at") is None
+
+    # Member 5 leaves and member 8 joins, so the resumed chunk is 4, 6, 7
+    add_wallet(ledger, "8", 0)
+    member_ids = [1, 2, 3, 4, 6, 7, 8]
+    run(airdrop, resume(airdrop), member_ids)
+
+    assert balances(ledger, range(1, 9)) == [10] * 8
+    assert resume(airdrop)["status"] == "completed"
+    # The finished job's keys now expire through the TTL index
+    assert ledger["transfer_journal"].find_one({"idempotency_key": "airdrop:job-1:4"})["created_at"] is not None
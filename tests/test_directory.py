@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+from cog.management import directory_commands
+from cog.management.directory_commands import ServerDirectory
+from tests.fakes import FakeClient
+
+def server(server_id: str):
+    return {"server_id": server_id, "server_name": f"Server {server_id}", "server_type": "partner"}
+
+def test_change_during_rebuild_triggers_another_pass(monkeypatch):
+    monkeypatch.setattr(directory_commands, "REBUILD_DELAY_SECONDS", 0)
+    collection = FakeClient()["staff"]["server_trade_crn"]
+    collection.insert_one(server("1"))
+    directory = ServerDirectory(collection)
+    original_load = directory.load
+    loads = []
+
+    def slow_load():
+        snapshot = original_load()
+        loads.append(len(snapshot.search()))
+        time.sleep(0.05)
+        return snapshot
+
+    directory.load = slow_load
+
+    async def scenario():
+        directory.mark_stale()
+        await asyncio.sleep(0.02)
+        # A server is added after the first load read the collection
+        collection.insert_one(server("2"))
+        directory.mark_stale()
+        while not directory.rebuild_task.done():
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+
+    assert loads == [1, 2]
+    assert len(directory.snapshot.search()) == 2
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from cog.cryptonel.transfer import dispatcher
+from tests.conftest import add_wallet, balance_of
+
+SETTINGS = {"tax_rate": "0.01", "min_amount": "0"}
+
+def watch_balances(wallet):
+    """Record every balance the users collection is ever left with"""
+    written = []
+    original_bulk_write = wallet["users"].bulk_write
+
+    def bulk_write(operations, **kwargs):
+        result = original_bulk_write(operations, **kwargs)
+        written.extend(float(document["balance"]) for document in wallet["users"].documents)
+        return result
+
+    wallet["users"].bulk_write = bulk_write
+    return written
+
+async def run_transfers(wallet, senders, count: int, amount: float):
+    recipient = wallet["users"].find_one({"user_id": "recipient"})
+    return await asyncio.gather(*(
+        dispatcher.execute_transfer(senders[i % len(senders)], recipient, amount, "stress", SETTINGS)
+        for i in range(count)
+    ))
+
+@pytest.mark.parametrize("transfers", [2000])
+def test_concurrent_transfers_never_double_spend(ledger, transfers):
+    # 100 CRN covers exactly 99 transfers of 1 CRN plus the 1% fee
+    add_wallet(ledger, "1", 100)
+    add_wallet(ledger, "recipient", 0)
+    written = watch_balances(ledger)
+
+    results = asyncio.run(run_transfers(ledger, ["1"], transfers, 1.0))
+
+    completed = [result for result in results if result["status"] == "completed"]
+    assert len(completed) == 99
+    assert all(result["status"] == "insufficient_funds" for result in results if result["status"] != "completed")
+    assert min(written) >= 0
+    assert balance_of(ledger, "1") == pytest.approx(100 - 99 * 1.01)
+    assert balance_of(ledger, "recipient") == pytest.approx(99 * 0.99)
+
+def test_senders_run_in_parallel_without_overdrafts(ledger):
+    senders = [str(sender) for sender in range(50)]
+    for sender in senders:
+        add_wallet(ledger, sender, 10)
+    add_wallet(ledger, "recipient", 0)
+    written = watch_balances(ledger)
+
+    results = asyncio.run(run_transfers(ledger, senders, 2000, 1.0))
+
+    # Each sender can afford 9 transfers of 1.01 CRN
+    assert sum(result["status"] == "completed" for result in results) == 9 * len(senders)
+    assert min(written) >= 0
+    assert balance_of(ledger, "recipient") == pytest.approx(9 * len(senders) * 0.99)
+    assert dispatcher.transfer_dispatcher.active_senders() == 0
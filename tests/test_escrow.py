@@ -0,0 +1,64 @@
+import asyncio
+import datetime
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from cog.cryptonel.transfer import escrow as escrow_module
+from cog.cryptonel.transfer.escrow import EscrowService
+from cog.cryptonel.transfer.network_volume import TransferVolumeTracker
+from tests.conftest import add_wallet, balance_of
+
+def settling_escrow(escrow_id: str, outcome: str = "accepted", **fields):
+    return {
+        "_id": escrow_id,
+        "sender_id": "1",
+        "sender_username": "user1",
+        "sender_address": "addr-1",
+        "recipient_id": "2",
+        "recipient_username": "user2",
+        "recipient_address": "addr-2",
+        "amount": "10.00000000",
+        "fee": "1.00000000",
+        "amount_after_fee": "9.00000000",
+        "reason": "test",
+        "status": "settling",
+        "outcome": outcome,
+        "expires_at": datetime.datetime.now(datetime.timezone.utc),
+        **fields
+    }
+
+@pytest.fixture
+def service(ledger, monkeypatch):
+    monkeypatch.setattr(escrow_module, "network_volume", TransferVolumeTracker(ledger["network_stats"]))
+    add_wallet(ledger, "1", 89)
+    add_wallet(ledger, "2", 0)
+    return EscrowService(ledger["escrow_transfers"])
+
+def test_recover_settles_each_escrow_once(ledger, service):
+    service.collection.insert_one(settling_escrow("a"))
+    # Broken record: recovering it raises, but must not stop the others
+    service.collection.insert_one(settling_escrow("b", amount_after_fee="not a number"))
+    service.collection.insert_one(settling_escrow("c", outcome="rejected"))
+
+    asyncio.run(service.recover())
+    asyncio.run(service.recover())
+
+    assert service.collection.find_one({"_id": "a"})["status"] == "accepted"
+    assert service.collection.find_one({"_id": "b"})["status"] == "settling"
+    assert service.collection.find_one({"_id": "c"})["status"] == "rejected"
+    assert balance_of(ledger, "2") == pytest.approx(9)
+    assert balance_of(ledger, "1") == pytest.approx(100)
+
+def test_recover_resettles_escrow_whose_settlement_aborted(ledger, service):
+    service.collection.insert_one(settling_escrow("d"))
+    # The bot dies inside the settlement transaction, so neither the payout nor the key is written
+    ledger["user_transactions"].fail_next("bulk_write", OperationFailure("bot process killed"))
+    asyncio.run(service.recover())
+    assert service.collection.find_one({"_id": "d"})["status"] == "settling"
+    assert ledger["transfer_journal"].find_one({"idempotency_key": "escrow:d:settle"}) is None
+
+    asyncio.run(service.recover())
+
+    assert service.collection.find_one({"_id": "d"})["status"] == "accepted"
+    assert balance_of(ledger, "2") == pytest.approx(9)
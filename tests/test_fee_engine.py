@@ -0,0 +1,72 @@
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from cog.cryptonel.transfer.fee_engine import compile_fee_schedule
+
+amounts = st.floats(min_value=0.00000001, max_value=10_000_000, allow_nan=False, allow_infinity=False)
+rates = st.floats(min_value=0, max_value=1, allow_nan=False).map(lambda rate: f"{rate:.4f}")
+fees = st.floats(min_value=0, max_value=1000, allow_nan=False).map(lambda fee: f"{fee:.8f}")
+
+# Settings documents as stored in MongoDB: numbers are strings and any key may be missing
+transfer_settings = st.one_of(
+    st.none(),
+    st.fixed_dictionaries({}, optional={
+        "tax_enabled": st.booleans(),
+        "tax_rate": rates,
+        "flat_fee": fees,
+        "min_fee": fees,
+        "max_fee": st.one_of(st.none(), fees),
+        "tax_tiers": st.lists(
+            st.fixed_dictionaries({"min_amount": fees.map(lambda fee: str(float(fee) * 1000)), "tax_rate": rates}),
+            max_size=4
+        ),
+        "premium_settings": st.fixed_dictionaries({"tax_exempt_enabled": st.booleans(), "tax_exempt": st.booleans()})
+    })
+)
+
+@settings(max_examples=500)
+@given(transfer_settings, amounts, st.booleans())
+def test_fee_never_exceeds_amount(settings_document, amount, is_premium):
+    quote = compile_fee_schedule(settings_document).quote(amount, is_premium)
+
+    assert 0 <= quote.fee <= amount
+    assert quote.amount_after_fee == pytest.approx(amount - quote.fee, abs=1e-8)
+    assert quote.amount_after_fee >= 0
+
+@settings(max_examples=500)
+@given(transfer_settings, amounts, amounts, st.booleans())
+def test_fee_is_monotone_in_amount(settings_document, first, second, is_premium):
+    schedule = compile_fee_schedule(settings_document)
+    low, high = sorted((first, second))
+    low_quote, high_quote = schedule.quote(low, is_premium), schedule.quote(high, is_premium)
+
+    assert low_quote.fee <= high_quote.fee
+    assert low_quote.amount_after_fee <= high_quote.amount_after_fee + 1e-8
+
+@settings(max_examples=500)
+@given(transfer_settings, amounts)
+def test_max_fee_is_respected(settings_document, amount):
+    max_fee = (settings_document or {}).get("max_fee")
+    quote = compile_fee_schedule(settings_document).quote(amount)
+
+    if max_fee is not None:
+        assert quote.fee <= float(max_fee)
+
+@given(transfer_settings, st.lists(amounts, max_size=20), st.booleans())
+def test_quote_many_matches_single_quotes(settings_document, amount_list, is_premium):
+    schedule = compile_fee_schedule(settings_document)
+
+    assert schedule.quote_many(amount_list, is_premium) == [schedule.quote(amount, is_premium) for amount in amount_list]
+
+def test_missing_settings_use_the_default_rate():
+    quote = compile_fee_schedule(None).quote(100)
+
+    assert quote.fee == pytest.approx(1)
+    assert quote.amount_after_fee == pytest.approx(99)
+    assert compile_fee_schedule(None).quote(100, is_premium=True).fee == 0
+
+def test_tiers_charge_each_bracket_its_own_rate():
+    schedule = compile_fee_schedule({"tax_rate": "0.02", "tax_tiers": [{"min_amount": "1000", "tax_rate": "0.01"}]})
+
+    assert schedule.quote(1000).fee == pytest.approx(20)
+    assert schedule.quote(3000).fee == pytest.approx(40)
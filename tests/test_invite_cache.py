@@ -0,0 +1,48 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from cog.management.invite_cache import InviteCache
+
+STORED_LINK = "https://discord.gg/abc123"
+
+def http_error(status: int, error_type):
+    response = SimpleNamespace(status=status, reason="error")
+    return error_type(response, "error")
+
+class FakeBot:
+    def __init__(self, error):
+        self.error = error
+        self.user = SimpleNamespace(id=1)
+
+    async def fetch_invite(self, code, with_counts=False):
+        raise self.error
+
+class FakeGuild:
+    id = 42
+    text_channels = []
+
+    def __init__(self):
+        self.me = SimpleNamespace(guild_permissions=SimpleNamespace(manage_guild=False))
+
+    def get_channel(self, channel_id):
+        return None
+
+@pytest.mark.parametrize("status, error_type", [(429, discord.HTTPException), (503, discord.DiscordServerError), (403, discord.Forbidden)])
+def test_temporary_failure_keeps_stored_invite(status, error_type):
+    cache = InviteCache(FakeBot(http_error(status, error_type)))
+
+    link = asyncio.run(cache.get_invite_link(FakeGuild(), STORED_LINK))
+
+    assert link == STORED_LINK
+    # Not trusted either: the next call checks it again
+    assert cache.validated == {}
+
+def test_deleted_invite_is_replaced():
+    cache = InviteCache(FakeBot(http_error(404, discord.NotFound)))
+
+    link = asyncio.run(cache.get_invite_link(FakeGuild(), STORED_LINK))
+
+    assert link != STORED_LINK
@@ -0,0 +1,44 @@
+import asyncio
+
+from cog.cryptonel.transfer import utils
+from cog.cryptonel.transfer.ledger_stats import STATS_FIELD, backfill_ledger_stats
+from tests.conftest import add_wallet
+
+def send(ledger, sender_id: str, recipient_id: str, amount: float):
+    sender = ledger["users"].find_one({"user_id": sender_id})
+    recipient = ledger["users"].find_one({"user_id": recipient_id})
+    asyncio.run(utils.record_transaction(sender, recipient, amount, amount, 0, "test"))
+
+def test_counterparties_are_kept_out_of_the_wallet_document(ledger):
+    add_wallet(ledger, "1", 100)
+    for user_id in "234":
+        add_wallet(ledger, user_id, 0)
+
+    send(ledger, "1", "2", 1)
+    send(ledger, "1", "3", 1)
+    send(ledger, "1", "3", 1)
+
+    stats = ledger["users"].find_one({"user_id": "1"})[STATS_FIELD]
+    assert "counterparties" not in stats
+    assert stats["transfer_count"] == 3
+    assert utils.counterparty_counts.top("1") == [("3", 2), ("2", 1)]
+    assert utils.counterparty_counts.top("3") == [("1", 2)]
+
+def test_backfill_replaces_stats_and_counterparties(ledger):
+    add_wallet(ledger, "1", 0, **{STATS_FIELD: {"transfer_count": 99, "counterparties": {"9": 99}}})
+    ledger["user_transactions"].insert_one({
+        "user_id": "1",
+        "transactions": [
+            {"type": "sent", "amount": "5", "fee": "1", "counterparty_id": "2"},
+            {"type": "received", "amount": "3", "fee": "0", "counterparty_id": "2"},
+            {"type": "sent", "amount": "2", "fee": "0", "counterparty_id": "3"}
+        ]
+    })
+    utils.counterparty_counts.collection.insert_one({"user_id": "1", "counterparty_id": "9", "count": 99})
+
+    assert backfill_ledger_stats(ledger["users"], ledger["user_transactions"], utils.counterparty_counts, chunk_size=1) == 1
+
+    stats = ledger["users"].find_one({"user_id": "1"})[STATS_FIELD]
+    assert "counterparties" not in stats
+    assert (stats["total_sent"], stats["total_received"], stats["transfer_count"]) == (7.0, 3.0, 3)
+    assert utils.counterparty_counts.top("1") == [("2", 2), ("3", 1)]
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from cog.cryptonel.transfer.ledger_writer import LedgerEntry, LedgerWriter
+from cog.cryptonel.transfer.transfer_journal import TransferJournal
+from tests.conftest import add_wallet, balance_of
+from tests.fakes import FakeClient
+
+def make_writer():
+    wallet = FakeClient()["cryptonel_wallet"]
+    journal = TransferJournal(wallet["transfer_journal"])
+    # A long latency window puts every entry submitted together into one batch
+    writer = LedgerWriter(wallet["users"], wallet["user_transactions"], journal=journal, max_latency_ms=50)
+    return wallet, journal, writer
+
+def credit(user_id: str, amount: float, journal=None, key=None) -> LedgerEntry:
+    entry = LedgerEntry()
+    entry.add_balance(user_id, amount)
+    entry.add_history(user_id, {"tx_id": key or user_id, "amount": amount})
+    if key:
+        entry.add_journal(journal.entry(key, key, {}))
+    return entry
+
+async def submit_all(writer, entries):
+    return await asyncio.gather(*(writer.submit(entry) for entry in entries), return_exceptions=True)
+
+def test_batch_is_committed_in_one_write():
+    wallet, journal, writer = make_writer()
+    for user_id in "123":
+        add_wallet(wallet, user_id, 0)
+
+    results = asyncio.run(submit_all(writer, [credit(user_id, 5) for user_id in "123"]))
+
+    assert results == [{"1": 5.0}, {"2": 5.0}, {"3": 5.0}]
+    assert wallet["users"].calls["bulk_write"] == 1
+
+def test_failed_batch_only_fails_the_bad_entry():
+    wallet, journal, writer = make_writer()
+    add_wallet(wallet, "1", 0)
+    add_wallet(wallet, "2", 0)
+    asyncio.run(submit_all(writer, [credit("1", 1, journal, "key:used")]))
+
+    # The repeated key aborts the batch; the other transfer must still go through
+    results = asyncio.run(submit_all(writer, [credit("1", 5, journal, "key:used"), credit("2", 5, journal, "key:new")]))
+
+    assert isinstance(results[0], DuplicateKeyError)
+    assert results[1] == {"2": 5.0}
+    assert balance_of(wallet, "1") == pytest.approx(1)
+    assert balance_of(wallet, "2") == pytest.approx(5)
+
+def test_batch_failure_is_retried_per_entry():
+    wallet, journal, writer = make_writer()
+    add_wallet(wallet, "1", 0)
+    add_wallet(wallet, "2", 0)
+    wallet["user_transactions"].fail_next("bulk_write", OperationFailure("primary stepped down"))
+
+    results = asyncio.run(submit_all(writer, [credit("1", 5), credit("2", 7)]))
+
+    # Every caller learns the truth: both entries were applied exactly once
+    assert results == [{"1": 5.0}, {"2": 7.0}]
+    assert balance_of(wallet, "1") == pytest.approx(5)
+    assert balance_of(wallet, "2") == pytest.approx(7)
+    assert len(wallet["user_transactions"].find_one({"user_id": "1"})["transactions"]) == 1
+
+def test_standalone_server_fails_with_a_clear_message():
+    wallet, journal, writer = make_writer()
+    wallet.client.hello = {"isWritablePrimary": True}
+    add_wallet(wallet, "1", 0)
+
+    results = asyncio.run(submit_all(writer, [credit("1", 5)]))
+
+    assert isinstance(results[0], RuntimeError) and "replica set" in str(results[0])
+    assert balance_of(wallet, "1") == 0
+
@@ -0,0 +1,42 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from cog.cryptonel.mining import mining_events
+from cog.cryptonel.mining import mining_reminders as reminders_module
+from cog.cryptonel.mining.mining_reminders import MiningReminderService
+from cog.cryptonel.scheduler import utc_now
+from tests.fakes import FakeClient
+
+COOLDOWN = datetime.timedelta(hours=24)
+
+@pytest.fixture
+def mining_db(monkeypatch):
+    db = FakeClient()["cryptonel_mining"]
+    monkeypatch.setattr(mining_events, "mining_data", db["mining_data"])
+    monkeypatch.setattr(mining_events, "FALLBACK_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(mining_events.mining_feed, "available", False)
+    monkeypatch.setattr(reminders_module, "get_mining_cooldown", lambda: COOLDOWN)
+    return db
+
+def test_reminders_poll_when_change_streams_are_unsupported(mining_db):
+    service = MiningReminderService(mining_db["mining_reminders"])
+    service.collection.insert_one({"_id": "1", "remind_at": None})
+
+    async def scenario():
+        await service.start(SimpleNamespace())
+        await asyncio.sleep(0.02)
+        mined = utc_now()
+        mining_db["mining_data"].insert_one({"user_id": "1", "last_mined": mined, "total_mined": "5"})
+        # Not subscribed, so never looked at
+        mining_db["mining_data"].insert_one({"user_id": "2", "last_mined": mined, "total_mined": "5"})
+        await asyncio.sleep(0.05)
+        service.stop()
+        return mined
+
+    mined = asyncio.run(scenario())
+
+    assert service.collection.find_one({"_id": "1"})["remind_at"] == mined + COOLDOWN
+    assert service.collection.find_one({"_id": "2"}) is None
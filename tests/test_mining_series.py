@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from cog.cryptonel.mining import mining_events
+from cog.cryptonel.mining.mining_series import MiningSeries
+from cog.cryptonel.scheduler import utc_now
+from tests.fakes import FakeClient
+
+@pytest.fixture
+def mining_db(monkeypatch):
+    db = FakeClient()["cryptonel_mining"]
+    monkeypatch.setattr(mining_events, "mining_data", db["mining_data"])
+    monkeypatch.setattr(mining_events, "FALLBACK_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(mining_events.mining_feed, "available", False)
+    return db
+
+def make_series(db, *user_ids: str) -> MiningSeries:
+    series = MiningSeries(db["mining_series"], db["mining_series_state"])
+    # Users already known to the history, starting from nothing mined
+    for user_id in user_ids:
+        series.state.insert_one({"_id": user_id, "last_total": 0.0})
+    return series
+
+def recorded_total(series, user_id: str) -> float:
+    return sum(bucket["total"] for bucket in series.buckets.find({"user_id": user_id}))
+
+def test_events_are_recorded_in_order_per_user(mining_db):
+    series = make_series(mining_db, "1", "2")
+    original_record = series.record
+    order = []
+    lock = threading.Lock()
+
+    def slow_first_record(user_id, total_mined, timestamp):
+        # The first write is the slowest; a later total must still wait for it
+        if total_mined == 10:
+            time.sleep(0.05)
+        with lock:
+            order.append((user_id, total_mined))
+        original_record(user_id, total_mined, timestamp)
+
+    series.record = slow_first_record
+
+    async def scenario():
+        now = utc_now()
+        for total in ("10", "20", "30"):
+            series.on_mining_change({"user_id": "1", "total_mined": total, "last_mined": now})
+        series.on_mining_change({"user_id": "2", "total_mined": "5", "last_mined": now})
+        while series.pending:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+
+    assert [total for user_id, total in order if user_id == "1"] == [10, 20, 30]
+    # Other users are not held up behind user 1
+    assert order[0] == ("2", 5)
+    assert recorded_total(series, "1") == pytest.approx(30)
+    assert recorded_total(series, "2") == pytest.approx(5)
+
+def test_history_polls_when_change_streams_are_unsupported(mining_db):
+    series = make_series(mining_db, "1")
+
+    async def scenario():
+        task = asyncio.create_task(series.poll_loop())
+        await asyncio.sleep(0.02)
+        mining_db["mining_data"].insert_one({"user_id": "1", "last_mined": utc_now(), "total_mined": "12.5"})
+        await asyncio.sleep(0.05)
+        while series.pending:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(scenario())
+
+    # Overlapping polls see the document more than once; it is counted once
+    assert recorded_total(series, "1") == pytest.approx(12.5)
+
+def test_first_total_of_an_unknown_user_is_only_a_baseline(mining_db):
+    series = make_series(mining_db)
+    now = utc_now()
+
+    series.record("1", 500.0, now)
+    assert recorded_total(series, "1") == 0
+    assert series.state.find_one({"_id": "1"})["last_total"] == 500.0
+
+    series.record("1", 512.5, now)
+    assert recorded_total(series, "1") == pytest.approx(12.5)
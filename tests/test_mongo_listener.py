@@ -0,0 +1,78 @@
+import contextvars
+import threading
+from types import SimpleNamespace
+
+from cog.stats.metrics import mongo_listener as listener_module
+from cog.stats.metrics.mongo_listener import MetricsCommandListener
+from cog.stats.metrics.registry import count_queries
+from cog.stats.metrics.tracing import Trace, current_trace
+
+def find_events(request_id: int, batch):
+    command = {"find": "users", "filter": {"user_id": str(request_id)}}
+    started = SimpleNamespace(command_name="find", command=command, database_name="cryptonel_wallet", connection_id=("db", 1), request_id=request_id)
+    succeeded = SimpleNamespace(
+        command_name="find", connection_id=("db", 1), request_id=request_id,
+        duration_micros=100, reply={"cursor": {"firstBatch": batch}}
+    )
+    return started, succeeded
+
+def test_reply_bytes_are_estimated_from_the_first_document():
+    listener = MetricsCommandListener()
+    started, succeeded = find_events(1, [{"user_id": "1", "balance": "10"}] * 4)
+
+    listener.started(started)
+    listener.succeeded(succeeded)
+
+    (key, stats), = listener.top()
+    assert stats.documents == 4
+    assert stats.bytes == 4 * len(listener_module.bson.encode({"user_id": "1", "balance": "10"}))
+
+def run_queries(listener, request_ids):
+    for request_id in request_ids:
+        started, succeeded = find_events(request_id, [])
+        listener.started(started)
+        listener.succeeded(succeeded)
+
+def test_n_plus_one_is_detected_without_tracing(monkeypatch):
+    monkeypatch.setattr(listener_module, "MONGO_N_PLUS_ONE_THRESHOLD", 3)
+    listener = MetricsCommandListener()
+
+    # Outside any interaction nothing is counted
+    run_queries(listener, range(5))
+    assert listener.top()[0][1].n_plus_one == 0
+
+    with count_queries("dropdown transfer:send"):
+        run_queries(listener, range(10, 15))
+    with count_queries("dropdown transfer:send"):
+        run_queries(listener, range(20, 22))
+
+    # Reported once for the interaction that crossed the threshold
+    assert listener.top()[0][1].n_plus_one == 1
+
+def test_n_plus_one_is_counted_once_across_threads(monkeypatch):
+    monkeypatch.setattr(listener_module, "MONGO_N_PLUS_ONE_THRESHOLD", 5)
+    listener = MetricsCommandListener()
+    trace = Trace("test", {})
+    barrier = threading.Barrier(8)
+
+    def worker(offset: int):
+        barrier.wait()
+        run_queries(listener, range(offset, offset + 50))
+
+    def interaction():
+        # Worker threads of one interaction share its counter, as asyncio.to_thread does
+        current_trace.set(trace)
+        with count_queries("command transfer"):
+            threads = [threading.Thread(target=contextvars.copy_context().run, args=(worker, index * 1000)) for index in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+    contextvars.copy_context().run(interaction)
+
+    (key, stats), = listener.top()
+    assert stats.count == 400
+    assert stats.n_plus_one == 1
+    # A traced interaction also gets the finding in its trace
+    assert trace.attrs["n_plus_one"] == [f"users.find {key[2]}"]
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from cog.cryptonel.transfer import recipient_index, utils
+from cog.cryptonel.transfer.recipient_index import RecipientIndex, RecipientIndexCache
+from tests.conftest import add_wallet
+
+def usernames(index, prefix):
+    return [entry["username"] for entry in index.search(prefix)]
+
+def test_rename_drops_the_old_username():
+    index = RecipientIndex([{"username": "alice", "private_address": "addr-1", "source": "recent"}])
+
+    index.add({"username": "bob", "private_address": "addr-1", "source": "recent"})
+
+    assert usernames(index, "ali") == []
+    assert usernames(index, "bo") == ["bob"]
+    assert usernames(index, "addr-1") == ["bob"]
+    assert len(index.keys) == 2
+
+def test_stale_index_is_rebuilt(monkeypatch):
+    loads = []
+
+    def load(user_id):
+        loads.append(user_id)
+        return [{"username": f"friend{len(loads)}", "private_address": f"addr-{len(loads)}", "source": "contact"}]
+
+    monkeypatch.setattr(recipient_index, "load_recipient_entries", load)
+    cache = RecipientIndexCache(ttl_seconds=60)
+
+    async def warm_and_wait():
+        cache.warm("1")
+        await asyncio.gather(*cache.pending.values())
+
+    asyncio.run(warm_and_wait())
+    asyncio.run(warm_and_wait())
+    assert loads == ["1"]
+
+    # Past the TTL the cached index keeps serving until the rebuild replaces it
+    cache.built_at["1"] -= 61
+    asyncio.run(warm_and_wait())
+    assert loads == ["1", "1"]
+    assert usernames(cache.get("1"), "friend") == ["friend2"]
+
+def cached_index(user_id: str) -> RecipientIndexCache:
+    cache = RecipientIndexCache()
+    cache.indexes[user_id] = RecipientIndex([
+        {"username": "carol", "private_address": "addr-c", "source": "contact"},
+        {"username": "user3", "private_address": "addr-3", "source": "recent"},
+        {"username": "dave", "private_address": "addr-d", "source": "recent"}
+    ])
+    return cache
+
+def test_counterparty_moves_to_the_front_of_the_recents():
+    cache = cached_index("1")
+
+    cache.record_counterparty("1", "dave", "addr-d")
+    cache.record_counterparty("1", "erin", "addr-e")
+
+    assert usernames(cache.get("1"), "") == ["carol", "erin", "dave", "user3"]
+
+def test_only_committed_transfers_are_recorded(ledger, monkeypatch):
+    cache = cached_index("1")
+    monkeypatch.setattr(recipient_index, "recipient_index_cache", cache)
+    add_wallet(ledger, "1", 100)
+    add_wallet(ledger, "2", 0)
+    sender = ledger["users"].find_one({"user_id": "1"})
+    recipient = ledger["users"].find_one({"user_id": "2"})
+
+    ledger["user_transactions"].fail_next("bulk_write", OperationFailure("transaction aborted"))
+    with pytest.raises(OperationFailure):
+        asyncio.run(utils.record_transaction(sender, recipient, 10, 10, 0, "test"))
+    assert usernames(cache.get("1"), "user2") == []
+
+    asyncio.run(utils.record_transaction(sender, recipient, 10, 10, 0, "test"))
+    assert usernames(cache.get("1"), "")[:2] == ["carol", "user2"]
+
@@ -0,0 +1,70 @@
+import asyncio
+import datetime
+
+import pytest
+
+from cog.cryptonel.transfer import scheduled_transfers as scheduled_module
+from cog.cryptonel.transfer.scheduled_transfers import ScheduledTransferService
+from tests.conftest import add_wallet, balance_of
+
+SETTINGS = {"tax_rate": "0", "min_amount": "0"}
+
+@pytest.fixture
+def service(ledger, monkeypatch):
+    async def get_transfer_settings():
+        return SETTINGS
+
+    monkeypatch.setattr(scheduled_module, "users", ledger["users"])
+    monkeypatch.setattr(scheduled_module, "get_transfer_settings", get_transfer_settings)
+    return ScheduledTransferService(ledger["scheduled_transfers"])
+
+def add_job(service, job_id: str, interval_days: int = 0):
+    service.collection.insert_one({
+        "_id": job_id,
+        "user_id": "1",
+        "recipient_id": "2",
+        "amount": "10.00000000",
+        "reason": "test",
+        "interval_days": interval_days,
+        "next_run": datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1),
+        "run_count": 0,
+        "status": "active"
+    })
+
+def run(service, job_id: str):
+    asyncio.run(service.run_batch([job_id]))
+    return service.collection.find_one({"_id": job_id})
+
+def test_due_job_pays_recipient(ledger, service):
+    add_wallet(ledger, "1", 100)
+    add_wallet(ledger, "2", 0)
+    add_job(service, "job-1")
+
+    job = run(service, "job-1")
+
+    assert job["status"] == "completed"
+    assert balance_of(ledger, "2") == pytest.approx(10)
+
+@pytest.mark.parametrize("user_id, result", [("1", "sender_banned"), ("2", "recipient_banned")])
+def test_ban_since_creation_fails_job(ledger, service, user_id, result):
+    add_wallet(ledger, "1", 100, ban=user_id == "1")
+    add_wallet(ledger, "2", 0, ban=user_id == "2")
+    add_job(service, "job-1", interval_days=7)
+
+    job = run(service, "job-1")
+
+    # A recurring job ends instead of trying again next week
+    assert job["status"] == "failed" and job["last_result"] == result
+    assert balance_of(ledger, "1") == pytest.approx(100)
+
+@pytest.mark.parametrize("interval_days, status", [(7, "active"), (0, "failed")])
+def test_wallet_lock_skips_the_run(ledger, service, interval_days, status):
+    add_wallet(ledger, "1", 100)
+    add_wallet(ledger, "2", 0, wallet_lock=True)
+    add_job(service, "job-1", interval_days=interval_days)
+
+    job = run(service, "job-1")
+
+    assert job["status"] == status and job["last_result"] == "recipient_locked"
+    assert balance_of(ledger, "1") == pytest.approx(100)
+    assert balance_of(ledger, "2") == pytest.approx(0)
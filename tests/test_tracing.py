@@ -0,0 +1,19 @@
+import json
+import logging.handlers
+
+from cog.stats.metrics import tracing
+from cog.stats.metrics.tracing import Trace, export_trace, stop_trace_listener, trace_logger
+
+def test_restarting_the_listener_writes_each_trace_once(tmp_path, monkeypatch):
+    trace_file = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(trace_file))
+
+    # Each cycle is a metrics cog load and unload
+    for _ in range(3):
+        export_trace(Trace("test", {}), 0.01)
+        stop_trace_listener()
+
+    assert not any(isinstance(handler, logging.handlers.QueueHandler) for handler in trace_logger.handlers)
+    lines = trace_file.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 3
+    assert all(json.loads(line)["name"] == "test" for line in lines)
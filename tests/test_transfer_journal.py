@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from cog.cryptonel.transfer import dispatcher
+from tests.conftest import add_wallet, balance_of
+
+SETTINGS = {"tax_rate": "0", "min_amount": "0"}
+
+def transfer(wallet, amount: float, key: str):
+    recipient = wallet["users"].find_one({"user_id": "2"})
+    return asyncio.run(dispatcher.execute_transfer("1", recipient, amount, "test", SETTINGS, idempotency_key=key))
+
+def test_duplicate_key_returns_original_transfer(ledger):
+    add_wallet(ledger, "1", 100)
+    add_wallet(ledger, "2", 0)
+
+    first = transfer(ledger, 10, "modal:1")
+    second = transfer(ledger, 10, "modal:1")
+
+    assert first["status"] == "completed"
+    assert second["duplicate"] and second["tx_id"] == first["tx_id"]
+    assert balance_of(ledger, "1") == pytest.approx(90)
+
+def test_crash_during_commit_leaves_key_reusable(ledger):
+    add_wallet(ledger, "1", 100)
+    add_wallet(ledger, "2", 0)
+
+    # The history write fails after the balances were written in the same transaction
+    ledger["user_transactions"].fail_next("bulk_write", OperationFailure("node went away"))
+    with pytest.raises(OperationFailure):
+        transfer(ledger, 10, "modal:2")
+    assert balance_of(ledger, "1") == pytest.approx(100)
+    assert ledger["transfer_journal"].find_one({"idempotency_key": "modal:2"}) is None
+
+    # The retry moves the money instead of reporting a duplicate
+    retry = transfer(ledger, 10, "modal:2")
+    assert retry["status"] == "completed" and not retry.get("duplicate")
+    assert balance_of(ledger, "1") == pytest.approx(90)
+    assert balance_of(ledger, "2") == pytest.approx(10)